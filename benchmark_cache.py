@@ -0,0 +1,148 @@
+"""
+Shared benchmark series cache for market comparison charts
+
+Benchmark indices (NASDAQ Composite, S&P 500) and sector ETFs are the same for
+every user and ticker, so each (symbol, period) series is held once per
+process, stored together with its normalized return curve, and refreshed by a
+background thread on a fixed schedule. Charts read them without fetching.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from comprehensive_market_stocks import get_sector_etfs
+from price_history_store import get_price_history
+
+# Major indices shown on every stock-vs-market chart
+BENCHMARK_INDICES = {
+    'nasdaq': '^IXIC',  # NASDAQ Composite
+    'sp500': '^GSPC',   # S&P 500
+}
+
+# yfinance sector names that differ from the GICS names used by get_sector_etfs
+SECTOR_NAME_ALIASES = {
+    'Financial Services': 'Financials',
+    'Consumer Cyclical': 'Consumer Discretionary',
+    'Consumer Defensive': 'Consumer Staples',
+    'Basic Materials': 'Materials',
+}
+
+
+def normalize_close(data):
+    """Percentage change of Close from the first bar"""
+    base_price = data['Close'].iloc[0]
+    return ((data['Close'] - base_price) / base_price) * 100
+
+
+class BenchmarkCache:
+    def __init__(self, refresh_minutes=15):
+        self.refresh_interval = timedelta(minutes=refresh_minutes)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+
+    def _load(self, symbol, period):
+        data = get_price_history(symbol, period)
+        if data.empty:
+            return None
+        entry = {
+            'data': data,
+            'normalized': normalize_close(data),
+            'loaded_at': datetime.now(),
+        }
+        with self._lock:
+            self._entries[(symbol, period)] = entry
+        return entry
+
+    def get(self, symbol, period="1y"):
+        """
+        Get a cached benchmark series
+
+        Returns:
+        --------
+        dict or None
+            {'data': daily bars, 'normalized': % change from the first bar,
+             'loaded_at': datetime}; None if no data is available
+        """
+        self.start_background_refresh()
+        entry = self._entries.get((symbol, period))
+        if entry is not None and datetime.now() - entry['loaded_at'] < self.refresh_interval * 2:
+            return entry
+        # First use, or the background refresh has fallen behind
+        return self._load(symbol, period) or entry
+
+    def get_normalized(self, symbol, period="1y", start_date=None):
+        """
+        Normalized return curve, rebased to start_date when it is later than the first bar
+
+        Rebasing uses the pre-normalized curve, so no price data is touched.
+        """
+        entry = self.get(symbol, period)
+        if entry is None:
+            return None
+        normalized = entry['normalized']
+        if start_date is None or start_date <= normalized.index[0]:
+            return normalized
+        normalized = normalized[normalized.index >= start_date]
+        if normalized.empty:
+            return normalized
+        growth = 1 + normalized / 100
+        return (growth / growth.iloc[0] - 1) * 100
+
+    def preload(self, symbols, periods=("1y",)):
+        """Load several series up front (e.g. all sector ETFs)"""
+        for symbol in symbols:
+            for period in periods:
+                if (symbol, period) not in self._entries:
+                    try:
+                        self._load(symbol, period)
+                    except Exception:
+                        continue
+
+    def refresh_all(self):
+        """Reload every series that has been requested so far"""
+        for symbol, period in list(self._entries):
+            try:
+                self._load(symbol, period)
+            except Exception:
+                continue
+
+    def start_background_refresh(self):
+        """Start the scheduled refresh thread once per process"""
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+
+            def refresh_loop():
+                while True:
+                    time.sleep(self.refresh_interval.total_seconds())
+                    self.refresh_all()
+
+            self._refresh_thread = threading.Thread(target=refresh_loop, name="benchmark-refresh", daemon=True)
+            self._refresh_thread.start()
+
+    def clear(self):
+        """Drop all cached series"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Global cache instance
+benchmark_cache = BenchmarkCache()
+
+
+def get_sector_etf(sector):
+    """Sector ETF symbol for a sector name (None when there is no matching ETF)"""
+    return get_sector_etfs().get(SECTOR_NAME_ALIASES.get(sector, sector))
+
+
+def get_sector_benchmarks(period="1y"):
+    """Cached series for every sector ETF ({sector: entry})"""
+    benchmarks = {}
+    for sector, symbol in get_sector_etfs().items():
+        entry = benchmark_cache.get(symbol, period)
+        if entry is not None:
+            benchmarks[sector] = entry
+    return benchmarks
@@ -0,0 +1,141 @@
+"""
+Shape-preserving downsampling of long series before they are plotted
+
+Long daily histories (ten years, or several tickers overlaid) are reduced to a
+per-chart point budget before Plotly figures are built, so the browser
+receives a few thousand points instead of tens of thousands. Largest-Triangle-
+Three-Buckets (LTTB) keeps the visual shape of line charts; min/max bucketing
+keeps every spike, which suits volume bars.
+"""
+import numpy as np
+import pandas as pd
+
+# Maximum number of points per chart, shared by the traces drawn on it
+CHART_POINT_BUDGETS = {
+    'storytelling': 2400,
+    'stock_vs_market': 3000,
+    'multi_stock': 4000,
+    'historical_metrics': 1500,
+}
+DEFAULT_POINT_BUDGET = 2000
+
+
+def trace_point_budget(chart_type, n_traces=1):
+    """Points each trace may use so that the whole chart stays within its budget"""
+    budget = CHART_POINT_BUDGETS.get(chart_type, DEFAULT_POINT_BUDGET)
+    return max(budget // max(n_traces, 1), 3)
+
+
+def _numeric_x(x):
+    """x values as floats (datetimes as nanoseconds) for the triangle areas"""
+    if isinstance(x, (pd.DatetimeIndex, pd.Series)) and pd.api.types.is_datetime64_any_dtype(x):
+        return pd.DatetimeIndex(x).asi8.astype(float)
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(float)
+    return x.astype(float)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Positions selected by Largest-Triangle-Three-Buckets
+
+    The first and last points are always kept; every bucket in between keeps
+    the point forming the largest triangle with the previously kept point and
+    the average of the next bucket.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, n_out):
+    """Positions of the minimum and maximum of each bucket (plus the first and last point)"""
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+
+    n_buckets = (n_out - 2) // 2
+    buckets = np.arange(n) * n_buckets // n
+    order = np.lexsort((y, buckets))
+    starts = np.searchsorted(buckets[order], np.arange(n_buckets), side='left')
+    ends = np.searchsorted(buckets[order], np.arange(n_buckets), side='right')
+    filled = ends > starts
+    lows = order[starts[filled]]
+    highs = order[ends[filled] - 1]
+    return np.unique(np.concatenate(([0, n - 1], lows, highs)))
+
+
+def downsample_indices(x, y, max_points, method='lttb'):
+    """
+    Positions of the points to plot
+
+    Parameters:
+    -----------
+    x : array-like
+        x values (numbers or datetimes)
+    y : array-like
+        y values; NaN points are skipped when choosing and left out of the result
+    max_points : int
+        Point budget for this series
+    method : str
+        'lttb' for lines, 'minmax' for spiky series such as volume
+
+    Returns:
+    --------
+    numpy.ndarray
+        Sorted positions into x / y
+    """
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(np.isfinite(y))
+    if len(valid) <= max_points:
+        return valid
+
+    if method == 'minmax':
+        chosen = minmax_indices(y[valid], max_points)
+    elif method == 'lttb':
+        chosen = lttb_indices(_numeric_x(x)[valid], y[valid], max_points)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    return valid[chosen]
+
+
+def downsample_series(series, max_points, method='lttb'):
+    """Downsample a Series indexed by x to at most max_points points"""
+    if len(series) <= max_points:
+        return series
+    return series.iloc[downsample_indices(series.index, series.to_numpy(dtype=float), max_points, method)]
+
+
+def downsample_frame(frame, column, max_points, method='lttb'):
+    """
+    Downsample all rows of a DataFrame by the shape of one column
+
+    Rows are chosen from `column` (e.g. Close), so overlays on the same x
+    (moving averages) stay aligned with it.
+    """
+    if len(frame) <= max_points:
+        return frame
+    return frame.iloc[downsample_indices(frame.index, frame[column].to_numpy(dtype=float), max_points, method)]
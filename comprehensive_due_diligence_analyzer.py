@@ -7,7 +7,7 @@ import os
 import json
 import logging
 import yfinance as yf
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from twitter_sentiment_analyzer import TwitterDueDiligenceAnalyzer
 from gemini_analyzer import analyze_company_fundamentals
 from openai import OpenAI
@@ -37,7 +37,7 @@ class ComprehensiveDueDiligenceAnalyzer:
             logger.error(f"Failed to initialize comprehensive analyzer: {e}")
             raise
     
-    def generate_comprehensive_due_diligence_report(self, ticker: str) -> Dict[str, Any]:
+    def generate_comprehensive_due_diligence_report(self, ticker: str, gemini_analysis: Optional[str] = None) -> Dict[str, Any]:
         """
         Generate the most comprehensive due diligence report possible
         using Gemini, OpenAI, and Twitter sentiment analysis
@@ -46,6 +46,8 @@ class ComprehensiveDueDiligenceAnalyzer:
         -----------
         ticker : str
             Stock ticker symbol
+        gemini_analysis : str, optional
+            Gemini fundamental analysis already generated (e.g. streamed to the page)
             
         Returns:
         --------
@@ -66,7 +68,8 @@ class ComprehensiveDueDiligenceAnalyzer:
             
             # 2. Generate Gemini fundamental analysis (with Twitter integration)
             logger.info(f"Generating Gemini AI fundamental analysis for {ticker}")
-            gemini_analysis = analyze_company_fundamentals(ticker)
+            if not gemini_analysis:
+                gemini_analysis = analyze_company_fundamentals(ticker)
             
             # 3. Generate OpenAI cross-verification analysis
             logger.info(f"Generating OpenAI cross-verification analysis for {ticker}")
@@ -307,7 +310,7 @@ Focus on providing insights that complement rather than repeat the fundamental a
             }
         }
 
-def get_comprehensive_due_diligence_report(ticker: str) -> Dict[str, Any]:
+def get_comprehensive_due_diligence_report(ticker: str, gemini_analysis: Optional[str] = None) -> Dict[str, Any]:
     """
     Main function to get comprehensive due diligence report
     
@@ -315,6 +318,8 @@ def get_comprehensive_due_diligence_report(ticker: str) -> Dict[str, Any]:
     -----------
     ticker : str
         Stock ticker symbol
+    gemini_analysis : str, optional
+        Gemini fundamental analysis already generated (e.g. streamed to the page)
         
     Returns:
     --------
@@ -322,4 +327,4 @@ def get_comprehensive_due_diligence_report(ticker: str) -> Dict[str, Any]:
         Comprehensive due diligence report
     """
     analyzer = ComprehensiveDueDiligenceAnalyzer()
-    return analyzer.generate_comprehensive_due_diligence_report(ticker)
\ No newline at end of file
+    return analyzer.generate_comprehensive_due_diligence_report(ticker, gemini_analysis)
\ No newline at end of file
@@ -152,9 +152,10 @@ def get_historical_usd_jpy_chart():
     try:
         import plotly.graph_objects as go
         
-        # Get USD/JPY historical data
-        ticker = yf.Ticker("USDJPY=X")
-        data = ticker.history(period="1y")
+        from price_history_store import get_price_history
+        
+        # Get USD/JPY historical data (served from the local price store)
+        data = get_price_history("USDJPY=X", "1y")
         
         if not data.empty:
             fig = go.Figure()
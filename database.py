@@ -1,6 +1,6 @@
 import os
 import pandas as pd
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, Float, Boolean, DateTime, Text, LargeBinary, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 import datetime
@@ -148,8 +148,10 @@ class SensitivityAnalysis(Base):
     discount_range_max = Column(Float)  # 割引率の最大値
     discount_step = Column(Float)  # 割引率のステップ
     
-    # 感度分析の結果（JSON形式で保存）
-    matrix_data = Column(Text)  # 感度分析の結果マトリックスデータ
+    # 感度分析の結果
+    matrix_data = Column(Text)  # 旧形式（JSON）の結果マトリックスデータ
+    matrix_blob = Column(LargeBinary)  # 圧縮したバイナリ形式の結果マトリックスデータ
+    input_hash = Column(String(64), index=True)  # 入力パラメータのハッシュ（同一条件の結果を再利用するため）
     
     # リレーションシップ
     analysis = relationship("Analysis", back_populates="sensitivity_analyses")
@@ -161,6 +163,28 @@ class SensitivityAnalysis(Base):
 # データベーステーブル作成
 def init_db():
     Base.metadata.create_all(engine)
+    add_missing_columns()
+
+
+# 既存テーブルに後から追加された列とそのインデックスを作成（create_all は既存テーブルを変更しないため）
+def add_missing_columns():
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            
+            # 後から追加された列のインデックス（index=True）も作成する
+            for index in table.indexes:
+                columns = ', '.join(column.name for column in index.columns)
+                unique = 'UNIQUE ' if index.unique else ''
+                connection.execute(text(f'CREATE {unique}INDEX IF NOT EXISTS {index.name} ON {table.name} ({columns})'))
 
 
 # サンプルデータ挿入
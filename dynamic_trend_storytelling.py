@@ -6,14 +6,19 @@ from plotly.subplots import make_subplots
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from price_history_store import get_price_history
+from technical_indicators import get_indicators, TRADING_DAYS_PER_YEAR
+from market_events import market_event_index
+from chart_downsampling import downsample_frame, downsample_series, trace_point_budget
+from figure_cache import figure_cache
 
 def get_stock_story_data(ticker, period="1y"):
     """Get comprehensive stock data for storytelling visualization"""
     try:
         stock = yf.Ticker(ticker)
         
-        # Get historical data
-        hist = stock.history(period=period)
+        # Get historical data (served from the local price store)
+        hist = get_price_history(ticker, period)
         if hist.empty:
             return None
             
@@ -32,9 +37,12 @@ def get_stock_story_data(ticker, period="1y"):
         start_price = hist['Close'].iloc[0]
         price_change = ((current_price - start_price) / start_price) * 100
         
-        # Volatility analysis
-        returns = hist['Close'].pct_change().dropna()
-        volatility = returns.std() * np.sqrt(252) * 100  # Annualized volatility
+        # Rolling indicators (only bars not seen before are computed)
+        indicators = get_indicators(ticker, hist)
+        
+        # Volatility analysis (the first bar's return reaches outside the period)
+        returns = indicators['return'].iloc[1:].dropna()
+        volatility = returns.std() * np.sqrt(TRADING_DAYS_PER_YEAR) * 100  # Annualized volatility
         
         # Volume analysis
         avg_volume = hist['Volume'].mean()
@@ -42,8 +50,8 @@ def get_stock_story_data(ticker, period="1y"):
         volume_trend = "increasing" if recent_volume > avg_volume else "decreasing"
         
         # Price momentum
-        ma_20 = hist['Close'].rolling(20).mean()
-        ma_50 = hist['Close'].rolling(50).mean()
+        ma_20 = indicators['ma_20']
+        ma_50 = indicators['ma_50']
         
         return {
             'ticker': ticker,
@@ -61,6 +69,7 @@ def get_stock_story_data(ticker, period="1y"):
             'recent_volume': recent_volume,
             'ma_20': ma_20,
             'ma_50': ma_50,
+            'indicators': indicators,
             'market_cap': info.get('marketCap', 0),
             'pe_ratio': info.get('trailingPE', 0),
             'revenue': info.get('totalRevenue', 0),
@@ -128,26 +137,30 @@ def identify_key_events(data):
     hist = data['hist']
     events = []
     
-    # Daily returns
-    returns = hist['Close'].pct_change()
+    # Daily returns and surge/drop flags from the indicator engine
+    indicators = data.get('indicators')
+    if indicators is None:
+        indicators = get_indicators(data['ticker'], hist)
+    flags = indicators[['return', 'surge', 'drop']].iloc[1:]
     
-    # Find significant movements (>5% daily change)
-    significant_moves = returns[abs(returns) > 0.05]
+    # Find significant movements (>5% daily change); only the first 10 are shown
+    significant_moves = flags[flags['surge'] | flags['drop']].head(10)
+    magnitudes = significant_moves['return'].abs().to_numpy() * 100
     
-    for date, return_val in significant_moves.items():
-        if return_val > 0.05:
+    for date, is_surge, magnitude in zip(significant_moves.index, significant_moves['surge'].to_numpy(), magnitudes):
+        if is_surge:
             events.append({
                 'date': date,
                 'type': 'surge',
-                'magnitude': return_val * 100,
-                'description': f"+{return_val*100:.1f}%の急騰"
+                'magnitude': magnitude,
+                'description': f"+{magnitude:.1f}%の急騰"
             })
-        elif return_val < -0.05:
+        else:
             events.append({
                 'date': date,
                 'type': 'drop',
-                'magnitude': abs(return_val * 100),
-                'description': f"-{abs(return_val)*100:.1f}%の急落"
+                'magnitude': magnitude,
+                'description': f"-{magnitude:.1f}%の急落"
             })
     
     # Find price peaks and troughs
@@ -175,12 +188,30 @@ def identify_key_events(data):
     return events[:10]  # Return top 10 events
 
 def create_storytelling_chart(data):
-    """Create an interactive storytelling chart"""
+    """Create an interactive storytelling chart (reused across reruns while the data is unchanged)"""
     if not data:
         return None
     
+    return figure_cache.get_or_build(
+        'storytelling',
+        lambda: _build_storytelling_chart(data),
+        data=[data['hist'][['Close', 'Volume']], data['ma_20'], data['ma_50']],
+        ticker=data['ticker'],
+        params={'company_name': data['company_name']}
+    )
+
+def _build_storytelling_chart(data):
     hist = data['hist']
     
+    # Price and moving averages share the rows chosen from the close; volume keeps its spikes
+    max_points = trace_point_budget('storytelling', 4)
+    plot_rows = downsample_frame(
+        pd.DataFrame({'Close': hist['Close'], 'ma_20': data['ma_20'], 'ma_50': data['ma_50']}),
+        'Close',
+        max_points
+    )
+    plot_volume = downsample_series(hist['Volume'], max_points, method='minmax')
+    
     # Create subplot with secondary y-axis for volume
     fig = make_subplots(
         rows=2, cols=1,
@@ -192,8 +223,8 @@ def create_storytelling_chart(data):
     # Price line with gradient
     fig.add_trace(
         go.Scatter(
-            x=hist.index,
-            y=hist['Close'],
+            x=plot_rows.index,
+            y=plot_rows['Close'],
             mode='lines',
             name='株価',
             line=dict(
@@ -208,8 +239,8 @@ def create_storytelling_chart(data):
     # Add moving averages
     fig.add_trace(
         go.Scatter(
-            x=hist.index,
-            y=data['ma_20'],
+            x=plot_rows.index,
+            y=plot_rows['ma_20'],
             mode='lines',
             name='20日移動平均',
             line=dict(color='orange', width=2, dash='dash'),
@@ -220,8 +251,8 @@ def create_storytelling_chart(data):
     
     fig.add_trace(
         go.Scatter(
-            x=hist.index,
-            y=data['ma_50'],
+            x=plot_rows.index,
+            y=plot_rows['ma_50'],
             mode='lines',
             name='50日移動平均',
             line=dict(color='red', width=2, dash='dash'),
@@ -272,8 +303,8 @@ def create_storytelling_chart(data):
     # Volume bars
     fig.add_trace(
         go.Bar(
-            x=hist.index,
-            y=hist['Volume'],
+            x=plot_volume.index,
+            y=plot_volume.values,
             name='取引量',
             marker_color='rgba(102, 126, 234, 0.3)',
             hovertemplate='<b>%{x}</b><br>取引量: %{y:,.0f}<extra></extra>'
@@ -422,6 +453,13 @@ def display_storytelling_visualization(ticker):
             st.markdown("### 🎯 注目すべき出来事")
             for event in events[:5]:  # Show top 5 events
                 st.markdown(f"- **{event['date'].strftime('%Y-%m-%d')}**: {event['description']}")
+        
+        # Gaps, breakouts, 52-week highs/lows and volume spikes from the market event index
+        market_events = market_event_index.events_for_symbol(ticker, since=data['hist'].index[0])
+        if not market_events.empty:
+            st.markdown("### 🛰️ テクニカルイベント")
+            for date, description in zip(market_events['date'].head(5), market_events['description'].head(5)):
+                st.markdown(f"- **{date.strftime('%Y-%m-%d')}**: {description}")
     
     with col2:
         # Sentiment analysis
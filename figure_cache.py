@@ -0,0 +1,149 @@
+"""
+Cache of finished Plotly figures keyed by the data they were built from
+
+Streamlit reruns the whole page on every widget change, which rebuilt every
+heavy figure from scratch. Figures are stored here as serialized JSON under
+(ticker, chart type, parameters, data version), so a rerun with unchanged
+inputs only deserializes the finished figure.
+"""
+import hashlib
+import json
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+
+def _update_digest(digest, value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(type(value).__name__.encode())
+        digest.update(repr(value.shape).encode())
+        if isinstance(value, pd.DataFrame):
+            digest.update(repr(list(value.columns)).encode())
+        try:
+            digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        except TypeError:
+            # Unhashable cells (lists, dicts): fall back to the pickled frame
+            digest.update(pickle.dumps(value))
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        digest.update(b'{')
+        for key in sorted(value, key=str):
+            digest.update(str(key).encode())
+            _update_digest(digest, value[key])
+        digest.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        digest.update(b'[')
+        for item in value:
+            _update_digest(digest, item)
+        digest.update(b']')
+    else:
+        digest.update(repr(value).encode())
+
+
+def data_version(*values):
+    """
+    Content hash of the data a figure is built from
+
+    Accepts DataFrames, Series, numpy arrays, dicts, lists and scalars (nested
+    freely); equal content always gives the same version.
+    """
+    digest = hashlib.sha1()
+    for value in values:
+        _update_digest(digest, value)
+    return digest.hexdigest()
+
+
+class FigureCache:
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(ticker, chart_type, params, version):
+        """Cache key for one figure"""
+        params_json = json.dumps(params or {}, sort_keys=True, default=str)
+        return (str(ticker).upper() if ticker else None, chart_type, params_json, version)
+
+    def get(self, key):
+        """Finished figure(s) for key, or None when not cached"""
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Each caller gets its own figure objects, so later updates never leak into the cache
+        if isinstance(payload, tuple):
+            return tuple(pio.from_json(item) if item is not None else None for item in payload)
+        return pio.from_json(payload)
+
+    def put(self, key, figure):
+        """Store figure (or a tuple of figures) as JSON"""
+        if isinstance(figure, tuple):
+            payload = tuple(item.to_json() if item is not None else None for item in figure)
+        else:
+            payload = figure.to_json()
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_build(self, chart_type, build, data, ticker=None, params=None):
+        """
+        Return the cached figure for these inputs, building and caching it on a miss
+
+        Parameters:
+        -----------
+        chart_type : str
+            Name of the chart (e.g. 'storytelling', 'sensitivity_heatmap')
+        build : callable
+            Zero-argument function building the figure (or a tuple of figures)
+        data : object
+            Data the figure is built from; its content hash is the data version
+        ticker : str, optional
+            Ticker the figure belongs to
+        params : dict, optional
+            Other inputs that change the figure
+
+        Returns:
+        --------
+        plotly.graph_objects.Figure, tuple or None
+            None results are not cached, so missing data is retried on the next run
+        """
+        try:
+            key = self.make_key(ticker, chart_type, params, data_version(data))
+        except Exception:
+            return build()
+
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        figure = build()
+        if figure is None or (isinstance(figure, tuple) and all(item is None for item in figure)):
+            return figure
+        try:
+            self.put(key, figure)
+        except Exception:
+            pass  # Figures that cannot be serialized are simply not cached
+        return figure
+
+    def clear(self):
+        """Drop all cached figures"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Global cache instance
+figure_cache = FigureCache()
@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from collections import OrderedDict
 
 def calculate_intrinsic_value(forecasted_data, discount_rate, terminal_multiple, shares_outstanding):
     """
@@ -24,19 +25,13 @@ def calculate_intrinsic_value(forecasted_data, discount_rate, terminal_multiple,
     # 割引率をパーセンテージから小数に変換
     discount_rate_decimal = discount_rate / 100
     
-    # 予測期間の純利益の現在価値を計算
-    present_values = []
-    
-    for i, year in enumerate(forecasted_data['年']):
-        if i == 0:  # 初年度（現在）はスキップ
-            continue
-            
-        future_value = forecasted_data['純利益（百万USD）'].iloc[i]
-        present_value = future_value / ((1 + discount_rate_decimal) ** i)
-        present_values.append(present_value)
+    # 予測期間の純利益の現在価値を計算（初年度（現在）はスキップ）
+    net_income = forecasted_data['純利益（百万USD）'].to_numpy(dtype=float)
+    periods = np.arange(1, len(net_income))
+    present_values = net_income[1:] / ((1 + discount_rate_decimal) ** periods)
     
     # 予測期間の純利益の現在価値合計
-    total_pv_forecast_period = sum(present_values)
+    total_pv_forecast_period = float(present_values.sum())
     
     # 終末価値の計算（最終年の純利益 × ターミナル倍率）
     terminal_profit = forecasted_data['純利益（百万USD）'].iloc[-1]
@@ -60,6 +55,505 @@ def calculate_intrinsic_value(forecasted_data, discount_rate, terminal_multiple,
         'dcf_per_share': equity_value_per_share
     }
 
+def calculate_intrinsic_value_grid(base_revenue, revenue_growth, net_margin, discount_rate,
+                                   terminal_multiple, forecast_years, shares_outstanding,
+                                   include_forecast_period=True):
+    """
+    複数シナリオのDCF本質的価値をNumPyのブロードキャストで一括計算する
+    
+    売上高が毎年一定の成長率で伸び、純利益率が一定のシナリオについて、
+    calculate_intrinsic_value と同じ計算（予測期間の純利益の現在価値 ＋
+    最終年の純利益 × ターミナル倍率の現在価値）を行う。予測期間の合計は
+    等比級数の閉じた式で求めるため、年ごとのループや予測期間の違いによる
+    配列の組み直しは不要。
+    
+    すべての引数はスカラーまたはブロードキャスト可能な配列を受け付ける。
+    全組み合わせを計算する場合は np.ix_ などで軸ごとに形状を揃えて渡す。
+    
+    Parameters:
+    -----------
+    base_revenue : float or array-like
+        基準年（現在）の売上高（百万USD）
+    revenue_growth : float or array-like
+        予想売上成長率（%）
+    net_margin : float or array-like
+        純利益率（%）
+    discount_rate : float or array-like
+        割引率（%）
+    terminal_multiple : float or array-like
+        終末価値算出に使用する倍率（通常はPE倍率）
+    forecast_years : int or array-like
+        予測期間（年）
+    shares_outstanding : float or array-like
+        発行済株式数（百万株）
+    include_forecast_period : bool
+        False の場合は予測期間の純利益を含めず、割り引いた終末価値のみで評価する
+        （DCF価値計算機ページの簡易モデル）
+        
+    Returns:
+    --------
+    dict
+        calculate_intrinsic_value と同じキーを持ち、値はブロードキャスト後の形状の配列
+    """
+    base_revenue, revenue_growth, net_margin, discount_rate, terminal_multiple, forecast_years, shares_outstanding = (
+        np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in (
+            base_revenue, revenue_growth, net_margin, discount_rate,
+            terminal_multiple, forecast_years, shares_outstanding
+        )))
+    )
+    
+    base_net_income = base_revenue * net_margin / 100
+    growth_factor = _dcf_growth_factor(revenue_growth, forecast_years)
+    discount_factor = _dcf_discount_factor(discount_rate, forecast_years)
+    series = _dcf_forecast_series(revenue_growth, discount_rate, forecast_years) if include_forecast_period else None
+    return _combine_dcf_stages(base_net_income, growth_factor, discount_factor, series,
+                               terminal_multiple, shares_outstanding)
+
+# calculate_intrinsic_value_grid の各段階。IncrementalDCFModel は段階ごとの結果を
+# その段階の入力だけをキーにキャッシュし、同じ関数で組み立てる。
+
+def _dcf_growth_factor(revenue_growth, forecast_years):
+    """最終年の成長倍率 (1+g)^N"""
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        return np.exp(forecast_years * np.log1p(np.asarray(revenue_growth, dtype=float) / 100))
+
+def _dcf_discount_factor(discount_rate, forecast_years):
+    """最終年の割引係数 (1+r)^-N"""
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        return np.exp(-forecast_years * np.log1p(np.asarray(discount_rate, dtype=float) / 100))
+
+def _dcf_forecast_series(revenue_growth, discount_rate, forecast_years):
+    """予測期間の純利益の現在価値の係数 Σ_{t=1..N} q^t（q = (1+g)/(1+r)）"""
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        # Σ_{t=1..N} q^t = q (q^N - 1) / (q - 1)
+        log_ratio = (np.log1p(np.asarray(revenue_growth, dtype=float) / 100)
+                     - np.log1p(np.asarray(discount_rate, dtype=float) / 100))
+        ratio_minus_one = np.expm1(log_ratio)
+        near_one = np.abs(log_ratio) < 1e-12
+        return np.where(
+            near_one,
+            forecast_years,
+            np.exp(log_ratio) * np.expm1(forecast_years * log_ratio) / np.where(near_one, 1.0, ratio_minus_one)
+        )
+
+def _combine_dcf_stages(base_net_income, growth_factor, discount_factor, series,
+                        terminal_multiple, shares_outstanding):
+    """
+    各段階の結果から calculate_intrinsic_value と同じキーの辞書を組み立てる
+    
+    series が None の場合は予測期間の純利益を含めず、割り引いた終末価値のみで評価する。
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        # 終末価値（最終年の純利益 × ターミナル倍率）とその現在価値
+        terminal_value = base_net_income * growth_factor * terminal_multiple
+        present_value_of_terminal_value = terminal_value * discount_factor
+        
+        if series is not None:
+            total_pv_forecast_period = base_net_income * series
+        else:
+            total_pv_forecast_period = np.zeros_like(present_value_of_terminal_value)
+        
+        enterprise_value = total_pv_forecast_period + present_value_of_terminal_value
+        equity_value_per_share = enterprise_value / shares_outstanding
+    
+    return {
+        'total_pv_forecast_period': total_pv_forecast_period,
+        'terminal_value': terminal_value,
+        'present_value_of_terminal_value': present_value_of_terminal_value,
+        'enterprise_value': enterprise_value,
+        'dcf_per_share': equity_value_per_share
+    }
+
+# 逆算（リバースDCF）で解くことのできるパラメータと既定の探索範囲（%）
+IMPLIED_PARAMETER_BOUNDS = {
+    'revenue_growth': (-50.0, 100.0),
+    'discount_rate': (0.1, 50.0),
+}
+
+def solve_implied_parameter(target_price, base_revenue, net_margin, discount_rate, terminal_multiple,
+                            forecast_years, shares_outstanding, revenue_growth=None,
+                            solve_for='revenue_growth', bounds=None, tol=1e-6, max_iter=100,
+                            include_forecast_period=True):
+    """
+    現在の株価が織り込んでいる成長率（または割引率）をDCFモデルから逆算する
+    
+    calculate_intrinsic_value_grid の1株あたり価値が target_price と一致する値を、
+    全銘柄まとめて二分法で求める（銘柄ごとのループは行わない）。DCF価値は
+    成長率について単調増加、割引率について単調減少なので、探索範囲内に解があれば
+    必ず収束する。
+    
+    Parameters:
+    -----------
+    target_price : float or array-like
+        現在の株価
+    base_revenue, net_margin, terminal_multiple, forecast_years, shares_outstanding :
+        calculate_intrinsic_value_grid と同じ（スカラーまたは配列）
+    discount_rate : float or array-like
+        割引率（%）。solve_for='discount_rate' の場合は無視される
+    revenue_growth : float or array-like, optional
+        売上成長率（%）。solve_for='discount_rate' の場合に必要
+    solve_for : str
+        'revenue_growth' または 'discount_rate'
+    bounds : tuple, optional
+        探索範囲（%）。省略時は IMPLIED_PARAMETER_BOUNDS の値
+    tol : float
+        収束判定に使う探索区間の幅（%）
+    max_iter : int
+        最大反復回数
+    include_forecast_period : bool
+        calculate_intrinsic_value_grid を参照
+        
+    Returns:
+    --------
+    numpy.ndarray
+        逆算したパラメータ（%）。入力が不正な場合や探索範囲内に解がない場合は NaN
+    """
+    if solve_for not in IMPLIED_PARAMETER_BOUNDS:
+        raise ValueError(f"逆算できないパラメータです: {solve_for}")
+    if solve_for == 'discount_rate' and revenue_growth is None:
+        raise ValueError("割引率を逆算するには revenue_growth が必要です")
+    
+    low_bound, high_bound = bounds or IMPLIED_PARAMETER_BOUNDS[solve_for]
+    fixed = {
+        'base_revenue': base_revenue,
+        'net_margin': net_margin,
+        'terminal_multiple': terminal_multiple,
+        'forecast_years': forecast_years,
+        'shares_outstanding': shares_outstanding,
+        'revenue_growth': revenue_growth,
+        'discount_rate': discount_rate,
+    }
+    fixed.pop(solve_for)
+    target_price, *fixed_values = np.broadcast_arrays(
+        np.asarray(target_price, dtype=float),
+        *(np.asarray(value, dtype=float) for value in fixed.values())
+    )
+    fixed = dict(zip(fixed, fixed_values))
+    
+    def price_gap(value):
+        results = calculate_intrinsic_value_grid(
+            include_forecast_period=include_forecast_period, **{solve_for: value}, **fixed
+        )
+        return results['dcf_per_share'] - target_price
+    
+    low = np.full(target_price.shape, float(low_bound))
+    high = np.full(target_price.shape, float(high_bound))
+    gap_low = price_gap(low)
+    gap_high = price_gap(high)
+    
+    # 探索範囲の両端で符号が変わる（範囲内に解がある）銘柄だけを解く
+    solvable = np.isfinite(gap_low) & np.isfinite(gap_high) & (np.sign(gap_low) != np.sign(gap_high))
+    solvable |= (gap_low == 0) | (gap_high == 0)
+    
+    for _ in range(max_iter):
+        mid = (low + high) / 2
+        gap_mid = price_gap(mid)
+        same_side = np.sign(gap_mid) == np.sign(gap_low)
+        low = np.where(same_side, mid, low)
+        gap_low = np.where(same_side, gap_mid, gap_low)
+        high = np.where(same_side, high, mid)
+        if np.all(high - low < tol):
+            break
+    
+    implied = (low + high) / 2
+    return np.where(solvable, implied, np.nan)
+
+# モンテカルロ法で確率分布を指定できるパラメータ
+MONTE_CARLO_PARAMETERS = ('revenue_growth', 'net_margin', 'discount_rate', 'terminal_multiple')
+
+def _standard_normal_cdf(z):
+    """標準正規分布の累積分布関数（Abramowitz-Stegun 7.1.26 近似, 誤差 1.5e-7 以下）"""
+    x = np.abs(z) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-x * x)
+    return 0.5 * (1.0 + np.sign(z) * erf)
+
+def _sample_parameter(spec, z):
+    """
+    標準正規乱数 z を指定された分布の標本に変換する（ガウシアン・コピュラ）
+    
+    spec はスカラー（固定値）または dict:
+      {'dist': 'normal', 'mean': μ, 'std': σ}
+      {'dist': 'uniform', 'low': a, 'high': b}
+      {'dist': 'triangular', 'low': a, 'mode': c, 'high': b}
+    'min' / 'max' を指定すると標本をその範囲に収める。
+    """
+    if not isinstance(spec, dict):
+        return np.full(z.shape, float(spec))
+    
+    dist = spec.get('dist', 'normal')
+    if dist == 'normal':
+        values = spec['mean'] + spec.get('std', 0.0) * z
+    elif dist == 'uniform':
+        u = _standard_normal_cdf(z)
+        values = spec['low'] + u * (spec['high'] - spec['low'])
+    elif dist == 'triangular':
+        u = _standard_normal_cdf(z)
+        low, mode, high = spec['low'], spec['mode'], spec['high']
+        width = max(high - low, 1e-12)
+        split = (mode - low) / width
+        values = np.where(
+            u < split,
+            low + np.sqrt(u * width * (mode - low)),
+            high - np.sqrt((1 - u) * width * (high - mode))
+        )
+    else:
+        raise ValueError(f"未対応の分布です: {dist}")
+    
+    if 'min' in spec or 'max' in spec:
+        values = np.clip(values, spec.get('min', -np.inf), spec.get('max', np.inf))
+    return values
+
+def simulate_intrinsic_value(base_revenue, shares_outstanding, forecast_years, parameters,
+                             correlation=None, n_paths=100_000, chunk_size=25_000,
+                             current_price=None, include_forecast_period=True,
+                             histogram_bins=60, seed=None):
+    """
+    モンテカルロ法でDCF本質的価値の分布をシミュレーションする
+    
+    成長率・純利益率・割引率・ターミナル倍率をそれぞれ指定した分布から
+    （必要なら相関を持たせて）サンプリングし、calculate_intrinsic_value_grid で
+    チャンクごとにベクトル化して評価する。途中の配列はチャンクサイズに比例する
+    メモリしか使わない。
+    
+    Parameters:
+    -----------
+    base_revenue : float
+        基準年（現在）の売上高
+    shares_outstanding : float
+        発行済株式数（base_revenue と同じ単位系）
+    forecast_years : int
+        予測期間（年）
+    parameters : dict
+        MONTE_CARLO_PARAMETERS の各キーに対する固定値または分布の指定
+        （指定方法は _sample_parameter を参照）
+    correlation : array-like, optional
+        MONTE_CARLO_PARAMETERS の順に並べた 4×4 の相関行列
+    n_paths : int
+        シミュレーション回数
+    chunk_size : int
+        1回に評価するパス数
+    current_price : float, optional
+        現在の株価。指定すると割安確率と上昇余地の分布を計算する
+    include_forecast_period : bool
+        calculate_intrinsic_value_grid を参照
+    histogram_bins : int
+        ヒストグラムの階級数
+    seed : int, optional
+        乱数シード（同じシードなら同じ結果）
+        
+    Returns:
+    --------
+    dict
+        パーセンタイル、平均、標準偏差、割安確率、ヒストグラムを含む辞書
+    """
+    missing = [name for name in MONTE_CARLO_PARAMETERS if name not in parameters]
+    if missing:
+        raise ValueError(f"パラメータが不足しています: {', '.join(missing)}")
+    
+    n_paths = int(n_paths)
+    chunk_size = max(1, int(chunk_size))
+    rng = np.random.default_rng(seed)
+    
+    cholesky = None
+    if correlation is not None:
+        cholesky = np.linalg.cholesky(np.asarray(correlation, dtype=float))
+    
+    values = np.empty(n_paths)
+    for start in range(0, n_paths, chunk_size):
+        size = min(chunk_size, n_paths - start)
+        z = rng.standard_normal((size, len(MONTE_CARLO_PARAMETERS)))
+        if cholesky is not None:
+            z = z @ cholesky.T
+        
+        samples = {
+            name: _sample_parameter(parameters[name], z[:, i])
+            for i, name in enumerate(MONTE_CARLO_PARAMETERS)
+        }
+        results = calculate_intrinsic_value_grid(
+            base_revenue,
+            samples['revenue_growth'],
+            samples['net_margin'],
+            samples['discount_rate'],
+            samples['terminal_multiple'],
+            forecast_years,
+            shares_outstanding,
+            include_forecast_period=include_forecast_period
+        )
+        values[start:start + size] = results['dcf_per_share']
+    
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        raise ValueError("有効なシミュレーション結果がありません")
+    
+    percentile_levels = [5, 10, 25, 50, 75, 90, 95]
+    percentile_values = np.percentile(values, percentile_levels)
+    
+    # 外れ値で階級幅が潰れないよう、0.5〜99.5パーセンタイルの範囲で集計する
+    low, high = np.percentile(values, [0.5, 99.5])
+    counts, bin_edges = np.histogram(values, bins=histogram_bins, range=(low, high) if high > low else None)
+    
+    result = {
+        'n_paths': int(values.size),
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'percentiles': dict(zip(percentile_levels, percentile_values.tolist())),
+        'histogram': {'counts': counts.tolist(), 'bin_edges': bin_edges.tolist()},
+    }
+    
+    if current_price:
+        result['probability_undervalued'] = float((values > current_price).mean())
+        result['upside_percentiles'] = dict(zip(
+            percentile_levels, ((percentile_values / current_price - 1) * 100).tolist()
+        ))
+    
+    return result
+
+class IncrementalDCFModel:
+    """
+    入力の変更部分だけを再計算するDCFモデル
+    
+    calculate_intrinsic_value_grid の各段階（成長パスと成長倍率、割引係数、
+    予測期間の現在価値の係数）をその段階の入力だけをキーにキャッシュし、
+    同じ段階関数で評価額を組み立てる。割引率のスライダーを動かしても成長側の
+    段階は再計算されず、成長率を動かしても割引係数は再計算されない。
+    DCF価値計算機ページのように、スライダー操作のたびにスクリプト全体が
+    再実行される画面でセッション間に保持して使う。
+    """
+    
+    INPUT_NAMES = ('base_revenue', 'revenue_growth', 'net_margin', 'discount_rate',
+                   'terminal_multiple', 'forecast_years', 'shares_outstanding', 'include_forecast_period')
+    
+    def __init__(self, max_cached_stages=256):
+        self.max_cached_stages = max_cached_stages
+        self._inputs = {}
+        self._stages = {}
+    
+    def update(self, **inputs):
+        """
+        入力値を更新する
+        
+        Returns:
+        --------
+        set
+            値が変わった入力の名前
+        """
+        unknown = set(inputs) - set(self.INPUT_NAMES)
+        if unknown:
+            raise ValueError(f"不明な入力です: {', '.join(sorted(unknown))}")
+        
+        changed = {name for name, value in inputs.items() if self._inputs.get(name) != value}
+        self._inputs.update(inputs)
+        return changed
+    
+    def _input(self, name):
+        if name not in self._inputs:
+            raise ValueError(f"入力が設定されていません: {name}")
+        return self._inputs[name]
+    
+    def _stage(self, name, key, compute):
+        """段階 name の結果を key（その段階の入力）ごとにLRUでキャッシュする"""
+        cache = self._stages.setdefault(name, OrderedDict())
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        value = compute()
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+        cache[key] = value
+        if len(cache) > self.max_cached_stages:
+            cache.popitem(last=False)
+        return value
+    
+    def growth_path(self, revenue_growth, forecast_years):
+        """成長率 g（%）の成長パス (1+g)^t（t=1..N）"""
+        key = (float(revenue_growth), int(forecast_years))
+        return self._stage('growth_path', key,
+                           lambda: (1 + key[0] / 100) ** np.arange(1, key[1] + 1))
+    
+    def _growth_factors(self, growth_rates, forecast_years):
+        key = (growth_rates, int(forecast_years))
+        return self._stage('growth_factor', key,
+                           lambda: _dcf_growth_factor(np.array(growth_rates), key[1]))
+    
+    def _discount_factors(self, discount_rates, forecast_years):
+        key = (discount_rates, int(forecast_years))
+        return self._stage('discount_factor', key,
+                           lambda: _dcf_discount_factor(np.array(discount_rates), key[1]))
+    
+    def _forecast_series(self, growth_rates, discount_rates, forecast_years):
+        key = (growth_rates, discount_rates, int(forecast_years))
+        return self._stage('forecast_series', key, lambda: _dcf_forecast_series(
+            np.array(growth_rates)[:, np.newaxis], np.array(discount_rates)[np.newaxis, :], key[2]))
+    
+    def _evaluate(self, growth_rates, discount_rates):
+        """成長率×割引率の組み合わせごとの評価（キャッシュ済みの段階から組み立てる）"""
+        years = self._input('forecast_years')
+        base_net_income = self._input('base_revenue') * self._input('net_margin') / 100
+        growth_factor = self._growth_factors(growth_rates, years)[:, np.newaxis]
+        discount_factor = self._discount_factors(discount_rates, years)[np.newaxis, :]
+        series = None
+        if self._inputs.get('include_forecast_period', True):
+            series = self._forecast_series(growth_rates, discount_rates, years)
+        return _combine_dcf_stages(base_net_income, growth_factor, discount_factor, series,
+                                   self._input('terminal_multiple'), self._input('shares_outstanding'))
+    
+    def forecast(self):
+        """
+        予測期間の売上高と純利益
+        
+        Returns:
+        --------
+        dict
+            'year', 'revenue', 'net_income' の配列
+        """
+        path = self.growth_path(self._input('revenue_growth'), self._input('forecast_years'))
+        revenue = self._input('base_revenue') * path
+        return {
+            'year': np.arange(1, len(path) + 1),
+            'revenue': revenue,
+            'net_income': revenue * (self._input('net_margin') / 100)
+        }
+    
+    def valuation(self):
+        """
+        現在の入力でのDCF評価
+        
+        Returns:
+        --------
+        dict
+            calculate_intrinsic_value と同じキーに 'discount_factor'（最終年）を加えた辞書
+        """
+        growth_rates = (float(self._input('revenue_growth')),)
+        discount_rates = (float(self._input('discount_rate')),)
+        result = {key: float(value[0, 0]) for key, value in self._evaluate(growth_rates, discount_rates).items()}
+        result['discount_factor'] = float(self._discount_factors(discount_rates, self._input('forecast_years'))[0])
+        return result
+    
+    def sensitivity_grid(self, growth_rates, discount_rates):
+        """
+        成長率×割引率の1株あたり価値のマトリックス
+        
+        calculate_sensitivity_grid と同じ値を、成長率ごと・割引率ごとに
+        キャッシュした段階から組み立てる。
+        
+        Parameters:
+        -----------
+        growth_rates : array-like
+            成長率（%）の一覧（行）
+        discount_rates : array-like
+            割引率（%）の一覧（列）
+            
+        Returns:
+        --------
+        numpy.ndarray
+            形状 (len(growth_rates), len(discount_rates)) の1株あたり価値
+        """
+        growth_rates = tuple(float(g) for g in np.ravel(growth_rates))
+        discount_rates = tuple(float(d) for d in np.ravel(discount_rates))
+        return self._evaluate(growth_rates, discount_rates)['dcf_per_share']
+
 def calculate_financial_ratios(market_cap, revenue, net_income, book_value, shares_outstanding):
     """
     主要な財務指標を計算する
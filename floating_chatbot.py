@@ -1,6 +1,7 @@
 import streamlit as st
 import os
 from openai import OpenAI
+from llm_response_cache import stream_openai_text
 
 # Initialize OpenAI client
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
@@ -252,11 +253,15 @@ def render_floating_chatbot():
         st.session_state.chat_messages.append({"role": "user", "content": user_input})
         
         # Generate AI response
+        streamed = False
         try:
             if openai_client:
-                response = process_chat_message(user_input)
+                # Show the answer as it streams in
+                with st.chat_message("assistant"):
+                    response = st.write_stream(stream_chat_message(user_input))
                 st.session_state.chat_messages.append({"role": "assistant", "content": response})
                 st.success("回答を生成しました！")
+                streamed = True
             else:
                 # Fallback to specialized platform responses
                 fallback_response = get_specialized_response(user_input)
@@ -274,13 +279,21 @@ def render_floating_chatbot():
             })
             st.warning("APIエラーのため、プラットフォーム専用回答を表示")
         
-        st.rerun()
+        # A rerun would erase the streamed answer; the history picks it up on the next run
+        if not streamed:
+            st.rerun()
 
 
 def process_chat_message(message):
     """Process chat message and generate response"""
+    return "".join(stream_chat_message(message))
+
+
+def stream_chat_message(message):
+    """Process chat message and yield the response as it is generated"""
     if not openai_client:
-        return "OpenAI APIキーが設定されていません。チャット機能を使用するにはAPIキーを設定してください。"
+        yield "OpenAI APIキーが設定されていません。チャット機能を使用するにはAPIキーを設定してください。"
+        return
     
     # Rate limiting check
     import time
@@ -290,7 +303,8 @@ def process_chat_message(message):
     
     # Limit to one call per 3 seconds to avoid rate limits
     if current_time - st.session_state.last_api_call < 3:
-        return "レート制限を避けるため、少しお待ちください。"
+        yield "レート制限を避けるため、少しお待ちください。"
+        return
     
     try:
         st.session_state.last_api_call = current_time
@@ -319,23 +333,23 @@ def process_chat_message(message):
 
 ユーザーが企業名やティッカーを言及した場合、そのデータがプラットフォームにあるかを確認し、具体的な分析を提案してください。"""
         
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024. do not change this unless explicitly requested by the user
-            messages=[
+        yield from stream_openai_text(
+            openai_client,
+            "gpt-4o",  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024. do not change this unless explicitly requested by the user
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": message}
             ],
+            "chat",
             max_tokens=300,
             temperature=0.7
         )
         
-        return response.choices[0].message.content
-        
     except Exception as e:
         error_msg = str(e)
         if "quota" in error_msg or "429" in error_msg:
-            return "現在、OpenAI APIの利用枠に制限があります。APIキーの課金設定をご確認ください。詳細については OpenAI のドキュメントをご参照ください。"
+            yield "現在、OpenAI APIの利用枠に制限があります。APIキーの課金設定をご確認ください。詳細については OpenAI のドキュメントをご参照ください。"
         elif "401" in error_msg or "invalid" in error_msg:
-            return "APIキーが無効です。正しいOpenAI APIキーを設定してください。"
+            yield "APIキーが無効です。正しいOpenAI APIキーを設定してください。"
         else:
-            return f"申し訳ございませんが、リクエストの処理中にエラーが発生しました: {error_msg}"
\ No newline at end of file
+            yield f"申し訳ございませんが、リクエストの処理中にエラーが発生しました: {error_msg}"
\ No newline at end of file
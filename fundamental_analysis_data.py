@@ -1,10 +1,16 @@
 import yfinance as yf
 import pandas as pd
+import numpy as np
 import streamlit as st
 from datetime import datetime
 import plotly.express as px
 import plotly.graph_objects as go
 
+# Vectorized universe scoring lives in a module without Streamlit/Plotly imports
+# so screening worker processes can use it; re-exported here for existing callers
+from fundamental_scoring import (calculate_financial_health_scores, calculate_growth_scores,
+                                 create_fundamental_scorecards, calculate_sector_percentiles)
+
 def get_comprehensive_fundamental_data(ticker):
     """
     Get comprehensive fundamental analysis data for a company using live Yahoo Finance data
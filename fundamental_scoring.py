@@ -0,0 +1,138 @@
+"""
+Vectorized fundamental scores for a whole universe of companies
+
+Counterparts of the per-company scorecard in fundamental_analysis_data,
+kept free of Streamlit and Plotly imports so screening worker processes
+start quickly.
+"""
+import numpy as np
+import pandas as pd
+
+def _score_input(metrics, column, fallback=None):
+    """Get a numeric column of the metrics table, NaN where missing"""
+    if column not in metrics.columns and fallback is not None:
+        column = fallback
+    if column not in metrics.columns:
+        return np.full(len(metrics), np.nan)
+    return pd.to_numeric(metrics[column], errors='coerce').to_numpy(dtype=float)
+
+def _band_points(values, conditions, points, lowest):
+    """Points of the first band a value falls in; missing (NaN) values score the lowest band"""
+    return np.where(np.isnan(values), lowest, np.select(conditions, points, default=lowest))
+
+def calculate_financial_health_scores(metrics):
+    """
+    Calculate financial health scores for many companies at once
+    
+    Vectorized counterpart of calculate_financial_health_score with the same
+    thresholds; a missing (NaN) input scores the lowest band.
+    
+    Parameters:
+    -----------
+    metrics : pandas.DataFrame
+        Universe metrics table (see stock_screener) with debt_ratio,
+        current_ratio, operating_margin and roe columns, NaN where unknown
+        
+    Returns:
+    --------
+    pandas.Series
+        Financial health score (40-100) per row
+    """
+    debt_to_equity = _score_input(metrics, 'debt_ratio', 'debt_to_equity')
+    current_ratio = _score_input(metrics, 'current_ratio')
+    operating_margin = _score_input(metrics, 'operating_margin')
+    roe = _score_input(metrics, 'roe')
+    
+    with np.errstate(invalid='ignore'):
+        score = _band_points(debt_to_equity, [debt_to_equity < 0.3, debt_to_equity < 0.6, debt_to_equity < 1.0],
+                             [25, 20, 15], 10)
+        score += _band_points(current_ratio, [(current_ratio >= 1.2) & (current_ratio <= 2.0),
+                                              (current_ratio >= 1.0) & (current_ratio < 1.2)], [25, 20], 10)
+        score += _band_points(operating_margin, [operating_margin > 25, operating_margin > 15, operating_margin > 10],
+                              [25, 20, 15], 10)
+        score += _band_points(roe, [roe > 20, roe > 15, roe > 10], [25, 20, 15], 10)
+    
+    return pd.Series(score, index=metrics.index, name='financial_score')
+
+def calculate_growth_scores(metrics):
+    """
+    Calculate growth scores for many companies at once
+    
+    Vectorized counterpart of calculate_growth_score. Uses revenue_growth_5y
+    when the table has it and the latest revenue_growth otherwise. Cached
+    records carry no earnings growth, so for rows without earnings_growth_5y
+    the revenue band alone is mapped linearly onto the scalar score's 40-100
+    range (10 -> 40, 20 -> 70, 25 -> 85, 30 -> 100). A missing (NaN) input
+    scores the lowest band.
+    
+    Parameters:
+    -----------
+    metrics : pandas.DataFrame
+        Universe metrics table (see stock_screener), NaN where unknown
+        
+    Returns:
+    --------
+    pandas.Series
+        Growth score (40-100) per row
+    """
+    revenue_growth = _score_input(metrics, 'revenue_growth_5y', 'revenue_growth')
+    earnings_growth = _score_input(metrics, 'earnings_growth_5y')
+    gap = np.abs(revenue_growth - earnings_growth)
+    
+    with np.errstate(invalid='ignore'):
+        revenue_points = _band_points(revenue_growth, [revenue_growth > 20, revenue_growth > 10, revenue_growth > 5],
+                                      [30, 25, 20], 10)
+        earnings_points = _band_points(earnings_growth, [earnings_growth > 25, earnings_growth > 15, earnings_growth > 10],
+                                       [30, 25, 20], 10)
+        consistency_points = _band_points(gap, [gap < 5, gap < 10], [40, 30], 20)
+    
+    # The revenue band spans 10-30 points; the full score spans 40-100
+    score = np.where(np.isnan(earnings_growth),
+                     40 + (revenue_points - 10) * 3,
+                     revenue_points + earnings_points + consistency_points)
+    
+    return pd.Series(score, index=metrics.index, name='growth_score')
+
+def create_fundamental_scorecards(metrics):
+    """
+    Create fundamental scorecards for a whole universe of companies
+    
+    Vectorized counterpart of create_fundamental_scorecard. The competitive
+    score uses a competitive_advantages column (number of advantages) when
+    present, otherwise the single generic advantage every non-template
+    company gets.
+    
+    Parameters:
+    -----------
+    metrics : pandas.DataFrame
+        Universe metrics table (see stock_screener)
+        
+    Returns:
+    --------
+    pandas.DataFrame
+        overall_score, financial_score, growth_score and competitive_score per row
+    """
+    financial_score = calculate_financial_health_scores(metrics)
+    growth_score = calculate_growth_scores(metrics)
+    
+    if 'competitive_advantages' in metrics.columns:
+        advantages = pd.to_numeric(metrics['competitive_advantages'], errors='coerce').fillna(1)
+    else:
+        advantages = pd.Series(1, index=metrics.index)
+    competitive_score = advantages * 20  # Max 100
+    
+    # Overall fundamental score (weighted average)
+    overall_score = financial_score * 0.4 + growth_score * 0.3 + competitive_score * 0.3
+    
+    return pd.DataFrame({
+        'overall_score': overall_score.clip(upper=100),
+        'financial_score': financial_score,
+        'growth_score': growth_score,
+        'competitive_score': competitive_score.clip(upper=100)
+    }, index=metrics.index)
+
+def calculate_sector_percentiles(metrics, column='overall_score'):
+    """
+    Percentile rank (0-100) of a column within each company's sector
+    """
+    return metrics.groupby('sector')[column].rank(pct=True) * 100
@@ -4,7 +4,7 @@ import logging
 from google import genai
 from google.genai import types
 import yfinance as yf
-from twitter_sentiment_analyzer import TwitterDueDiligenceAnalyzer
+from llm_response_cache import cached_gemini_text, stream_gemini_text
 
 # Initialize Gemini client (prioritize GOOGLE_API_KEY if available)
 api_key = os.environ.get("GOOGLE_API_KEY") or os.environ.get("GEMINI_API_KEY")
@@ -23,56 +23,37 @@ def _check_client():
         raise Exception("Gemini API client is not initialized. Please check your API key configuration.")
     return client
 
-def analyze_company_fundamentals(ticker):
-    """
-    Generate comprehensive fundamental analysis report using Gemini AI
-    """
-    try:
-        gemini_client = _check_client()
-        # Get company data
-        stock = yf.Ticker(ticker)
-        info = stock.info
-        
-        # Get Twitter sentiment analysis for comprehensive due diligence
-        twitter_analyzer = TwitterDueDiligenceAnalyzer()
-        social_analysis = twitter_analyzer.generate_social_due_diligence_summary(ticker, info.get('longName', ticker))
-        
-        # Prepare company data for analysis
-        company_data = {
-            'ticker': ticker,
-            'name': info.get('longName', ticker),
-            'sector': info.get('sector', 'N/A'),
-            'industry': info.get('industry', 'N/A'),
-            'market_cap': info.get('marketCap', 0),
-            'revenue': info.get('totalRevenue', 0),
-            'profit_margins': info.get('profitMargins', 0),
-            'pe_ratio': info.get('trailingPE', 0),
-            'pb_ratio': info.get('priceToBook', 0),
-            'debt_to_equity': info.get('debtToEquity', 0),
-            'roe': info.get('returnOnEquity', 0),
-            'business_summary': info.get('longBusinessSummary', '')[:1000]  # Limit length
-        }
-        
-        prompt = f"""
+def _fundamentals_prompt(ticker):
+    """Gemini prompt for the fundamental analysis report (fetches the company data it needs)"""
+    # Get company data
+    stock = yf.Ticker(ticker)
+    info = stock.info
+    
+    # Prepare company data for analysis
+    company_data = {
+        'ticker': ticker,
+        'name': info.get('longName', ticker),
+        'sector': info.get('sector', 'N/A'),
+        'industry': info.get('industry', 'N/A'),
+        'market_cap': info.get('marketCap', 0),
+        'revenue': info.get('totalRevenue', 0),
+        'profit_margins': info.get('profitMargins', 0),
+        'pe_ratio': info.get('trailingPE', 0),
+        'pb_ratio': info.get('priceToBook', 0),
+        'debt_to_equity': info.get('debtToEquity', 0),
+        'roe': info.get('returnOnEquity', 0),
+        'business_summary': info.get('longBusinessSummary', '')[:1000]  # Limit length
+    }
+    
+    prompt = f"""
 {company_data['name']} ({company_data['ticker']})の長期投資家向けの包括的なデューデリジェンス調査を作成してください。
-財務データ、市場データ、そしてソーシャルメディア分析を統合した多角的な視点から詳細分析を提供してください。
+財務データと市場データに基づく多角的な視点から詳細分析を提供してください。
 
 企業名: {company_data['name']} ({company_data['ticker']})
 セクター: {company_data['sector']}
 業界: {company_data['industry']}
 事業概要: {company_data['business_summary']}
 
-## ソーシャルメディア投資家情勢
-**Twitter分析結果**: 
-- 全体センチメント: {social_analysis.get('sentiment_analysis', {}).get('overall_sentiment', 'データなし')}
-- 投資家議論数: {social_analysis.get('sentiment_analysis', {}).get('tweet_count', 0)}件
-- 主要テーマ: {', '.join(social_analysis.get('sentiment_analysis', {}).get('key_themes', [])[:3])}
-- 強気シグナル: {', '.join(social_analysis.get('sentiment_analysis', {}).get('bullish_signals', [])[:3])}
-- 弱気シグナル: {', '.join(social_analysis.get('sentiment_analysis', {}).get('bearish_signals', [])[:3])}
-- 機関投資家関連議論: {len(social_analysis.get('institutional_insights', {}).get('insights', []))}件
-
-このソーシャルメディア分析結果も踏まえ、投資家コミュニティの視点や懸念点も考慮して以下の分析を行ってください。
-
 まず、魅力的な企業ビジョンのヘッドラインで分析レポートを開始してください：
 
 ## 📈 企業ビジョン・ヘッドライン
@@ -179,18 +160,49 @@ def analyze_company_fundamentals(ticker):
 表面的な一般論ではなく、この企業特有の詳細な洞察を提供し、優れた投資家が重視する質的要因を明確にしてください。
 特に、この企業の独自のビジネスモデルがなぜ持続可能な競争優位性を生み出すのかを詳細に説明してください。
 """
+    return prompt
 
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=prompt
+def analyze_company_fundamentals(ticker):
+    """
+    Generate comprehensive fundamental analysis report using Gemini AI
+    """
+    try:
+        gemini_client = _check_client()
+
+        # Keyed by ticker, so a cached report is served before any company data is fetched
+        text = cached_gemini_text(
+            gemini_client, "gemini-2.0-flash-exp", lambda: _fundamentals_prompt(ticker), "fundamentals",
+            prompt_key=('fundamentals', ticker.upper())
         )
         
-        return response.text if response.text else "分析レポートの生成に失敗しました。"
+        return text if text else "分析レポートの生成に失敗しました。"
         
     except Exception as e:
         logging.error(f"Fundamental analysis error: {e}")
         return f"分析エラー: {str(e)}"
 
+def analyze_company_fundamentals_stream(ticker):
+    """
+    Stream the fundamental analysis report as Gemini generates it
+
+    Yields text chunks as they arrive (a cached report arrives as one chunk);
+    errors are yielded as the same messages analyze_company_fundamentals returns.
+    """
+    try:
+        gemini_client = _check_client()
+        received = False
+        for chunk in stream_gemini_text(
+            gemini_client, "gemini-2.0-flash-exp", lambda: _fundamentals_prompt(ticker), "fundamentals",
+            prompt_key=('fundamentals', ticker.upper())
+        ):
+            received = True
+            yield chunk
+        if not received:
+            yield "分析レポートの生成に失敗しました。"
+    except Exception as e:
+        logging.error(f"Fundamental analysis error: {e}")
+        yield f"分析エラー: {str(e)}"
+
 def translate_earnings_transcript(transcript_text):
     """
     Translate and analyze earnings call transcript using Gemini
@@ -221,12 +233,11 @@ def translate_earnings_transcript(transcript_text):
 翻訳は自然な日本語で、投資判断に役立つ情報を重視してください。
 """
 
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=prompt
+        text = cached_gemini_text(
+            gemini_client, "gemini-2.0-flash-exp", prompt, "translation"
         )
         
-        return response.text if response.text else "翻訳に失敗しました。"
+        return text if text else "翻訳に失敗しました。"
         
     except Exception as e:
         logging.error(f"Translation error: {e}")
@@ -454,13 +465,12 @@ The quarterly results show {"positive business momentum" if qoq_revenue_change >
 [これらの事業変化が投資判断に与える影響]
 """
 
-            response = client.models.generate_content(
-                model="gemini-2.0-flash-exp",
-                contents=prompt
+            text = cached_gemini_text(
+                client, "gemini-2.0-flash-exp", prompt, "earnings_transcript"
             )
             
-            if response.text:
-                return response.text
+            if text:
+                return text
             else:
                 return f"{company_name}の決算分析の翻訳に失敗しました。"
         
@@ -500,13 +510,12 @@ The company operates in the {info.get('sector', 'technology')} sector and contin
 [翻訳された財務分析内容]
 """
 
-            response = client.models.generate_content(
-                model="gemini-2.0-flash-exp",
-                contents=prompt
+            text = cached_gemini_text(
+                client, "gemini-2.0-flash-exp", prompt, "earnings_transcript"
             )
             
-            if response.text:
-                return response.text
+            if text:
+                return text
             else:
                 return f"{company_name}の財務分析を生成しました。詳細な決算説明会トランスクリプトについては、企業の投資家向けページをご確認ください。"
             
@@ -599,12 +608,12 @@ def generate_business_insights(ticker):
 各セクションで具体的な数値を使用し、日本の個人投資家にとって実用的で理解しやすい分析を提供してください。この企業への投資を検討する際の重要な要因を明確に説明してください。
 """
 
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=prompt
+        text = cached_gemini_text(
+            gemini_client, "gemini-2.0-flash-exp", prompt, "business_insights",
+            data_version=company_data
         )
         
-        return response.text if response.text else "ビジネス分析の生成に失敗しました。"
+        return text if text else "ビジネス分析の生成に失敗しました。"
         
     except Exception as e:
         logging.error(f"Business insights generation error: {e}")
@@ -643,12 +652,11 @@ def analyze_historical_metrics_insight(ticker, metrics_data):
 簡潔で実用的な分析を提供してください。
 """
 
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash-exp", 
-            contents=prompt
+        text = cached_gemini_text(
+            gemini_client, "gemini-2.0-flash-exp", prompt, "metrics_insight"
         )
         
-        return response.text if response.text else "分析に失敗しました。"
+        return text if text else "分析に失敗しました。"
         
     except Exception as e:
         logging.error(f"Metrics analysis error: {e}")
@@ -682,24 +690,20 @@ def generate_earnings_summary(ticker, financial_data):
 実用的で分かりやすい分析を提供してください。
 """
 
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=prompt
+        text = cached_gemini_text(
+            gemini_client, "gemini-2.0-flash-exp", prompt, "earnings_summary",
+            data_version=financial_data
         )
         
-        return response.text if response.text else "決算分析の生成に失敗しました。"
+        return text if text else "決算分析の生成に失敗しました。"
         
     except Exception as e:
         logging.error(f"Earnings analysis error: {e}")
         return f"分析エラー: {str(e)}"
 
-def generate_comprehensive_financial_analysis(ticker, company_name, financial_data):
-    """
-    Generate comprehensive financial analysis using Gemini AI for financial statements page
-    """
-    try:
-        gemini_client = _check_client()
-        prompt = f"""
+def _comprehensive_financial_prompt(ticker, company_name, financial_data):
+    """Gemini prompt for the financial statements analysis"""
+    prompt = f"""
 {company_name} ({ticker})の詳細財務諸表分析を日本語で作成してください。
 
 企業名: {company_name} ({ticker})
@@ -747,17 +751,43 @@ ROA: {financial_data.get('roa', 0):.2%}
 分析は具体的で実用的な内容とし、投資家が意思決定に活用できる洞察を提供してください。
 数値は適切にフォーマットし、日本の投資家にとって理解しやすい表現を使用してください。
 """
+    return prompt
 
-        response = gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
+def generate_comprehensive_financial_analysis(ticker, company_name, financial_data):
+    """
+    Generate comprehensive financial analysis using Gemini AI for financial statements page
+    """
+    try:
+        gemini_client = _check_client()
+        prompt = _comprehensive_financial_prompt(ticker, company_name, financial_data)
+
+        text = cached_gemini_text(
+            gemini_client, "gemini-2.5-flash", prompt, "financial_analysis",
+            data_version=financial_data
         )
         
-        if response and response.text:
-            return response.text
+        if text:
+            return text
         else:
             return None
             
     except Exception as e:
         logging.error(f"Gemini financial analysis error for {ticker}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def generate_comprehensive_financial_analysis_stream(ticker, company_name, financial_data):
+    """
+    Stream the financial statements analysis as Gemini generates it
+
+    Yields text chunks as they arrive (a cached analysis arrives as one chunk);
+    yields nothing when the analysis cannot be generated.
+    """
+    try:
+        gemini_client = _check_client()
+        prompt = _comprehensive_financial_prompt(ticker, company_name, financial_data)
+        yield from stream_gemini_text(
+            gemini_client, "gemini-2.5-flash", prompt, "financial_analysis",
+            data_version=financial_data
+        )
+    except Exception as e:
+        logging.error(f"Gemini financial analysis error for {ticker}: {e}")
@@ -12,6 +12,8 @@ import yfinance as yf
 from google import genai
 from google.genai import types
 
+from llm_response_cache import cached_gemini_text
+
 # Initialize Gemini client (prioritize GOOGLE_API_KEY if available)
 api_key = os.environ.get("GOOGLE_API_KEY") or os.environ.get("GEMINI_API_KEY")
 client = None
@@ -72,17 +74,20 @@ Return ONLY valid JSON with these exact keys (all values must be positive number
 
 Generate realistic values appropriate for {ticker}'s sector and market cap. The market_context must be written in Japanese and provide professional analysis of the historical valuation trends. Ensure ALL numeric values are positive."""
 
-        response = gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
+        text = cached_gemini_text(
+            gemini_client,
+            "gemini-2.5-flash",
+            prompt,
+            "historical_metrics",
             config=types.GenerateContentConfig(
                 response_mime_type="application/json",
                 temperature=0.3,
             ),
+            validate=json.loads,
         )
         
-        if response.text:
-            result = json.loads(response.text)
+        if text:
+            result = json.loads(text)
             # Log the response for debugging
             print(f"Gemini response for {ticker}: {result}")
             return result
@@ -318,17 +323,20 @@ Return JSON with specific business developments in Japanese:
 
 Generate realistic content in Japanese appropriate for {ticker}'s industry sector. All content must be in Japanese."""
 
-        response = gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
+        text = cached_gemini_text(
+            gemini_client,
+            "gemini-2.5-flash",
+            prompt,
+            "quarterly_developments",
             config=types.GenerateContentConfig(
                 response_mime_type="application/json",
                 temperature=0.4,
             ),
+            validate=json.loads,
         )
         
-        if response.text:
-            result = json.loads(response.text)
+        if text:
+            result = json.loads(text)
             print(f"Gemini quarterly developments for {ticker}: {result}")
             return result
         else:
@@ -390,20 +398,23 @@ def generate_qa_section_analysis_with_ai(ticker):
 Q&Aの対話的性質と提起された具体的な懸念に焦点を当ててください。
 JSON形式のみで回答してください。すべて日本語で記述してください。"""
 
-        response = gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[
+        text = cached_gemini_text(
+            gemini_client,
+            "gemini-2.5-flash",
+            [
                 types.Content(role="user", parts=[types.Part(text=prompt)])
             ],
+            "qa_analysis",
             config=types.GenerateContentConfig(
                 system_instruction=system_prompt,
                 response_mime_type="application/json",
                 temperature=0.3,
             ),
+            validate=json.loads,
         )
         
-        if response.text:
-            result = json.loads(response.text)
+        if text:
+            result = json.loads(text)
             print(f"Gemini Q&A analysis for {ticker}: {result}")
             return result
         else:
@@ -10,77 +10,110 @@ import yfinance as yf
 from datetime import datetime, timedelta
 import numpy as np
 from openai_analyzer import generate_historical_metrics_with_ai
+from price_history_store import get_price_history
+from chart_downsampling import downsample_series, trace_point_budget
 
-def get_authentic_historical_ratios(ticker, hist_data, info):
+def get_authentic_historical_ratios(ticker, hist_data, info, max_quarters=40):
     """Calculate authentic historical financial ratios using real financial data"""
     try:
         stock = yf.Ticker(ticker)
         
         # Get real quarterly financial data
         quarterly_financials = stock.quarterly_financials
-        quarterly_earnings = stock.quarterly_earnings if hasattr(stock, 'quarterly_earnings') else None
         
-        if quarterly_financials.empty:
+        if quarterly_financials.empty or hist_data.empty:
             return None
-            
-        metrics_data = []
-        
-        # Get real financial data points
-        for date in quarterly_financials.columns[:8]:  # Last 8 quarters (2 years)
-            try:
-                # Find closest price date
-                price_date = min(hist_data.index, key=lambda x: abs((x.date() - date.date()).days))
-                stock_price = hist_data.loc[price_date, 'Close']
-                
-                # Calculate authentic ratios using real financial data
-                total_revenue = quarterly_financials.loc['Total Revenue', date] if 'Total Revenue' in quarterly_financials.index else 0
-                net_income = quarterly_financials.loc['Net Income', date] if 'Net Income' in quarterly_financials.index else 0
-                
-                # Get shares outstanding from info (approximation)
-                shares_outstanding = info.get('sharesOutstanding', info.get('impliedSharesOutstanding', 1))
-                
-                # Calculate authentic ratios
-                eps = (net_income * 4) / shares_outstanding if shares_outstanding > 0 else 0  # Annualized
-                pe_ratio = stock_price / eps if eps > 0 else 0
-                
-                # Revenue per share for PS ratio
-                revenue_per_share = (total_revenue * 4) / shares_outstanding if shares_outstanding > 0 else 0
-                ps_ratio = stock_price / revenue_per_share if revenue_per_share > 0 else 0
-                
-                # Use current PB ratio as approximation (book value changes slowly)
-                pb_ratio = info.get('priceToBook', 0)
-                
-                # PEG ratio (using growth estimate)
-                growth_rate = info.get('earningsGrowth', 0.1) * 100
-                peg_ratio = pe_ratio / growth_rate if growth_rate > 0 and pe_ratio > 0 else 0
-                
-                # Only add if we have valid data
-                if pe_ratio > 0 and pe_ratio < 200:  # Reasonable PE range
-                    metrics_data.append({
-                        'Date': price_date,
-                        'PE_Ratio': pe_ratio,
-                        'PB_Ratio': pb_ratio,
-                        'PS_Ratio': ps_ratio,
-                        'PEG_Ratio': peg_ratio,
-                        'Stock_Price': stock_price
-                    })
-                    
-            except Exception:
-                continue
         
-        return pd.DataFrame(metrics_data) if metrics_data else None
+        return calculate_historical_ratios(quarterly_financials, hist_data, info, max_quarters=max_quarters)
         
     except Exception:
         return None
 
+def calculate_historical_ratios(quarterly_financials, hist_data, info, max_quarters=40):
+    """
+    Compute quarterly PE, PS, PB and PEG ratios for every statement date at once
+    
+    Each statement date is matched to the nearest trading day with a single
+    as-of join against the price history, instead of scanning the price index
+    once per quarter.
+    """
+    def statement_row(name):
+        if name in quarterly_financials.index:
+            return pd.to_numeric(quarterly_financials.loc[name], errors='coerce').to_numpy(dtype=float)
+        return np.zeros(len(quarterly_financials.columns))
+    
+    statement_dates = pd.to_datetime(quarterly_financials.columns)
+    if statement_dates.tz is not None:
+        statement_dates = statement_dates.tz_localize(None)
+    
+    statements = pd.DataFrame({
+        'statement_date': statement_dates.normalize(),
+        'total_revenue': statement_row('Total Revenue'),
+        'net_income': statement_row('Net Income'),
+    }).sort_values('statement_date', ascending=False).head(max_quarters)
+    
+    # Price series keyed by calendar day (the statement dates carry no time zone)
+    price_days = hist_data.index
+    if price_days.tz is not None:
+        price_days = price_days.tz_localize(None)
+    prices = pd.DataFrame({
+        'price_day': price_days.normalize(),
+        'Date': hist_data.index,
+        'Stock_Price': hist_data['Close'].to_numpy(dtype=float),
+    })
+    
+    # Nearest trading day for every statement date in one pass
+    merged = pd.merge_asof(
+        statements.sort_values('statement_date'),
+        prices.sort_values('price_day'),
+        left_on='statement_date',
+        right_on='price_day',
+        direction='nearest'
+    )
+    
+    # Get shares outstanding from info (approximation)
+    shares_outstanding = info.get('sharesOutstanding', info.get('impliedSharesOutstanding', 1)) or 0
+    
+    stock_price = merged['Stock_Price'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Annualized per-share figures
+        if shares_outstanding > 0:
+            eps = merged['net_income'].to_numpy(dtype=float) * 4 / shares_outstanding
+            revenue_per_share = merged['total_revenue'].to_numpy(dtype=float) * 4 / shares_outstanding
+        else:
+            eps = np.zeros(len(merged))
+            revenue_per_share = np.zeros(len(merged))
+        
+        pe_ratio = np.where(eps > 0, stock_price / eps, 0.0)
+        ps_ratio = np.where(revenue_per_share > 0, stock_price / revenue_per_share, 0.0)
+        
+        # PEG ratio (using growth estimate)
+        earnings_growth = info.get('earningsGrowth', 0.1)
+        growth_rate = (earnings_growth if earnings_growth is not None else 0.1) * 100
+        peg_ratio = np.where((pe_ratio > 0) & (growth_rate > 0), pe_ratio / growth_rate, 0.0)
+    
+    metrics = pd.DataFrame({
+        'Date': merged['Date'],
+        'PE_Ratio': pe_ratio,
+        # Use current PB ratio as approximation (book value changes slowly)
+        'PB_Ratio': info.get('priceToBook', 0),
+        'PS_Ratio': ps_ratio,
+        'PEG_Ratio': peg_ratio,
+        'Stock_Price': stock_price,
+    })
+    
+    # Only keep quarters with a reasonable PE
+    metrics = metrics[(metrics['PE_Ratio'] > 0) & (metrics['PE_Ratio'] < 200)].reset_index(drop=True)
+    return metrics if not metrics.empty else None
+
 def get_historical_metrics(ticker, years=10):
     """Get historical financial metrics using authentic Yahoo Finance data"""
     try:
         stock = yf.Ticker(ticker)
         info = stock.info
         
-        # Get historical price data
-        hist_data = stock.history(period=f"{years}y")
+        # Get historical price data (served from the local price store)
+        hist_data = get_price_history(ticker, f"{years}y")
         if hist_data.empty:
             return None
             
@@ -461,18 +494,30 @@ def display_historical_metrics_chart(ticker):
                     st.plotly_chart(peg_fig, use_container_width=True)
                 
                 with tab5:
-                    # Stock price chart
+                    # Stock price chart (daily closes from the price store, reduced to the point budget)
                     price_fig = go.Figure()
                     
-                    price_fig.add_trace(go.Scatter(
-                        x=metrics_df['Date'],
-                        y=metrics_df['Stock_Price'],
-                        mode='lines+markers',
-                        name='株価',
-                        line=dict(color='#8b5cf6', width=3),
-                        marker=dict(size=6),
-                        hovertemplate='日付: %{x}<br>株価: $%{y:.2f}<extra></extra>'
-                    ))
+                    daily_prices = get_price_history(ticker, "10y")
+                    if not daily_prices.empty:
+                        prices = downsample_series(daily_prices['Close'], trace_point_budget('historical_metrics'))
+                        price_fig.add_trace(go.Scatter(
+                            x=prices.index,
+                            y=prices.values,
+                            mode='lines',
+                            name='株価',
+                            line=dict(color='#8b5cf6', width=3),
+                            hovertemplate='日付: %{x}<br>株価: $%{y:.2f}<extra></extra>'
+                        ))
+                    else:
+                        price_fig.add_trace(go.Scatter(
+                            x=metrics_df['Date'],
+                            y=metrics_df['Stock_Price'],
+                            mode='lines+markers',
+                            name='株価',
+                            line=dict(color='#8b5cf6', width=3),
+                            marker=dict(size=6),
+                            hovertemplate='日付: %{x}<br>株価: $%{y:.2f}<extra></extra>'
+                        ))
                     
                     price_fig.update_layout(
                         title=f"{ticker} - 株価推移 10年",
@@ -0,0 +1,297 @@
+"""
+Persistent cache of Gemini and OpenAI responses
+
+Responses are content-addressed: the key is a hash of the provider, model,
+prompt (with the generation settings) and the version of the input data the
+prompt was built from, so an identical request is answered from disk instead
+of another paid API round trip. Each analysis type has its own time-to-live.
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# Time-to-live per analysis type, in hours
+ANALYSIS_TTL_HOURS = {
+    'fundamentals': 24,
+    'business_insights': 24,
+    'financial_analysis': 24,
+    'metrics_insight': 24,
+    'historical_metrics': 24 * 7,
+    'current_metrics': 6,
+    'earnings_summary': 12,
+    'earnings_transcript': 24,
+    'translation': 24 * 30,
+    'quarterly_developments': 24,
+    'qa_analysis': 24,
+    'chat': 1,
+}
+DEFAULT_TTL_HOURS = 24
+
+
+def _stable_json(value):
+    """Deterministic text form of a prompt, message list, settings or input data"""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=repr)
+
+
+def _cacheable(text, validate=None):
+    """Whether a response may be cached: non-blank and accepted by validate (when given)"""
+    if not text or not text.strip():
+        return False
+    if validate is not None:
+        try:
+            validate(text)
+        except Exception:
+            return False
+    return True
+
+
+def make_cache_key(provider, model, prompt, data_version=None, params=None):
+    """
+    Content address of one request
+
+    Parameters:
+    -----------
+    provider : str
+        'gemini' or 'openai'
+    model : str
+        Model name
+    prompt : str, list or object
+        Prompt text, chat messages or Gemini contents
+    data_version : object, optional
+        Input data the prompt was built from (or a precomputed version string)
+    params : object, optional
+        Generation settings that change the response (temperature, response format, ...)
+
+    Returns:
+    --------
+    str
+        SHA-256 hex digest
+    """
+    prompt_hash = hashlib.sha256(_stable_json(prompt).encode('utf-8')).hexdigest()
+    if data_version is not None and not isinstance(data_version, str):
+        data_version = hashlib.sha256(_stable_json(data_version).encode('utf-8')).hexdigest()
+    payload = _stable_json([provider, model, prompt_hash, data_version, params])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, cache_dir="llm_cache", max_memory_entries=256):
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except Exception:
+            pass
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    @staticmethod
+    def _ttl(analysis_type):
+        return timedelta(hours=ANALYSIS_TTL_HOURS.get(analysis_type, DEFAULT_TTL_HOURS))
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key, analysis_type):
+        """Cached response text for key, or None when missing or older than the type's TTL"""
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is None:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    entry = pickle.load(f)
+            except Exception:
+                return None
+            self._remember(key, entry)
+        if datetime.now() - entry['created_at'] >= self._ttl(analysis_type):
+            return None
+        return entry['text']
+
+    def put(self, key, text, analysis_type, provider=None, model=None):
+        """Store a response in memory and on disk"""
+        entry = {
+            'text': text,
+            'created_at': datetime.now(),
+            'analysis_type': analysis_type,
+            'provider': provider,
+            'model': model,
+        }
+        self._remember(key, entry)
+        try:
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            pass  # Fail silently if persisting fails; the in-memory entry still serves
+
+    def get_or_generate(self, provider, model, prompt, analysis_type, generate, data_version=None, params=None,
+                        validate=None):
+        """
+        Return the cached response for this request, calling the API on a miss
+
+        Parameters:
+        -----------
+        provider, model, prompt, data_version, params :
+            Parts of the cache key (see make_cache_key)
+        analysis_type : str
+            Key of ANALYSIS_TTL_HOURS deciding how long the response stays valid
+        generate : callable
+            Zero-argument function calling the API and returning the response text
+        validate : callable, optional
+            Called with the response text; a response it raises on is returned
+            but not cached (e.g. json.loads for JSON-mode requests)
+
+        Returns:
+        --------
+        str or None
+            Empty or invalid responses are not cached, so they are retried on the next run
+        """
+        key = make_cache_key(provider, model, prompt, data_version, params)
+        text = self.get(key, analysis_type)
+        if text is not None:
+            return text
+
+        text = generate()
+        if _cacheable(text, validate):
+            self.put(key, text, analysis_type, provider, model)
+        return text
+
+    def stream_or_generate(self, provider, model, prompt, analysis_type, stream, data_version=None, params=None,
+                           validate=None):
+        """
+        Yield the response text in chunks as it is generated, caching the final text
+
+        A cached response is yielded whole. Otherwise the chunks from stream()
+        are passed through as they arrive and, once the stream has finished,
+        the joined text is stored under the same key get_or_generate uses, so
+        streamed and non-streamed calls share their cached responses.
+
+        Parameters:
+        -----------
+        stream : callable
+            Zero-argument function calling the API and returning an iterator of text chunks
+        validate : callable, optional
+            Checked against the joined text before it is cached (see get_or_generate)
+        """
+        key = make_cache_key(provider, model, prompt, data_version, params)
+        text = self.get(key, analysis_type)
+        if text is not None:
+            yield text
+            return
+
+        chunks = []
+        for chunk in stream():
+            if chunk:
+                chunks.append(chunk)
+                yield chunk
+        text = ''.join(chunks)
+        if _cacheable(text, validate):
+            self.put(key, text, analysis_type, provider, model)
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._memory.clear()
+        try:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.cache_dir, name))
+        except Exception:
+            pass
+
+
+# Global cache instance
+llm_cache = LLMResponseCache()
+
+
+def _request_parts(contents, prompt_key):
+    """Cache-key prompt and a function producing the request contents"""
+    if prompt_key is None:
+        return contents, lambda: contents
+    return prompt_key, (contents if callable(contents) else lambda: contents)
+
+
+def cached_gemini_text(client, model, contents, analysis_type, config=None, data_version=None, validate=None,
+                       prompt_key=None):
+    """
+    Text of a Gemini generate_content call, served from the response cache when possible
+
+    The generation config is part of the cache key, so the same prompt with a
+    different temperature or response format is cached separately. Pass
+    validate=json.loads for JSON-mode requests so unparseable responses are
+    retried instead of cached.
+
+    With prompt_key, the key is built from prompt_key instead of the contents,
+    and contents may be a zero-argument function building the prompt: it is
+    only called on a cache miss, so data fetched for the prompt is not fetched
+    for a cached response.
+    """
+    key_prompt, build_contents = _request_parts(contents, prompt_key)
+
+    def generate():
+        response = client.models.generate_content(model=model, contents=build_contents(), config=config)
+        return response.text if response else None
+
+    return llm_cache.get_or_generate('gemini', model, key_prompt, analysis_type, generate,
+                                     data_version=data_version, params=config, validate=validate)
+
+
+def cached_openai_text(client, model, messages, analysis_type, data_version=None, validate=None, **kwargs):
+    """
+    Message content of an OpenAI chat completion, served from the response cache when possible
+
+    Extra keyword arguments (temperature, response_format, ...) are passed to
+    the API and are part of the cache key. validate works as in cached_gemini_text.
+    """
+    def generate():
+        response = client.chat.completions.create(model=model, messages=messages, **kwargs)
+        return response.choices[0].message.content
+
+    return llm_cache.get_or_generate('openai', model, messages, analysis_type, generate,
+                                     data_version=data_version, params=kwargs, validate=validate)
+
+
+def stream_gemini_text(client, model, contents, analysis_type, config=None, data_version=None, validate=None,
+                       prompt_key=None):
+    """
+    Text chunks of a Gemini generate_content_stream call as they arrive
+
+    Shares its cache entries with cached_gemini_text (prompt_key works the
+    same way); a cached response is yielded as a single chunk.
+    """
+    key_prompt, build_contents = _request_parts(contents, prompt_key)
+
+    def stream():
+        for chunk in client.models.generate_content_stream(model=model, contents=build_contents(), config=config):
+            yield chunk.text
+
+    return llm_cache.stream_or_generate('gemini', model, key_prompt, analysis_type, stream,
+                                        data_version=data_version, params=config, validate=validate)
+
+
+def stream_openai_text(client, model, messages, analysis_type, data_version=None, validate=None, **kwargs):
+    """
+    Content deltas of a streamed OpenAI chat completion as they arrive
+
+    Shares its cache entries with cached_openai_text; a cached response is
+    yielded as a single chunk.
+    """
+    def stream():
+        for chunk in client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs):
+            if chunk.choices:
+                yield chunk.choices[0].delta.content
+
+    return llm_cache.stream_or_generate('openai', model, messages, analysis_type, stream,
+                                        data_version=data_version, params=kwargs, validate=validate)
@@ -1,12 +1,20 @@
 """
 Real market and industry averages calculator using Yahoo Finance data
 Calculates authentic S&P500, NASDAQ, and sector-specific industry averages
+
+Medians are kept in a materialized table built from the shared ticker cache
+and refreshed in the background, so page code reads them without fetching.
 """
-import yfinance as yf
+import os
+import pickle
+import threading
+import time
 import pandas as pd
 import streamlit as st
 from datetime import datetime, timedelta
 import numpy as np
+from stock_cache_manager import stock_cache, get_cached_financial_data
+from quantile_sketch import valuation_sketches
 
 # S&P 500 representative ETF and major components
 SP500_TICKERS = ['SPY', 'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'NVDA', 'META', 'BRK-B', 'UNH']
@@ -29,121 +37,228 @@ SECTOR_TICKERS = {
     'Communication Services': ['GOOGL', 'META', 'NFLX', 'DIS', 'VZ', 'T', 'CMCSA', 'CHTR', 'TMUS', 'ATVI']
 }
 
-@st.cache_data(ttl=3600)  # Cache for 1 hour
-def calculate_real_market_averages():
-    """Calculate real S&P500 and NASDAQ averages using live data"""
+# Sector name variations mapped to SECTOR_TICKERS keys
+SECTOR_NAME_VARIATIONS = {
+    'Technology': ['Technology', 'Information Technology'],
+    'Healthcare': ['Healthcare', 'Health Care'],
+    'Financial Services': ['Financial Services', 'Financials', 'Financial'],
+    'Consumer Cyclical': ['Consumer Cyclical', 'Consumer Discretionary'],
+    'Consumer Defensive': ['Consumer Defensive', 'Consumer Staples'],
+    'Industrials': ['Industrials', 'Industrial'],
+    'Energy': ['Energy'],
+    'Utilities': ['Utilities'],
+    'Real Estate': ['Real Estate'],
+    'Materials': ['Materials', 'Basic Materials'],
+    'Communication Services': ['Communication Services', 'Telecommunications']
+}
+
+# Index groups and their constituents
+INDEX_TICKERS = {
+    'sp500': SP500_TICKERS,
+    'nasdaq': NASDAQ_TICKERS,
+}
+
+# Reasonable PE ranges; tickers outside them are left out of the medians
+INDEX_PE_RANGE = (5, 100)
+SECTOR_PE_RANGE = (5, 150)
+
+# Known recent market levels, used until the aggregate table has data
+FALLBACK_MARKET_AVERAGES = {
+    'sp500': {'pe': 22.5, 'ps': 2.8, 'pb': 4.2},
+    'nasdaq': {'pe': 25.8, 'ps': 3.4, 'pb': 4.9}
+}
+
+
+def resolve_sector_key(sector):
+    """Map a sector name (any common variation) to its SECTOR_TICKERS key, or None"""
+    if not sector:
+        return None
+    for key, variations in SECTOR_NAME_VARIATIONS.items():
+        if any(variation.lower() in sector.lower() for variation in variations):
+            return key
+    return None
+
+
+def _ratio_value(value):
+    """Ratio as float; missing or zero ratios become NaN so medians skip them"""
     try:
-        sp500_data = []
-        nasdaq_data = []
-        
-        # Calculate S&P 500 averages
-        for ticker in SP500_TICKERS:
-            try:
-                stock = yf.Ticker(ticker)
-                info = stock.info
-                
-                pe = info.get('trailingPE') or info.get('forwardPE')
-                ps = info.get('priceToSalesTrailing12Months')
-                pb = info.get('priceToBook')
-                
-                if pe and 5 < pe < 100:  # Reasonable range
-                    sp500_data.append({'pe': pe, 'ps': ps, 'pb': pb})
-            except:
-                continue
-        
-        # Calculate NASDAQ averages
-        for ticker in NASDAQ_TICKERS:
-            try:
-                stock = yf.Ticker(ticker)
-                info = stock.info
-                
-                pe = info.get('trailingPE') or info.get('forwardPE')
-                ps = info.get('priceToSalesTrailing12Months')
-                pb = info.get('priceToBook')
-                
-                if pe and 5 < pe < 100:  # Reasonable range
-                    nasdaq_data.append({'pe': pe, 'ps': ps, 'pb': pb})
-            except:
-                continue
-        
-        # Calculate averages
-        sp500_pe = np.median([d['pe'] for d in sp500_data if d['pe']])
-        sp500_ps = np.median([d['ps'] for d in sp500_data if d['ps']])
-        sp500_pb = np.median([d['pb'] for d in sp500_data if d['pb']])
-        
-        nasdaq_pe = np.median([d['pe'] for d in nasdaq_data if d['pe']])
-        nasdaq_ps = np.median([d['ps'] for d in nasdaq_data if d['ps']])
-        nasdaq_pb = np.median([d['pb'] for d in nasdaq_data if d['pb']])
+        value = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return value if value else np.nan
+
+
+def build_valuation_aggregates(records):
+    """
+    Median PE/PS/PB for every index and sector group
+
+    Parameters:
+    -----------
+    records : list of dict
+        Cached financial data records (ticker, sector, pe_ratio, ps_ratio, pb_ratio)
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Indexed by group ('sp500', 'nasdaq' and the SECTOR_TICKERS keys) with
+        columns pe, ps, pb and count. Sectors use their representative tickers
+        plus every cached ticker of that sector.
+    """
+    records = [r for r in records if r and r.get('ticker')]
+    ratios = pd.DataFrame({
+        'ticker': [str(r['ticker']).upper() for r in records],
+        'sector_key': [resolve_sector_key(r.get('sector')) for r in records],
+        'pe': [_ratio_value(r.get('pe_ratio')) for r in records],
+        'ps': [_ratio_value(r.get('ps_ratio')) for r in records],
+        'pb': [_ratio_value(r.get('pb_ratio')) for r in records],
+    }).drop_duplicates('ticker')
+
+    membership = [(group, ticker) for group, tickers in INDEX_TICKERS.items() for ticker in tickers]
+    membership += [(group, ticker) for group, tickers in SECTOR_TICKERS.items() for ticker in tickers]
+    membership += list(ratios.dropna(subset=['sector_key'])[['sector_key', 'ticker']].itertuples(index=False, name=None))
+    membership = pd.DataFrame(membership, columns=['group', 'ticker']).drop_duplicates()
+
+    merged = membership.merge(ratios.drop(columns='sector_key'), on='ticker')
+    is_index = merged['group'].isin(list(INDEX_TICKERS)).to_numpy()
+    pe_min = np.where(is_index, INDEX_PE_RANGE[0], SECTOR_PE_RANGE[0])
+    pe_max = np.where(is_index, INDEX_PE_RANGE[1], SECTOR_PE_RANGE[1])
+    merged = merged[(merged['pe'] > pe_min) & (merged['pe'] < pe_max)]
+
+    grouped = merged.groupby('group')
+    table = grouped[['pe', 'ps', 'pb']].median()
+    table['count'] = grouped.size()
+    return table
+
+
+class ValuationAggregateTable:
+    def __init__(self, table_path="valuation_aggregates.pkl", refresh_minutes=60):
+        self.table_path = table_path
+        self.refresh_interval = timedelta(minutes=refresh_minutes)
+        self._entry = None
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+
+    def _load(self):
+        """Load the materialized table ({'table', 'updated_at'})"""
+        if self._entry is not None:
+            return self._entry
+        try:
+            with open(self.table_path, 'rb') as f:
+                self._entry = pickle.load(f)
+        except Exception:
+            return None
+        return self._entry
+
+    def _save(self, entry):
+        self._entry = entry
+        try:
+            tmp_path = f"{self.table_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f)
+            os.replace(tmp_path, self.table_path)
+        except Exception:
+            pass  # Fail silently if persisting fails; the in-memory table still serves
+
+    def refresh(self, fetch_missing=False):
+        """
+        Recompute the aggregates from the shared ticker cache
+
+        With fetch_missing=False nothing is downloaded; the background refresh
+        passes True so group tickers missing from the cache get fetched.
+        """
+        records = {}
+        for record in stock_cache.get_all_cached_data():
+            if record and record.get('ticker'):
+                records[str(record['ticker']).upper()] = record
+
+        group_tickers = set(SP500_TICKERS) | set(NASDAQ_TICKERS)
+        for tickers in SECTOR_TICKERS.values():
+            group_tickers.update(tickers)
+        if fetch_missing:
+            for ticker in sorted(group_tickers - set(records)):
+                try:
+                    record = get_cached_financial_data(ticker)
+                except Exception:
+                    continue
+                if record:
+                    records[ticker] = record
+
+        entry = {'table': build_valuation_aggregates(list(records.values())), 'updated_at': datetime.now()}
+        self._save(entry)
         
+        # The same pass rebuilds the market-wide distributions, dropping superseded values
+        valuation_sketches.rebuild(list(records.values()))
+        return entry
+
+    def start_background_refresh(self):
+        """Start the scheduled refresh thread once per process"""
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+
+            def refresh_loop():
+                # The first pass always runs, so a table loaded from disk or left
+                # under-populated gets its missing group tickers fetched right away
+                while True:
+                    try:
+                        self.refresh(fetch_missing=True)
+                    except Exception:
+                        pass
+                    time.sleep(self.refresh_interval.total_seconds())
+
+            self._refresh_thread = threading.Thread(target=refresh_loop, name="valuation-aggregates", daemon=True)
+            self._refresh_thread.start()
+
+    def get(self, group):
+        """
+        Median ratios for one group
+
+        Returns:
+        --------
+        dict or None
+            {'pe', 'ps', 'pb'}; None when the group has no data yet (callers
+            fall back to fixed levels while the background thread builds the table)
+        """
+        self.start_background_refresh()
+        entry = self._load()
+        if entry is None:
+            return None
+
+        table = entry['table']
+        if group not in table.index or pd.isna(table.at[group, 'pe']):
+            return None
+        row = table.loc[group]
+        return {'pe': row['pe'], 'ps': row['ps'], 'pb': row['pb']}
+
+
+# Global aggregate table instance
+valuation_aggregates = ValuationAggregateTable()
+
+
+def calculate_real_market_averages():
+    """S&P500 and NASDAQ median ratios from the materialized aggregate table"""
+    try:
         return {
-            'sp500': {'pe': sp500_pe, 'ps': sp500_ps, 'pb': sp500_pb},
-            'nasdaq': {'pe': nasdaq_pe, 'ps': nasdaq_ps, 'pb': nasdaq_pb}
+            index: valuation_aggregates.get(index) or dict(fallback)
+            for index, fallback in FALLBACK_MARKET_AVERAGES.items()
         }
-        
     except Exception as e:
         st.warning(f"Market averages calculation failed: {str(e)}")
         # Fallback to known recent market levels
-        return {
-            'sp500': {'pe': 22.5, 'ps': 2.8, 'pb': 4.2},
-            'nasdaq': {'pe': 25.8, 'ps': 3.4, 'pb': 4.9}
-        }
+        return {index: dict(fallback) for index, fallback in FALLBACK_MARKET_AVERAGES.items()}
 
-@st.cache_data(ttl=3600)  # Cache for 1 hour
 def calculate_real_industry_averages(sector):
-    """Calculate real industry averages for specific sector using live data"""
+    """Sector median ratios from the materialized aggregate table"""
     try:
-        # Map common sector variations to our sector keys
-        sector_mapping = {
-            'Technology': ['Technology', 'Information Technology'],
-            'Healthcare': ['Healthcare', 'Health Care'],
-            'Financial Services': ['Financial Services', 'Financials', 'Financial'],
-            'Consumer Cyclical': ['Consumer Cyclical', 'Consumer Discretionary'],
-            'Consumer Defensive': ['Consumer Defensive', 'Consumer Staples'],
-            'Industrials': ['Industrials', 'Industrial'],
-            'Energy': ['Energy'],
-            'Utilities': ['Utilities'],
-            'Real Estate': ['Real Estate'],
-            'Materials': ['Materials', 'Basic Materials'],
-            'Communication Services': ['Communication Services', 'Telecommunications']
-        }
-        
-        # Find matching sector
-        sector_key = None
-        for key, variations in sector_mapping.items():
-            if any(variation.lower() in sector.lower() for variation in variations):
-                sector_key = key
-                break
-        
+        sector_key = resolve_sector_key(sector)
         if not sector_key or sector_key not in SECTOR_TICKERS:
             # Default to broader market if sector not found
             return calculate_real_market_averages()['sp500']
         
-        industry_data = []
-        tickers = SECTOR_TICKERS[sector_key]
-        
-        for ticker in tickers:
-            try:
-                stock = yf.Ticker(ticker)
-                info = stock.info
-                
-                pe = info.get('trailingPE') or info.get('forwardPE')
-                ps = info.get('priceToSalesTrailing12Months')
-                pb = info.get('priceToBook')
-                
-                if pe and 5 < pe < 150:  # Reasonable range
-                    industry_data.append({'pe': pe, 'ps': ps, 'pb': pb})
-            except:
-                continue
-        
-        if industry_data:
-            industry_pe = np.median([d['pe'] for d in industry_data if d['pe']])
-            industry_ps = np.median([d['ps'] for d in industry_data if d['ps']])
-            industry_pb = np.median([d['pb'] for d in industry_data if d['pb']])
-            
-            return {'pe': industry_pe, 'ps': industry_ps, 'pb': industry_pb}
-        else:
-            # Fallback to market averages if no industry data
-            return calculate_real_market_averages()['sp500']
+        # Fallback to market averages if no industry data
+        return valuation_aggregates.get(sector_key) or calculate_real_market_averages()['sp500']
             
     except Exception as e:
         st.warning(f"Industry averages calculation failed for {sector}: {str(e)}")
@@ -160,10 +275,14 @@ def get_comprehensive_market_data(ticker_info):
         sector = ticker_info.get('sector', 'Technology')
         industry_data = calculate_real_industry_averages(sector)
         
+        # Medians across every cached ticker, from the streaming sketches
+        universe_data = {metric: valuation_sketches.median(metric) for metric in ('pe', 'ps', 'pb')}
+        
         return {
             'sp500': market_data['sp500'],
             'nasdaq': market_data['nasdaq'],
             'industry': industry_data,
+            'universe': universe_data,
             'sector_name': sector
         }
         
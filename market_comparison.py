@@ -7,21 +7,20 @@ import plotly.graph_objects as go
 import pandas as pd
 import streamlit as st
 from datetime import datetime, timedelta
+from price_history_store import get_price_history, price_history_store
+from benchmark_cache import BENCHMARK_INDICES, benchmark_cache, get_sector_etf
+from chart_downsampling import downsample_series, trace_point_budget
 
 def get_market_indices_data(period="1y"):
     """Get historical data for major market indices"""
     try:
-        # Fetch data for major indices
-        nasdaq = yf.Ticker("^IXIC")  # NASDAQ Composite
-        sp500 = yf.Ticker("^GSPC")   # S&P 500
+        # Shared across users and tickers; refreshed in the background
+        indices_data = {}
+        for key, symbol in BENCHMARK_INDICES.items():
+            entry = benchmark_cache.get(symbol, period)
+            indices_data[key] = entry['data'] if entry else pd.DataFrame()
         
-        nasdaq_data = nasdaq.history(period=period)
-        sp500_data = sp500.history(period=period)
-        
-        return {
-            'nasdaq': nasdaq_data,
-            'sp500': sp500_data
-        }
+        return indices_data
     except Exception as e:
         st.error(f"市場指数データの取得エラー: {e}")
         return None
@@ -40,7 +39,7 @@ def create_stock_vs_market_chart(ticker, period="1y"):
     try:
         # Get stock data
         stock = yf.Ticker(ticker)
-        stock_data = stock.history(period=period)
+        stock_data = get_price_history(ticker, period)
         stock_info = stock.info
         company_name = stock_info.get('longName', ticker)
         
@@ -60,13 +59,24 @@ def create_stock_vs_market_chart(ticker, period="1y"):
         
         # Filter data to common date range
         stock_filtered = stock_data[stock_data.index >= start_date]
-        nasdaq_filtered = indices_data['nasdaq'][indices_data['nasdaq'].index >= start_date]
-        sp500_filtered = indices_data['sp500'][indices_data['sp500'].index >= start_date]
         
-        # Normalize data
+        # Normalize data (index curves are pre-normalized in the shared cache)
         stock_normalized = normalize_price_data(stock_filtered, start_date)
-        nasdaq_normalized = normalize_price_data(nasdaq_filtered, start_date)
-        sp500_normalized = normalize_price_data(sp500_filtered, start_date)
+        nasdaq_normalized = benchmark_cache.get_normalized(BENCHMARK_INDICES['nasdaq'], period, start_date)
+        sp500_normalized = benchmark_cache.get_normalized(BENCHMARK_INDICES['sp500'], period, start_date)
+        
+        # Sector ETF for the stock's sector, when there is one
+        sector_etf = get_sector_etf(stock_info.get('sector'))
+        sector_normalized = benchmark_cache.get_normalized(sector_etf, period, start_date) if sector_etf else None
+        
+        # Keep long periods within the chart's point budget
+        n_traces = 4 if sector_normalized is not None and not sector_normalized.empty else 3
+        max_points = trace_point_budget('stock_vs_market', n_traces)
+        stock_normalized = downsample_series(stock_normalized, max_points)
+        nasdaq_normalized = downsample_series(nasdaq_normalized, max_points)
+        sp500_normalized = downsample_series(sp500_normalized, max_points)
+        if sector_normalized is not None:
+            sector_normalized = downsample_series(sector_normalized, max_points)
         
         # Create comparison chart
         fig = go.Figure()
@@ -101,6 +111,17 @@ def create_stock_vs_market_chart(ticker, period="1y"):
             hovertemplate='S&P 500: %{y:.2f}%<extra></extra>'
         ))
         
+        # Add sector ETF
+        if sector_normalized is not None and not sector_normalized.empty:
+            fig.add_trace(go.Scatter(
+                x=sector_normalized.index,
+                y=sector_normalized.values,
+                mode='lines',
+                name=f'セクターETF ({sector_etf})',
+                line=dict(color='#9467bd', width=2, dash='dot'),
+                hovertemplate=f'{sector_etf}: %{{y:.2f}}%<extra></extra>'
+            ))
+        
         # Update layout
         fig.update_layout(
             title=f'{company_name} ({ticker}) vs 主要市場指数 - パフォーマンス比較',
@@ -156,8 +177,7 @@ def display_stock_market_comparison(ticker, period="1y"):
             
             # Add performance summary
             try:
-                stock = yf.Ticker(ticker)
-                stock_data = stock.history(period=selected_period)
+                stock_data = get_price_history(ticker, selected_period)
                 indices_data = get_market_indices_data(selected_period)
                 
                 if not stock_data.empty and indices_data:
@@ -193,7 +213,55 @@ def display_stock_market_comparison(ticker, period="1y"):
             except Exception as e:
                 st.warning("パフォーマンス統計の計算中にエラーが発生しました")
 
-def create_individual_stock_comparison_chart(tickers, period="1y"):
+def get_aligned_price_frame(tickers, period="1y"):
+    """
+    Fetch all tickers in one batch and align their closes on one date index
+    
+    Rows start at the latest first trading day among the tickers, so every
+    column covers the same window; gaps (e.g. different exchange holidays) are
+    forward-filled.
+    """
+    histories = price_history_store.get_histories(tickers, period)
+    if not histories:
+        return pd.DataFrame()
+    
+    closes = {}
+    for ticker, data in histories.items():
+        close = data['Close'].dropna()
+        if close.empty:
+            continue
+        # Align by calendar day so exchanges in different time zones line up
+        index = close.index.tz_localize(None) if close.index.tz is not None else close.index
+        closes[ticker] = pd.Series(close.to_numpy(), index=index.normalize())
+    if not closes:
+        return pd.DataFrame()
+    
+    frame = pd.DataFrame(closes)
+    frame = frame[~frame.index.duplicated(keep='last')].sort_index()
+    common_start = max(series.index[0] for series in closes.values())
+    return frame[frame.index >= common_start].ffill()
+
+def normalize_price_frame(closes):
+    """Percentage change of every column from the first row"""
+    return (closes / closes.iloc[0] - 1) * 100
+
+def calculate_period_returns(closes):
+    """Return (%) of every column over the whole frame"""
+    return (closes.iloc[-1] / closes.iloc[0] - 1) * 100
+
+def get_company_names(tickers):
+    """Company names from local data only (stock cache, then the stock list)"""
+    from stock_cache_manager import stock_cache
+    from comprehensive_stock_data import get_stock_info
+    
+    names = {}
+    for ticker in tickers:
+        cached = stock_cache.get_cached_data(ticker)
+        name = cached.get('name') if cached else None
+        names[ticker] = name or get_stock_info(ticker.upper()).get('name', ticker)
+    return names
+
+def create_individual_stock_comparison_chart(tickers, period="1y", closes=None, names=None):
     """Create comparison chart for multiple individual stocks"""
     try:
         if not tickers or len(tickers) < 2:
@@ -203,47 +271,32 @@ def create_individual_stock_comparison_chart(tickers, period="1y"):
         fig = go.Figure()
         colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b']
         
-        # Get common date range
-        start_dates = []
-        stock_data = {}
-        
-        for ticker in tickers:
-            try:
-                stock = yf.Ticker(ticker)
-                data = stock.history(period=period)
-                if not data.empty:
-                    stock_data[ticker] = data
-                    start_dates.append(data.index[0])
-            except:
-                continue
+        # One aligned frame feeds every line
+        if closes is None:
+            closes = get_aligned_price_frame(tickers, period)
         
-        if not stock_data:
+        if closes.empty:
             st.error("有効なデータを取得できませんでした")
             return None
-            
-        common_start = max(start_dates)
         
-        # Normalize and plot each stock
-        for i, (ticker, data) in enumerate(stock_data.items()):
-            try:
-                # Get company name
-                stock_info = yf.Ticker(ticker).info
-                company_name = stock_info.get('shortName', ticker)
-                
-                # Filter and normalize data
-                filtered_data = data[data.index >= common_start]
-                normalized = normalize_price_data(filtered_data, common_start)
-                
-                fig.add_trace(go.Scatter(
-                    x=normalized.index,
-                    y=normalized.values,
-                    mode='lines',
-                    name=f'{ticker} ({company_name})',
-                    line=dict(color=colors[i % len(colors)], width=2),
-                    hovertemplate=f'{ticker}: %{{y:.2f}}%<extra></extra>'
-                ))
-            except:
-                continue
+        if names is None:
+            names = get_company_names(list(closes.columns))
+        
+        normalized = normalize_price_frame(closes)
+        max_points = trace_point_budget('multi_stock', len(normalized.columns))
+        
+        # Plot each stock
+        for i, ticker in enumerate(normalized.columns):
+            company_name = names.get(ticker) or names.get(ticker.upper(), ticker)
+            line = downsample_series(normalized[ticker], max_points)
+            fig.add_trace(go.Scatter(
+                x=line.index,
+                y=line.values,
+                mode='lines',
+                name=f'{ticker} ({company_name})',
+                line=dict(color=colors[i % len(colors)], width=2),
+                hovertemplate=f'{ticker}: %{{y:.2f}}%<extra></extra>'
+            ))
         
         # Update layout
         fig.update_layout(
@@ -269,4 +322,4 @@ def create_individual_stock_comparison_chart(tickers, period="1y"):
         
     except Exception as e:
         st.error(f"比較チャート作成エラー: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,362 @@
+"""
+Cross-sectional price event detection over the local price-history store
+
+Every stored symbol is scanned once a day in a background thread. Bars are
+stacked into (bar x symbol) panels so gaps, breakouts, new 52-week highs and
+lows and abnormal volume are detected for all symbols with a few vectorized
+operations. The events are kept in a persistent index that pages can query
+without touching price data.
+"""
+import os
+import pickle
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from price_history_store import price_history_store
+
+# Event types and their labels
+EVENT_TYPES = {
+    'gap_up': 'ギャップアップ',
+    'gap_down': 'ギャップダウン',
+    'breakout': '20日高値ブレイクアウト',
+    'breakdown': '20日安値ブレイクダウン',
+    'new_52w_high': '52週高値更新',
+    'new_52w_low': '52週安値更新',
+    'abnormal_volume': '異常出来高',
+}
+
+# Detection thresholds
+GAP_THRESHOLD = 0.03           # open at least 3% away from the previous close
+BREAKOUT_WINDOW = 20           # bars in the breakout range
+YEAR_WINDOW = 252              # bars in a 52-week range
+VOLUME_WINDOW = 20             # bars in the volume baseline
+VOLUME_ZSCORE_THRESHOLD = 3.0  # volume more than 3 standard deviations above its baseline
+
+EVENT_COLUMNS = ['date', 'symbol', 'event_type', 'value', 'description']
+
+
+def _naive_dates(index):
+    """Daily bar index as timezone-naive dates, so symbols from different exchanges align"""
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.normalize()
+
+
+def build_price_panels(histories, max_bars=None):
+    """
+    Stack daily bars of many symbols into one (bar x symbol) panel per field
+
+    Symbols are aligned on their latest bar rather than on calendar dates, so
+    rolling windows always span the same number of each symbol's own bars,
+    whatever its exchange calendar.
+
+    Parameters:
+    -----------
+    histories : dict
+        {symbol: DataFrame with Open/High/Low/Close/Volume columns}
+    max_bars : int, optional
+        Keep only the most recent max_bars bars of each symbol
+
+    Returns:
+    --------
+    dict
+        {'Date': ndarray of datetime64, 'Open': DataFrame, 'High': ..., 'Low': ...,
+         'Close': ..., 'Volume': ...}; each panel has one column per symbol and
+        the last row holds every symbol's latest bar (NaN/NaT before a symbol's first bar)
+    """
+    frames = {}
+    for symbol, bars in histories.items():
+        if bars is None or bars.empty:
+            continue
+        if max_bars is not None:
+            bars = bars.tail(max_bars)
+        bars = bars.set_axis(_naive_dates(bars.index))
+        frames[symbol] = bars[~bars.index.duplicated(keep='last')]
+    if not frames:
+        return {}
+
+    symbols = list(frames)
+    n_bars = max(len(bars) for bars in frames.values())
+    dates = np.full((n_bars, len(symbols)), np.datetime64('NaT'), dtype='datetime64[ns]')
+    values = {field: np.full((n_bars, len(symbols)), np.nan)
+              for field in ('Open', 'High', 'Low', 'Close', 'Volume')}
+    for j, symbol in enumerate(symbols):
+        bars = frames[symbol]
+        start = n_bars - len(bars)
+        dates[start:, j] = bars.index.to_numpy(dtype='datetime64[ns]')
+        for field, panel in values.items():
+            if field in bars.columns:
+                panel[start:, j] = bars[field].to_numpy(dtype=float)
+
+    panels = {'Date': dates}
+    for field, panel in values.items():
+        panels[field] = pd.DataFrame(panel, columns=symbols)
+    return panels
+
+
+def detect_events(histories, since=None):
+    """
+    Detect price events for many symbols at once
+
+    Parameters:
+    -----------
+    histories : dict
+        {symbol: daily bars}
+    since : datetime-like, optional
+        Only return events on or after this date
+
+    Returns:
+    --------
+    pandas.DataFrame
+        One row per event with columns date, symbol, event_type, value
+        (gap/breakout size in %, or volume z-score) and description
+    """
+    # A year of events needs another year of bars before it for the 52-week range
+    panels = build_price_panels(histories, max_bars=(YEAR_WINDOW * 2 if since is not None else None))
+    if not panels:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+
+    dates = panels['Date']
+    open_, high, low = panels['Open'], panels['High'], panels['Low']
+    close, volume = panels['Close'], panels['Volume']
+
+    # Ranges over the bars before the current one
+    prev_close = close.shift(1)
+    prior_high = high.rolling(BREAKOUT_WINDOW).max().shift(1)
+    prior_low = low.rolling(BREAKOUT_WINDOW).min().shift(1)
+    prior_year_high = close.rolling(YEAR_WINDOW - 1).max().shift(1)
+    prior_year_low = close.rolling(YEAR_WINDOW - 1).min().shift(1)
+    volume_mean = volume.rolling(VOLUME_WINDOW).mean().shift(1)
+    volume_std = volume.rolling(VOLUME_WINDOW).std().shift(1)
+
+    gap = (open_ / prev_close - 1) * 100
+    volume_zscore = (volume - volume_mean) / volume_std.where(volume_std > 0)
+
+    signals = {
+        'gap_up': (gap >= GAP_THRESHOLD * 100, gap),
+        'gap_down': (gap <= -GAP_THRESHOLD * 100, gap),
+        'breakout': (close > prior_high, (close / prior_high - 1) * 100),
+        'breakdown': (close < prior_low, (close / prior_low - 1) * 100),
+        'new_52w_high': (close > prior_year_high, (close / prior_year_high - 1) * 100),
+        'new_52w_low': (close < prior_year_low, (close / prior_year_low - 1) * 100),
+        'abnormal_volume': (volume_zscore >= VOLUME_ZSCORE_THRESHOLD, volume_zscore),
+    }
+
+    in_range = ~np.isnat(dates)
+    if since is not None:
+        in_range &= dates >= _naive_dates([pd.Timestamp(since)])[0].to_datetime64()
+
+    symbols = np.asarray(close.columns)
+    events = []
+    for event_type, (mask, value) in signals.items():
+        rows, cols = np.nonzero(mask.to_numpy() & in_range)
+        if len(rows) == 0:
+            continue
+        events.append(pd.DataFrame({
+            'date': dates[rows, cols],
+            'symbol': symbols[cols],
+            'event_type': event_type,
+            'value': value.to_numpy()[rows, cols],
+        }))
+    if not events:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+
+    events = pd.concat(events, ignore_index=True)
+    events['description'] = describe_events(events)
+    return events.sort_values(['date', 'symbol', 'event_type'], ignore_index=True)[EVENT_COLUMNS]
+
+
+def describe_events(events):
+    """Readable description for each event row"""
+    labels = events['event_type'].map(EVENT_TYPES)
+    amounts = [
+        f"（出来高 z={value:.1f}）" if event_type == 'abnormal_volume' else f"（{value:+.1f}%）"
+        for event_type, value in zip(events['event_type'], events['value'].astype(float))
+    ]
+    return labels + pd.Series(amounts, index=events.index)
+
+
+class MarketEventIndex:
+    def __init__(self, index_path="market_events.pkl", refresh_hours=24, retain_days=365, chunk_size=500):
+        self.index_path = index_path
+        self.refresh_interval = timedelta(hours=refresh_hours)
+        self.retain_days = retain_days
+        self.chunk_size = chunk_size
+        self._index = None
+        self._index_mtime = None
+        self._lock = threading.Lock()
+        self._scan_thread = None
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        """
+        Load the persisted index ({'events', 'symbols', 'scanned_at'})
+
+        The file is re-read whenever it changes, so screening worker processes
+        pick up a rescan made by the server process.
+        """
+        mtime = self._file_mtime()
+        if self._index is not None and mtime == self._index_mtime:
+            return self._index
+        self._index_mtime = mtime
+        try:
+            with open(self.index_path, 'rb') as f:
+                self._index = pickle.load(f)
+        except Exception:
+            if self._index is not None:
+                return self._index  # Keep serving the last index read
+            self._index = {
+                'events': pd.DataFrame(columns=EVENT_COLUMNS),
+                'symbols': set(),
+                'scanned_at': None,
+            }
+        return self._index
+
+    def _save(self, index):
+        self._index = index
+        try:
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(index, f)
+            os.replace(tmp_path, self.index_path)
+        except Exception:
+            pass  # Fail silently if persisting fails; the in-memory index still serves
+        self._index_mtime = self._file_mtime()
+
+    def scan(self, store=None):
+        """
+        Rebuild the index from every history in the price store
+
+        Symbols are processed in chunks so the aligned panels stay small
+        regardless of how many symbols are stored.
+
+        Returns:
+        --------
+        pandas.DataFrame
+            All events of the last retain_days days
+        """
+        store = store if store is not None else price_history_store
+        since = pd.Timestamp.now().normalize() - pd.Timedelta(days=self.retain_days)
+
+        events, symbols, chunk = [], set(), {}
+        for symbol, bars in store.iter_stored_histories():
+            chunk[symbol] = bars
+            if len(chunk) >= self.chunk_size:
+                events.append(detect_events(chunk, since=since))
+                symbols.update(chunk)
+                chunk = {}
+        if chunk:
+            events.append(detect_events(chunk, since=since))
+            symbols.update(chunk)
+
+        events = [e for e in events if not e.empty]
+        events = pd.concat(events, ignore_index=True) if events else pd.DataFrame(columns=EVENT_COLUMNS)
+        self._save({'events': events, 'symbols': symbols, 'scanned_at': datetime.now()})
+        return events
+
+    def is_stale(self):
+        scanned_at = self._load()['scanned_at']
+        return scanned_at is None or datetime.now() - scanned_at >= self.refresh_interval
+
+    def start_background_scan(self):
+        """Start the daily scan thread once per process"""
+        if self._scan_thread is not None and self._scan_thread.is_alive():
+            return
+        with self._lock:
+            if self._scan_thread is not None and self._scan_thread.is_alive():
+                return
+
+            def scan_loop():
+                while True:
+                    if self.is_stale():
+                        try:
+                            self.scan()
+                        except Exception:
+                            pass
+                    time.sleep(self.refresh_interval.total_seconds())
+
+            self._scan_thread = threading.Thread(target=scan_loop, name="market-event-scan", daemon=True)
+            self._scan_thread.start()
+
+    def query(self, symbols=None, event_types=None, since=None):
+        """
+        Look up indexed events
+
+        Parameters:
+        -----------
+        symbols : str or list, optional
+            Restrict to these symbols
+        event_types : str or list, optional
+            Restrict to these event types (keys of EVENT_TYPES)
+        since : datetime-like, optional
+            Only events on or after this date
+
+        Returns:
+        --------
+        pandas.DataFrame
+            Matching events, newest first
+        """
+        events = self._load()['events']
+        if events.empty:
+            return events
+        mask = np.ones(len(events), dtype=bool)
+        if symbols is not None:
+            symbols = [symbols] if isinstance(symbols, str) else symbols
+            mask &= events['symbol'].isin([s.upper() for s in symbols]).to_numpy()
+        if event_types is not None:
+            event_types = [event_types] if isinstance(event_types, str) else event_types
+            mask &= events['event_type'].isin(event_types).to_numpy()
+        if since is not None:
+            mask &= (events['date'] >= _naive_dates([pd.Timestamp(since)])[0]).to_numpy()
+        return events[mask].sort_values('date', ascending=False, kind='stable')
+
+    def events_for_symbol(self, symbol, since=None):
+        """
+        Events for one symbol, detected on the spot if the symbol has not been scanned yet
+        """
+        self.start_background_scan()
+        symbol = symbol.upper()
+        if symbol in self._load()['symbols']:
+            return self.query(symbol, since=since)
+
+        bars = price_history_store.get_stored_history(symbol)
+        if bars is None:
+            return pd.DataFrame(columns=EVENT_COLUMNS)
+        events = detect_events({symbol: bars}, since=since)
+        return events.sort_values('date', ascending=False, kind='stable')
+
+    def recent_event_flags(self, symbols, days=5):
+        """
+        One 0/1 column per event type telling whether each symbol had that event recently
+
+        Parameters:
+        -----------
+        symbols : list
+            Symbols to report (row index of the result)
+        days : int
+            Calendar days to look back from the latest indexed date
+        """
+        flags = pd.DataFrame(0.0, index=pd.Index(symbols), columns=list(EVENT_TYPES))
+        events = self._load()['events']
+        if events.empty or flags.empty:
+            return flags
+        since = events['date'].max() - pd.Timedelta(days=days)
+        recent = events[(events['date'] >= since) & events['symbol'].isin(flags.index)]
+        if recent.empty:
+            return flags
+        hits = pd.crosstab(recent['symbol'], recent['event_type']).clip(upper=1)
+        return flags.add(hits.reindex(index=flags.index, columns=flags.columns, fill_value=0), fill_value=0)
+
+
+# Global index instance
+market_event_index = MarketEventIndex()
@@ -7,6 +7,7 @@ import logging
 import os
 from openai import OpenAI
 from twitter_sentiment_analyzer import TwitterDueDiligenceAnalyzer
+from llm_response_cache import cached_openai_text
 
 # Initialize OpenAI client
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
@@ -19,10 +20,9 @@ if OPENAI_API_KEY:
         openai_client = None
 
 
-def safe_json_parse(response):
-    """Safely parse JSON response with null checking"""
+def safe_json_parse(content):
+    """Safely parse JSON response content with null checking"""
     try:
-        content = response.choices[0].message.content
         if content and content.strip():
             return json.loads(content)
         else:
@@ -79,17 +79,20 @@ The market_context field must be written in Japanese. Provide professional analy
 If data for a specific period is not available, use null.
 Format as valid JSON only."""
 
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+        content = cached_openai_text(
+            openai_client,
+            "gpt-4o",
+            [
                 {"role": "system", "content": "You are a senior equity research analyst with access to comprehensive historical financial data. Provide accurate historical valuation metrics based on real market data. Write the market_context field in Japanese only."},
                 {"role": "user", "content": prompt}
             ],
+            "historical_metrics",
             response_format={"type": "json_object"},
+            validate=json.loads,
             temperature=0.2
         )
         
-        return safe_json_parse(response)
+        return safe_json_parse(content)
         
     except Exception as e:
         logging.error(f"Error generating historical metrics with AI: {e}")
@@ -119,17 +122,20 @@ Provide ONLY a JSON response with these fields:
 Base your analysis on actual financial fundamentals and market conditions.
 Format as valid JSON only."""
 
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+        content = cached_openai_text(
+            openai_client,
+            "gpt-4o",
+            [
                 {"role": "system", "content": "You are a senior equity research analyst providing investment analysis based on financial data."},
                 {"role": "user", "content": prompt}
             ],
+            "current_metrics",
             response_format={"type": "json_object"},
+            validate=json.loads,
             temperature=0.3
         )
         
-        return safe_json_parse(response)
+        return safe_json_parse(content)
         
     except Exception as e:
         logging.error(f"Error generating stock metrics: {e}")
@@ -155,17 +161,20 @@ Provide ONLY a JSON response with these fields:
 Write in professional business Japanese suitable for financial analysis.
 Format as valid JSON only."""
 
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+        content = cached_openai_text(
+            openai_client,
+            "gpt-4o",
+            [
                 {"role": "system", "content": "You are a professional financial translator specializing in Japanese business communication."},
                 {"role": "user", "content": prompt}
             ],
+            "translation",
             response_format={"type": "json_object"},
+            validate=json.loads,
             temperature=0.3
         )
         
-        return safe_json_parse(response)
+        return safe_json_parse(content)
         
     except Exception as e:
         logging.error(f"Error translating transcript to Japanese: {e}")
@@ -202,17 +211,20 @@ Please provide ONLY a JSON response with these fields:
 Focus on specific, actionable business intelligence rather than generic company information.
 Format as valid JSON only."""
 
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+        content = cached_openai_text(
+            openai_client,
+            "gpt-4o",
+            [
                 {"role": "system", "content": "You are a business intelligence analyst specializing in quarterly earnings analysis with focus on specific business developments."},
                 {"role": "user", "content": prompt}
             ],
+            "quarterly_developments",
             response_format={"type": "json_object"},
+            validate=json.loads,
             temperature=0.3
         )
         
-        return safe_json_parse(response)
+        return safe_json_parse(content)
         
     except Exception as e:
         logging.error(f"Error extracting quarterly developments: {e}")
@@ -246,17 +258,20 @@ Please provide ONLY a JSON response with these fields:
 Focus on the interactive nature of the Q&A and specific concerns raised.
 Format as valid JSON only."""
 
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+        content = cached_openai_text(
+            openai_client,
+            "gpt-4o",
+            [
                 {"role": "system", "content": "You are an expert in earnings call analysis, specializing in Q&A section insights."},
                 {"role": "user", "content": prompt}
             ],
+            "qa_analysis",
             response_format={"type": "json_object"},
+            validate=json.loads,
             temperature=0.3
         )
         
-        return safe_json_parse(response)
+        return safe_json_parse(content)
         
     except Exception as e:
         logging.error(f"Error analyzing Q&A section: {e}")
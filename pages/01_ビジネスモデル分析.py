@@ -10,7 +10,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from comprehensive_market_stocks import get_all_market_stocks
 from comprehensive_stock_data import search_stocks_by_name
 from currency_converter import display_stock_price_in_jpy
-from gemini_analyzer import analyze_company_fundamentals
+from gemini_analyzer import analyze_company_fundamentals, analyze_company_fundamentals_stream
 from market_comparison import display_stock_market_comparison
 from session_state_manager import init_session_state, reset_fundamental_analysis, should_reset_fundamental_analysis
 from gemini_historical_metrics import create_historical_metrics_table_with_ai
@@ -213,9 +213,15 @@ if should_analyze or (st.session_state.fundamental_analysis_completed and st.ses
                     'info': info
                 }
                 
+                # Stream the Gemini fundamental analysis so the report appears as it is written
+                stream_slot = st.empty()
+                with stream_slot.container():
+                    fundamental_report = st.write_stream(analyze_company_fundamentals_stream(selected_ticker))
+                
                 # Generate comprehensive due diligence analysis using Gemini AI, OpenAI, and Twitter
                 from comprehensive_due_diligence_analyzer import get_comprehensive_due_diligence_report
-                comprehensive_report = get_comprehensive_due_diligence_report(selected_ticker)
+                comprehensive_report = get_comprehensive_due_diligence_report(selected_ticker, fundamental_report)
+                stream_slot.empty()
                 st.session_state.fundamental_analysis_report = comprehensive_report.get('fundamental_analysis', {}).get('report_content', 'レポート生成に失敗しました')
                 st.session_state.comprehensive_dd_report = comprehensive_report
                 st.session_state.fundamental_analysis_completed = True
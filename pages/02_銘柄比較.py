@@ -22,6 +22,7 @@ from real_time_fetcher import fetch_current_stock_price, fetch_comprehensive_dat
 from auto_financial_data import get_auto_financial_data, calculate_growth_rate
 from historical_metrics_chart import display_historical_metrics_chart
 from market_comparison import display_stock_market_comparison, create_individual_stock_comparison_chart
+from market_comparison import get_aligned_price_frame, calculate_period_returns
 from session_state_manager import init_session_state, reset_comparison_analysis, should_reset_comparison_analysis
 from logo_utils import display_logo_header, display_company_logo
 
@@ -984,9 +985,16 @@ if st.session_state.stored_comparison_results:
     
     # Auto-generate individual stock comparison chart
     with st.spinner("個別銘柄比較チャートを作成中..."):
+        # Fetch every ticker once; the chart and the stats below share this frame
+        comparison_prices = get_aligned_price_frame(selected_tickers, selected_comparison_period)
+        comparison_names = {
+            ticker: result.get('name', ticker) for ticker, result in comparison_results.items()
+        }
         comparison_chart = create_individual_stock_comparison_chart(
             selected_tickers, 
-            selected_comparison_period
+            selected_comparison_period,
+            closes=comparison_prices,
+            names=comparison_names
         )
         
         if comparison_chart:
@@ -999,24 +1007,14 @@ if st.session_state.stored_comparison_results:
             
             # Add performance summary for individual comparison
             try:
-                import yfinance as yf
-                
                 st.markdown("#### パフォーマンス統計")
                 
-                # Calculate returns for each stock
-                returns_data = []
-                for ticker in selected_tickers:
-                    try:
-                        stock = yf.Ticker(ticker)
-                        data = stock.history(period=selected_comparison_period)
-                        if not data.empty:
-                            period_return = ((data['Close'].iloc[-1] - data['Close'].iloc[0]) / data['Close'].iloc[0]) * 100
-                            returns_data.append({
-                                'Ticker': ticker,
-                                'Return (%)': f"{period_return:+.2f}%"
-                            })
-                    except:
-                        continue
+                # Calculate returns for each stock from the aligned frame
+                period_returns = calculate_period_returns(comparison_prices)
+                returns_data = [
+                    {'Ticker': ticker, 'Return (%)': f"{period_return:+.2f}%"}
+                    for ticker, period_return in period_returns.items()
+                ]
                 
                 if returns_data:
                     returns_df = pd.DataFrame(returns_data)
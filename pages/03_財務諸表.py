@@ -12,6 +12,7 @@ from datetime import datetime
 import plotly.graph_objects as go
 import plotly.express as px
 from logo_utils import display_logo_header, display_company_logo
+from figure_cache import figure_cache
 
 # ページ設定は main app.py で処理済み
 
@@ -95,7 +96,15 @@ def calculate_yoy_growth(current_val, previous_val):
     return ((current_val - previous_val) / abs(previous_val)) * 100
 
 def create_financial_chart(income_stmt, balance_sheet, cash_flow, chart_type, is_quarterly=False):
-    """Create financial charts based on the selected type"""
+    """Create financial charts based on the selected type (reused across reruns while the statements are unchanged)"""
+    return figure_cache.get_or_build(
+        'financial_statement',
+        lambda: _build_financial_chart(income_stmt, balance_sheet, cash_flow, chart_type, is_quarterly),
+        data=[income_stmt, balance_sheet, cash_flow],
+        params={'chart_type': chart_type, 'is_quarterly': is_quarterly}
+    )
+
+def _build_financial_chart(income_stmt, balance_sheet, cash_flow, chart_type, is_quarterly=False):
     fig = go.Figure()
     
     try:
@@ -20,7 +20,8 @@ from real_time_fetcher import fetch_current_stock_price, fetch_comprehensive_dat
 # stock_dataモジュールをインポート
 from stock_data import get_stock_data, get_available_tickers
 from comprehensive_stock_data import search_stocks_by_name, get_all_tickers, get_stock_info, get_stocks_by_category, get_all_categories
-from financial_models import calculate_intrinsic_value
+from financial_models import calculate_intrinsic_value, simulate_intrinsic_value, IncrementalDCFModel
+from sensitivity_analysis import SENSITIVITY_INPUTS, SensitivityCube, calculate_tornado, create_tornado_chart
 from auto_financial_data import get_auto_financial_data
 from historical_metrics_chart import display_historical_metrics_chart
 
@@ -631,7 +632,20 @@ if selected_ticker:
         shares_outstanding = auto_data['shares_outstanding'] * 1_000_000
         current_stock_price = auto_data['current_price']
         
-
+        # 入力の変更部分だけを再計算するDCFモデル（中間結果はセッション間で保持）
+        if "dcf_model" not in st.session_state:
+            st.session_state.dcf_model = IncrementalDCFModel()
+        dcf_model = st.session_state.dcf_model
+        dcf_model.update(
+            base_revenue=revenue,
+            revenue_growth=revenue_growth,
+            net_margin=net_margin,
+            discount_rate=discount_rate,
+            terminal_multiple=industry_per,
+            forecast_years=forecast_years,
+            shares_outstanding=shares_outstanding,
+            include_forecast_period=False
+        )
         
         # Use the live stock price directly
         final_stock_price = current_stock_price
@@ -644,36 +658,22 @@ if selected_ticker:
             # 進捗バーの表示
             progress_bar = st.progress(0)
             
-            # DCF計算に必要なデータ構造の準備
-            forecasted_data = pd.DataFrame()
-            forecasted_data['year'] = list(range(1, forecast_years + 1))
-            
-            # 売上高の予測
-            forecasted_data['revenue'] = [revenue * ((1 + revenue_growth/100) ** year) for year in forecasted_data['year']]
-            
-            # 純利益の予測
-            forecasted_data['net_income'] = forecasted_data['revenue'] * (net_margin / 100)
+            # 売上高・純利益の予測（成長パスはモデルにキャッシュされる）
+            forecasted_data = pd.DataFrame(dcf_model.forecast())
             
             # 進捗バーの更新
             progress_bar.progress(50)
             
             # DCF法による企業価値計算
             # 修正版：キャッシュフローを使わず、純利益を直接割引く簡易的な方法
-            
-            # 最終年の純利益
-            final_year_net_income = forecasted_data['net_income'].iloc[-1]
-            
-            # 最終年の利益に倍率を適用して終末価値を計算
-            terminal_value = final_year_net_income * industry_per
-            
-            # 割引係数を計算
-            discount_factor = 1 / ((1 + discount_rate/100) ** forecast_years)
-            
-            # 割引後の終末価値を計算
-            dcf_value = terminal_value * discount_factor
+            # （最終年の利益 × 倍率 を終末価値とし、割り引いた値のみで評価）
+            valuation = dcf_model.valuation()
+            terminal_value = valuation['terminal_value']
+            discount_factor = valuation['discount_factor']
+            dcf_value = valuation['enterprise_value']
             
             # 1株あたり価値
-            per_share_value = dcf_value / (auto_data['shares_outstanding'] * 1000000)
+            per_share_value = valuation['dcf_per_share']
             
             # 上昇余地の計算
             upside_potential = ((per_share_value / current_stock_price) - 1) * 100
@@ -976,40 +976,8 @@ if selected_ticker:
             growth_range = np.linspace(revenue_growth - 5, revenue_growth + 5, 5)
             discount_range = np.linspace(discount_rate - 2, discount_rate + 2, 5)
             
-            # 感度分析マトリックスの計算
-            sensitivity_matrix = []
-            
-            for g in growth_range:
-                row = []
-                for d in discount_range:
-                    # 簡易版の感度分析計算（実際はより複雑）
-                    forecasted_data_sens = pd.DataFrame()
-                    forecasted_data_sens['year'] = list(range(1, forecast_years + 1))
-                    
-                    # 売上高の予測
-                    forecasted_data_sens['revenue'] = [revenue * ((1 + g/100) ** year) for year in forecasted_data_sens['year']]
-                    
-                    # 純利益の予測
-                    forecasted_data_sens['net_income'] = forecasted_data_sens['revenue'] * (net_margin / 100)
-                    
-                    # 最終年の純利益
-                    final_year_net_income_sens = forecasted_data_sens['net_income'].iloc[-1]
-                    
-                    # 最終年の利益に倍率を適用して終末価値を計算
-                    terminal_value_sens = final_year_net_income_sens * industry_per
-                    
-                    # 割引係数を計算
-                    discount_factor_sens = 1 / ((1 + d/100) ** forecast_years)
-                    
-                    # 割引後の終末価値を計算
-                    dcf_value_sens = terminal_value_sens * discount_factor_sens
-                    
-                    # 1株あたり価値
-                    per_share_value_sens = dcf_value_sens / (auto_data['shares_outstanding'] * 1000000)
-                    
-                    row.append(per_share_value_sens)
-                    
-                sensitivity_matrix.append(row)
+            # 感度分析マトリックスの計算（成長率・割引率ごとにキャッシュした段階を再利用）
+            sensitivity_matrix = dcf_model.sensitivity_grid(growth_range, discount_range)
             
             # 感度分析ヒートマップの作成
             fig = go.Figure(data=go.Heatmap(
@@ -1056,6 +1024,226 @@ if selected_ticker:
             display_historical_metrics_chart(selected_ticker)
             
             st.markdown("</div>", unsafe_allow_html=True)
+    
+    # モンテカルロDCF分析
+    if auto_data:
+        with st.expander("🎲 モンテカルロDCF分析", expanded=False):
+            st.markdown("""
+            成長率・純利益率・割引率・PER倍率を確率分布として与え、多数のシナリオで企業価値を計算します。
+            上の入力値を各分布の中心として使用します。
+            """)
+            
+            distribution_labels = {"正規分布": "normal", "一様分布": "uniform", "三角分布": "triangular"}
+            
+            def build_distribution(label, center, spread, lower_bound):
+                dist = distribution_labels[label]
+                if dist == "normal":
+                    return {'dist': 'normal', 'mean': center, 'std': spread, 'min': lower_bound}
+                if dist == "uniform":
+                    return {'dist': 'uniform', 'low': max(center - spread, lower_bound), 'high': center + spread}
+                return {'dist': 'triangular', 'low': max(center - spread, lower_bound), 'mode': center, 'high': center + spread}
+            
+            mc_col1, mc_col2 = st.columns(2)
+            with mc_col1:
+                growth_dist = st.selectbox("成長率の分布", list(distribution_labels), key="mc_growth_dist")
+                growth_spread = st.number_input("成長率のばらつき（標準偏差/幅, %pt）", min_value=0.0, max_value=50.0, value=5.0, step=0.5, key="mc_growth_spread")
+                margin_dist = st.selectbox("純利益率の分布", list(distribution_labels), key="mc_margin_dist")
+                margin_spread = st.number_input("純利益率のばらつき（%pt）", min_value=0.0, max_value=50.0, value=3.0, step=0.5, key="mc_margin_spread")
+            with mc_col2:
+                discount_dist = st.selectbox("割引率の分布", list(distribution_labels), key="mc_discount_dist")
+                discount_spread = st.number_input("割引率のばらつき（%pt）", min_value=0.0, max_value=20.0, value=1.5, step=0.1, key="mc_discount_spread")
+                per_dist = st.selectbox("PER倍率の分布", list(distribution_labels), key="mc_per_dist")
+                per_spread = st.number_input("PER倍率のばらつき（倍）", min_value=0.0, max_value=50.0, value=5.0, step=0.5, key="mc_per_spread")
+            
+            mc_col3, mc_col4 = st.columns(2)
+            with mc_col3:
+                growth_margin_corr = st.slider("成長率と純利益率の相関", min_value=-0.9, max_value=0.9, value=0.3, step=0.1, key="mc_corr")
+            with mc_col4:
+                n_paths = st.selectbox("シミュレーション回数", [10_000, 100_000, 500_000, 1_000_000], index=1,
+                                       format_func=lambda n: f"{n:,}回", key="mc_paths")
+            
+            if st.button("シミュレーションを実行", key="mc_run_btn", use_container_width=True):
+                correlation = np.eye(4)
+                correlation[0, 1] = correlation[1, 0] = growth_margin_corr
+                parameters = {
+                    'revenue_growth': build_distribution(growth_dist, revenue_growth, growth_spread, -99.0),
+                    'net_margin': build_distribution(margin_dist, net_margin, margin_spread, 0.0),
+                    'discount_rate': build_distribution(discount_dist, discount_rate, discount_spread, 0.1),
+                    'terminal_multiple': build_distribution(per_dist, industry_per, per_spread, 0.0),
+                }
+                
+                try:
+                    with st.spinner("シミュレーション中..."):
+                        simulation = simulate_intrinsic_value(
+                            revenue,
+                            shares_outstanding,
+                            forecast_years,
+                            parameters,
+                            correlation=correlation,
+                            n_paths=n_paths,
+                            current_price=current_stock_price,
+                            include_forecast_period=False
+                        )
+                except (ValueError, np.linalg.LinAlgError) as e:
+                    st.error(f"シミュレーションに失敗しました: {str(e)}")
+                    simulation = None
+                
+                if simulation:
+                    percentiles = simulation['percentiles']
+                    res_col1, res_col2, res_col3, res_col4 = st.columns(4)
+                    with res_col1:
+                        st.metric("中央値", f"${percentiles[50]:.2f}")
+                    with res_col2:
+                        st.metric("5%〜95%区間", f"${percentiles[5]:.2f}〜${percentiles[95]:.2f}")
+                    with res_col3:
+                        st.metric("平均値", f"${simulation['mean']:.2f}")
+                    with res_col4:
+                        st.metric("割安である確率", f"{simulation.get('probability_undervalued', 0) * 100:.1f}%")
+                    
+                    histogram = simulation['histogram']
+                    edges = np.array(histogram['bin_edges'])
+                    fig = go.Figure(data=go.Bar(
+                        x=(edges[:-1] + edges[1:]) / 2,
+                        y=histogram['counts'],
+                        width=np.diff(edges),
+                        marker_color='#667eea',
+                        name="シナリオ数"
+                    ))
+                    fig.add_vline(x=current_stock_price, line_dash="dash", line_color="#ff5630",
+                                  annotation_text=f"現在株価 ${current_stock_price:.2f}")
+                    fig.add_vline(x=percentiles[50], line_dash="dot", line_color="#36b37e",
+                                  annotation_text="中央値")
+                    fig.update_layout(
+                        title=f"1株あたり本質的価値の分布（{simulation['n_paths']:,}シナリオ）",
+                        xaxis_title="1株あたり価値 ($)",
+                        yaxis_title="シナリオ数",
+                        height=450,
+                        margin=dict(l=50, r=50, t=50, b=50),
+                        bargap=0,
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
+                    
+                    percentile_table = pd.DataFrame({
+                        'パーセンタイル': [f"{p}%" for p in percentiles],
+                        '1株あたり価値': [f"${v:.2f}" for v in percentiles.values()],
+                    })
+                    if 'upside_percentiles' in simulation:
+                        percentile_table['上昇余地'] = [f"{u:+.1f}%" for u in simulation['upside_percentiles'].values()]
+                    st.dataframe(percentile_table, hide_index=True, use_container_width=True)
+        
+        # 多次元感度分析・トルネード分析
+        with st.expander("🌪️ 多次元感度分析・トルネード分析", expanded=False):
+            st.markdown("""
+            各入力を下限〜上限の範囲で動かし、1株あたり価値への影響を比較します。
+            多次元感度分析では選択した全入力の組み合わせを評価し、任意の2軸の断面を表示します。
+            """)
+            
+            base_inputs = {
+                'base_revenue': revenue,
+                'revenue_growth': revenue_growth,
+                'net_margin': net_margin,
+                'discount_rate': discount_rate,
+                'terminal_multiple': industry_per,
+                'forecast_years': forecast_years,
+                'shares_outstanding': shares_outstanding,
+            }
+            default_ranges = {
+                'revenue_growth': (revenue_growth - 5.0, revenue_growth + 5.0),
+                'net_margin': (max(net_margin - 5.0, 0.1), net_margin + 5.0),
+                'discount_rate': (max(discount_rate - 2.0, 0.1), discount_rate + 2.0),
+                'terminal_multiple': (max(industry_per - 5.0, 1.0), industry_per + 5.0),
+                'forecast_years': (max(forecast_years - 2, 1), forecast_years + 2),
+            }
+            
+            selected_inputs = st.multiselect(
+                "変動させる入力",
+                list(SENSITIVITY_INPUTS),
+                default=list(SENSITIVITY_INPUTS),
+                format_func=lambda name: SENSITIVITY_INPUTS[name],
+                key="nd_inputs"
+            )
+            
+            sensitivity_ranges = {}
+            for name in selected_inputs:
+                low_default, high_default = default_ranges[name]
+                range_col1, range_col2 = st.columns(2)
+                if name == 'forecast_years':
+                    with range_col1:
+                        low = st.number_input(f"{SENSITIVITY_INPUTS[name]} 下限", min_value=1, max_value=30, value=int(low_default), step=1, key=f"nd_low_{name}")
+                    with range_col2:
+                        high = st.number_input(f"{SENSITIVITY_INPUTS[name]} 上限", min_value=1, max_value=30, value=int(high_default), step=1, key=f"nd_high_{name}")
+                else:
+                    with range_col1:
+                        low = st.number_input(f"{SENSITIVITY_INPUTS[name]} 下限", value=float(round(low_default, 1)), step=0.5, format="%.1f", key=f"nd_low_{name}")
+                    with range_col2:
+                        high = st.number_input(f"{SENSITIVITY_INPUTS[name]} 上限", value=float(round(high_default, 1)), step=0.5, format="%.1f", key=f"nd_high_{name}")
+                sensitivity_ranges[name] = (low, high)
+            
+            if sensitivity_ranges:
+                # トルネード分析（入力ごとに下限・上限の2シナリオのみ）
+                base_value = dcf_model.valuation()['dcf_per_share']
+                tornado = calculate_tornado(base_inputs, sensitivity_ranges, include_forecast_period=False)
+                st.plotly_chart(create_tornado_chart(tornado, base_value, current_stock_price), use_container_width=True)
+                
+                # 多次元感度分析（断面は表示する分だけ計算する）
+                steps = st.slider("各入力の分割数", min_value=3, max_value=41, value=11, step=2, key="nd_steps")
+                axes = {}
+                for name, (low, high) in sensitivity_ranges.items():
+                    if name == 'forecast_years':
+                        axes[name] = np.arange(min(low, high), max(low, high) + 1)
+                    else:
+                        axes[name] = np.linspace(low, high, steps)
+                cube = SensitivityCube(base_inputs, axes, include_forecast_period=False)
+                
+                st.markdown(f"**シナリオ数:** {cube.size:,}（{' × '.join(str(n) for n in cube.shape)}）")
+                
+                if len(axes) >= 2:
+                    slice_col1, slice_col2 = st.columns(2)
+                    with slice_col1:
+                        row_axis = st.selectbox("縦軸", cube.axis_names, index=0,
+                                                format_func=lambda name: SENSITIVITY_INPUTS[name], key="nd_row_axis")
+                    with slice_col2:
+                        column_choices = [name for name in cube.axis_names if name != row_axis]
+                        column_axis = st.selectbox("横軸", column_choices, index=0,
+                                                   format_func=lambda name: SENSITIVITY_INPUTS[name], key="nd_column_axis")
+                    
+                    cube_slice = cube.slice(row_axis, column_axis)
+                    fig = go.Figure(data=go.Heatmap(
+                        z=cube_slice,
+                        x=[f"{v:g}" for v in cube.axes[column_axis]],
+                        y=[f"{v:g}" for v in cube.axes[row_axis]],
+                        colorscale='RdBu_r',
+                        zmid=current_stock_price,
+                        colorbar=dict(title="価値 ($)"),
+                    ))
+                    fig.update_layout(
+                        title=f"{SENSITIVITY_INPUTS[row_axis]} × {SENSITIVITY_INPUTS[column_axis]}（その他の入力は基本シナリオ）",
+                        xaxis_title=SENSITIVITY_INPUTS[column_axis],
+                        yaxis_title=SENSITIVITY_INPUTS[row_axis],
+                        height=500,
+                        margin=dict(l=50, r=50, t=50, b=50),
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
+                
+                if st.button("全シナリオを集計", key="nd_summary_btn", use_container_width=True):
+                    with st.spinner(f"{cube.size:,}シナリオを集計中..."):
+                        summary = cube.summarize(current_price=current_stock_price)
+                    sum_col1, sum_col2, sum_col3, sum_col4 = st.columns(4)
+                    with sum_col1:
+                        st.metric("平均値", f"${summary['mean']:.2f}")
+                    with sum_col2:
+                        st.metric("最小値", f"${summary['min']:.2f}")
+                    with sum_col3:
+                        st.metric("最大値", f"${summary['max']:.2f}")
+                    with sum_col4:
+                        st.metric("株価を上回る割合", f"{summary.get('probability_above_price', 0) * 100:.1f}%")
+                    
+                    scenario_table = pd.DataFrame({
+                        '入力': [SENSITIVITY_INPUTS[name] for name in cube.axis_names],
+                        '最小値のシナリオ': [summary['min_scenario'].get(name) for name in cube.axis_names],
+                        '最大値のシナリオ': [summary['max_scenario'].get(name) for name in cube.axis_names],
+                    })
+                    st.dataframe(scenario_table, hide_index=True, use_container_width=True)
 else:
     st.info("銘柄を選択してください。")
 
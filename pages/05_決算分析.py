@@ -28,8 +28,23 @@ from gemini_historical_metrics import (
     extract_quarterly_business_developments_with_ai,
     generate_qa_section_analysis_with_ai
 )
+from parallel_sections import start_sections, SectionTimeout
 import yfinance as yf
 
+# Independent AI sections of the page and their timeouts (seconds)
+EARNINGS_SECTION_LABELS = {
+    'summary': "AI決算サマリー",
+    'developments': "四半期ビジネス展開の分析",
+    'qa': "Q&Aセクション分析",
+    'transcript': "基本決算情報",
+}
+EARNINGS_SECTION_TIMEOUTS = {
+    'summary': 60,
+    'developments': 60,
+    'qa': 60,
+    'transcript': 90,
+}
+
 # Modern design CSS
 st.markdown("""
 <style>
@@ -215,6 +230,14 @@ if analyze_button and selected_ticker:
         data = get_auto_financial_data(selected_ticker)
         
         if data:
+            # Start the AI sections now so they run while the rest of the page renders
+            ai_sections = start_sections({
+                'summary': lambda: generate_earnings_summary(selected_ticker, data),
+                'developments': lambda: extract_quarterly_business_developments_with_ai(selected_ticker),
+                'qa': lambda: generate_qa_section_analysis_with_ai(selected_ticker),
+                'transcript': lambda: extract_and_translate_earnings_transcript(selected_ticker),
+            }, timeouts=EARNINGS_SECTION_TIMEOUTS)
+            
             # Company header
             st.markdown(f"""
             <div class="earnings-card">
@@ -753,18 +776,30 @@ if analyze_button and selected_ticker:
             st.markdown('<div class="section-header">過去のメトリクス比較</div>', unsafe_allow_html=True)
             create_historical_metrics_table_with_ai(selected_ticker, pe_ratio, pb_ratio, ps_ratio)
             
-            # Quarterly Business Developments Section  
+            # AI sections (started concurrently when the data arrived)
+            st.markdown('<div class="section-header">AI決算サマリー</div>', unsafe_allow_html=True)
+            section_slots = {'summary': st.empty()}
+
             st.markdown('<div class="section-header">決算説明会トランスクリプト</div>', unsafe_allow_html=True)
-            
-            # Enhanced quarterly business analysis
-            with st.spinner("最新決算の具体的なビジネス展開を分析中..."):
-                try:
-                    # Always use Gemini due to OpenAI quota issues
-                    st.info("Gemini APIを使用して最新の決算分析を生成中...")
-                    quarterly_developments = extract_quarterly_business_developments_with_ai(selected_ticker)
-                    qa_analysis = generate_qa_section_analysis_with_ai(selected_ticker)
-                    
-                    if quarterly_developments:
+            section_slots['developments'] = st.empty()
+            section_slots['qa'] = st.empty()
+            section_slots['transcript'] = st.empty()
+
+            for name, slot in section_slots.items():
+                slot.info(f"{EARNINGS_SECTION_LABELS[name]}を生成中...")
+
+            # Render each AI section as soon as it arrives
+            for name, result, error in ai_sections.as_completed():
+                with section_slots[name].container():
+                    if isinstance(error, SectionTimeout):
+                        st.warning(f"{EARNINGS_SECTION_LABELS[name]}がタイムアウトしました。時間をおいて再度お試しください。")
+                    elif error is not None:
+                        st.warning(f"{EARNINGS_SECTION_LABELS[name]}が現在利用できません: {str(error)}")
+                    elif name == 'summary' and result:
+                        st.markdown(result)
+                    elif name == 'developments' and result:
+                        quarterly_developments = result
+                        
                         st.markdown("### 最新四半期の具体的なビジネス展開")
                         
                         col1, col2 = st.columns(2)
@@ -804,9 +839,9 @@ if analyze_button and selected_ticker:
                         if quarterly_developments.get('outlook_changes'):
                             st.markdown("#### 🔮 見通しの変化")
                             st.warning(quarterly_developments['outlook_changes'])
-                    
-                    # Q&A Section Analysis
-                    if qa_analysis:
+                    elif name == 'qa' and result:
+                        qa_analysis = result
+                        
                         st.markdown("### 🤝 Q&Aセクション分析")
                         
                         col1, col2 = st.columns(2)
@@ -836,13 +871,8 @@ if analyze_button and selected_ticker:
                         if qa_analysis.get('investor_sentiment'):
                             st.markdown("#### 📊 投資家のセンチメント")
                             st.info(qa_analysis['investor_sentiment'])
-                
-                except Exception as e:
-                    st.warning("決算トランスクリプトの詳細分析が現在利用できません。基本情報を表示します。")
-                    
-                    # Fallback to basic earnings info
-                    try:
-                        earnings_transcript = extract_and_translate_earnings_transcript(selected_ticker)
+                    elif name == 'transcript' and result:
+                        earnings_transcript = result
                         
                         st.markdown("### 📋 基本決算情報")
                         
@@ -873,9 +903,8 @@ if analyze_button and selected_ticker:
                             </div>
                         </div>
                         """, unsafe_allow_html=True)
-                        
-                    except Exception as e:
-                        st.info("決算説明会トランスクリプトは現在準備中です。")
+                    else:
+                        st.info(f"{EARNINGS_SECTION_LABELS[name]}は現在準備中です。")
             
         else:
             st.error(f"❌ {selected_ticker}の財務データを取得できませんでした。別のティッカーシンボルを試してください。")
@@ -18,6 +18,11 @@ from format_helpers import format_currency, format_large_number
 from stock_cache_manager import get_cached_financial_data, batch_process_stocks, stock_cache
 from stock_universe_updater import update_stock_universe_with_discoveries
 from logo_utils import display_logo_header, display_company_logo
+from fundamental_analysis_data import calculate_sector_percentiles
+from quantile_sketch import valuation_sketches
+from stock_screener import (PRESET_SCREENS, SCREEN_FIELDS, ScreenQueryError, compile_screen,
+                            range_screen_query, universe_metrics_from_records, saved_screens,
+                            screen_universe_sharded)
 
 # Modern design CSS
 st.markdown("""
@@ -336,7 +341,7 @@ with col1:
         # Keep original detailed options but simplified
         detail_method = st.radio(
             "詳細検索方法",
-            ["投資スタイル別", "業界別"],
+            ["投資スタイル別", "業界別", "スクリーンクエリ"],
             horizontal=True
         )
         
@@ -347,7 +352,7 @@ with col1:
                 label_visibility="collapsed"
             )
             actual_style = investment_style
-        else:
+        elif detail_method == "業界別":
             # Industry search for detailed mode
             st.markdown("**業界を選択**")
             industry_options = [
@@ -377,6 +382,62 @@ with col1:
                 label_visibility="collapsed"
             )
             actual_style = "業界別"
+        else:
+            # Screen expression search for detailed mode
+            st.markdown("**スクリーン条件を式で入力**")
+            saved_screen_names = saved_screens.get_screen_names()
+            selected_screen = st.selectbox(
+                "保存済みスクリーン",
+                ["（新規）"] + saved_screen_names,
+                help="保存したスクリーンを読み込んで再実行できます"
+            )
+            if selected_screen in saved_screen_names:
+                default_query = saved_screens.get_query(selected_screen)
+            else:
+                default_query = PRESET_SCREENS["成長株投資"]
+
+            screen_query = st.text_area(
+                "スクリーン条件",
+                value=default_query,
+                key=f"screen_query_{selected_screen}",
+                help="例: roe >= 15 and per between 5 and 20 and sector in ('Technology', 'Healthcare')"
+            )
+
+            try:
+                compile_screen(screen_query)
+                screen_query_error = None
+            except ScreenQueryError as e:
+                screen_query_error = str(e)
+                st.error(f"スクリーン条件の誤り: {screen_query_error}")
+
+            with st.expander("📖 使用できる項目と書き方"):
+                st.markdown(
+                    "比較: `<` `<=` `>` `>=` `==` `!=` ・ 範囲: `per between 5 and 20` ・ "
+                    "一覧: `sector in ('Technology', 'Energy')` ・ 組み合わせ: `and` `or` `not` `( )` ・ "
+                    "計算: `per < historical_pe_avg * 0.8`"
+                )
+                st.markdown("\n".join(f"- `{field}`: {label}" for field, label in SCREEN_FIELDS.items()))
+
+            save_col1, save_col2, save_col3 = st.columns([2, 1, 1])
+            with save_col1:
+                screen_name = st.text_input(
+                    "スクリーン名",
+                    value=selected_screen if selected_screen in saved_screen_names else "",
+                    placeholder="例: 高ROE割安株"
+                )
+            with save_col2:
+                if st.button("💾 保存", use_container_width=True):
+                    try:
+                        saved_screens.save_screen(screen_name, screen_query)
+                        st.success(f"「{screen_name.strip()}」を保存しました")
+                    except ScreenQueryError as e:
+                        st.error(str(e))
+            with save_col3:
+                if selected_screen in saved_screen_names and st.button("🗑️ 削除", use_container_width=True):
+                    saved_screens.delete_screen(selected_screen)
+                    st.rerun()
+
+            actual_style = "スクリーンクエリ"
 
 with col2:
     if st.button("🔄 条件をリセット", use_container_width=True):
@@ -482,7 +543,7 @@ if search_method == "簡単検索（おすすめ）":
         - 複数企業の比較は「銘柄比較」ページで実施
         """)
     
-else:
+elif detail_method != "スクリーンクエリ":
     # Show full filter interface for advanced users
     st.markdown("### 🎯 検索条件設定")
     col1, col2, col3 = st.columns(3)
@@ -603,6 +664,72 @@ else:
 
 st.markdown('</div>', unsafe_allow_html=True)
 
+# Every search mode is expressed as a screen expression compiled once into a vectorized predicate
+if search_method == "簡単検索（おすすめ）":
+    screen_query = PRESET_SCREENS[actual_style]
+elif detail_method != "スクリーンクエリ":
+    screen_query = range_screen_query(
+        {
+            'revenue_growth': revenue_growth_range,
+            'roe': roe_range,
+            'per': per_range,
+            'psr': psr_range,
+            'profit_margin': profit_margin_range,
+            'market_cap': market_cap_range,
+            'debt_ratio': debt_ratio_range,
+            'dividend_yield': dividend_yield_range,
+        },
+        allow_non_positive=('per',)
+    )
+
+try:
+    compiled_screen = compile_screen(screen_query)
+except ScreenQueryError:
+    compiled_screen = None
+
+
+def build_matching_stock(ticker, data, metrics_row):
+    """Build a search result entry from cached data and its universe metrics row"""
+    # Get company description from existing data or fetch if needed
+    try:
+        # Try to get description from existing data first
+        description = data.get('business_summary', '')
+        if not description:
+            # If not available, fetch from yfinance
+            stock_info = yf.Ticker(ticker)
+            business_summary = stock_info.info.get('longBusinessSummary', '')
+            description = business_summary[:200] + "..." if len(business_summary) > 200 else business_summary
+        
+        # If still no description, provide a fallback
+        if not description:
+            description = f"{data.get('sector', 'Unknown')}セクターの企業"
+    except Exception as e:
+        description = f"{data.get('sector', 'Unknown')}セクターの企業"
+    
+    profit_margin = metrics_row['profit_margin']
+    per = metrics_row['per']
+    return {
+        'ticker': ticker,
+        'name': data.get('name', ticker),
+        'sector': data.get('sector', 'Unknown'),
+        'description': description,
+        'current_price': data.get('current_price', 0),
+        'market_cap': data.get('market_cap', 0),
+        'revenue_growth': metrics_row['revenue_growth'],
+        'roe': metrics_row['roe'],
+        'roa': metrics_row['roa'],
+        'pe_ratio': per,
+        'ps_ratio': metrics_row['psr'],
+        'pb_ratio': metrics_row['pbr'],
+        'profit_margin': profit_margin,
+        'debt_ratio': metrics_row['debt_ratio'],
+        'dividend_yield': metrics_row['dividend_yield'],
+        'is_profitable': profit_margin > 0 and per > 0,
+        'fundamental_score': metrics_row['overall_score'],
+        'implied_growth': metrics_row['implied_growth'],
+        'data': data
+    }
+
 # Make search button more prominent for beginners
 if search_method == "簡単検索（おすすめ）":
     st.markdown("### 🚀 検索開始")
@@ -621,16 +748,22 @@ else:
         elif detail_method == "業界別":
             st.markdown(f"**業界別検索準備完了！** {selected_industry}セクターの銘柄を検索します。")
             search_button_text = f"🏭 {selected_industry}で検索開始！"
+        elif detail_method == "スクリーンクエリ":
+            st.markdown("**スクリーン準備完了！** 入力した条件式で銘柄を検索します。")
+            search_button_text = "🧮 スクリーン条件で検索開始！"
         else:
             st.markdown("**カスタム検索準備完了！** 設定した条件で銘柄を検索します。")
             search_button_text = "🔍 カスタム条件で検索開始！"
     else:
         search_button_text = "🔍 銘柄を検索"
 
+# Shard the universe across all CPU cores unless the user opts out
+use_sharded_screening = True
+
 # Add cache management options for advanced users
 if search_method == "詳細検索（上級者向け）":
     with st.expander("🚀 パフォーマンス設定"):
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         with col1:
             if st.button("キャッシュクリア", help="データキャッシュをクリアして最新データを取得"):
                 stock_cache.clear_cache()
@@ -641,6 +774,12 @@ if search_method == "詳細検索（上級者向け）":
                 value=True,
                 help="タブを切り替えても検索を継続"
             )
+        with col3:
+            use_sharded_screening = st.checkbox(
+                "マルチコア並列処理",
+                value=True,
+                help=f"銘柄をCPUコア数（{os.cpu_count() or 1}）に分割して並列にスクリーニング"
+            )
 
 # Add JavaScript to prevent browser from sleeping during search
 st.markdown("""
@@ -670,8 +809,28 @@ if (document.querySelector('[data-testid="stSpinner"]')) {
 </script>
 """, unsafe_allow_html=True)
 
+# Saved screens rerun instantly against the locally cached universe, without fetching anything
+if search_method == "詳細検索（上級者向け）" and detail_method == "スクリーンクエリ":
+    if st.button("⚡ キャッシュ済みデータで即時実行", use_container_width=True,
+                 disabled=compiled_screen is None,
+                 help="過去の検索で取得済みのデータだけを対象に、スクリーン条件を即座に適用します"):
+        cached_records = {}
+        for record in stock_cache.get_all_cached_data():
+            if record and record.get('ticker') and (record.get('current_price') or 0) > 0:
+                cached_records.setdefault(str(record['ticker']).upper(), record)
+        
+        cached_metrics = universe_metrics_from_records(list(cached_records.values()))
+        st.session_state['search_results'] = [
+            build_matching_stock(ticker, cached_records[ticker], metrics_row)
+            for ticker, metrics_row in compiled_screen.apply(cached_metrics).iterrows()
+        ]
+        st.session_state['processed_count'] = len(cached_metrics)
+        st.session_state['search_info'] = f"スクリーン: {screen_query}（キャッシュ済みデータ）"
+        st.session_state['universe_metrics'] = cached_metrics
+        st.session_state['is_searching'] = False
+
 # Search button
-if st.button(search_button_text, use_container_width=True, type="primary"):
+if st.button(search_button_text, use_container_width=True, type="primary", disabled=compiled_screen is None):
     
     # Clear previous results while searching
     if 'search_results' in st.session_state:
@@ -743,6 +902,7 @@ if st.button(search_button_text, use_container_width=True, type="primary"):
         
         # Enhanced screening with batch processing and background execution
         matching_stocks = []
+        universe_frames = []
         processed_count = 0
         
         # Progress tracking with more frequent updates for user experience
@@ -767,147 +927,71 @@ if st.button(search_button_text, use_container_width=True, type="primary"):
         # Enable background processing using Streamlit's auto-refresh
         placeholder = st.empty()
         
-        for batch_idx in range(total_batches):
-            batch_start = batch_idx * batch_size
-            batch_end = min((batch_idx + 1) * batch_size, len(available_tickers))
-            batch_tickers = available_tickers[batch_start:batch_end]
+        if use_sharded_screening:
+            # Each worker process loads, derives and screens its own shard; shards merge in input order
+            def update_shard_progress(completed_shards, total_shards, matches_so_far):
+                progress_bar.progress(completed_shards / total_shards)
+                status_text.text(f"シャード {completed_shards}/{total_shards} 処理完了... ({matches_so_far} 銘柄見つかりました)")
             
-            # Update progress at batch level for smoother UX
-            progress = (batch_idx + 1) / total_batches
-            progress_bar.progress(progress)
-            status_text.text(f"バッチ {batch_idx + 1}/{total_batches} 処理中... ({len(matching_stocks)} 銘柄見つかりました)")
+            # For large searches, stop early once there are enough results
+            universe_metrics, match_mask, matched_records = screen_universe_sharded(
+                available_tickers, screen_query, progress_callback=update_shard_progress,
+                max_matches=100 if stock_universe_size > 2000 else None
+            )
+            processed_count = len(universe_metrics)
+            universe_frames.append(universe_metrics)
             
-            # Show preview counter only (no table during search)
-            if batch_idx % 5 == 0 and matching_stocks:
-                with results_preview:
-                    st.info(f"🎯 現在 {len(matching_stocks)} 銘柄が条件に合致")
+            for ticker, metrics_row in universe_metrics[match_mask].iterrows():
+                matching_stocks.append(build_matching_stock(ticker, matched_records[ticker], metrics_row))
+        else:
+            for batch_idx in range(total_batches):
+                batch_start = batch_idx * batch_size
+                batch_end = min((batch_idx + 1) * batch_size, len(available_tickers))
+                batch_tickers = available_tickers[batch_start:batch_end]
             
-            # Process batch with error handling
-            for i, ticker in enumerate(batch_tickers):
-                try:
-                    global_idx = batch_start + i
-                    
-                    # Skip if we've already processed enough stocks for preview
-                    if len(matching_stocks) > 100 and stock_universe_size > 2000:
-                        # For large searches, stop early if we have enough results
-                        break
-                    
-                    # Get financial data with caching for improved performance
-                    data = get_cached_financial_data(ticker)
-                    if not data:
-                        continue
-                    
-                    # Quick validation to skip obviously bad data
-                    if data.get('current_price', 0) <= 0:
-                        continue
-                    
-                    processed_count += 1
-                    
-                    # Simplified screening - Extract key metrics
-                    revenue_growth = data.get('historical_growth', 0) or 0
-                    per = data.get('pe_ratio', 0) or 0
-                    psr = data.get('ps_ratio', 0) or 0
-                    profit_margin = data.get('profit_margin', 0) or 0
-                    market_cap_billions = (data.get('market_cap', 0) or 0) / 1000
-                    dividend_yield = data.get('dividend_yield', 0) or 0
-                    roe = data.get('roe', 0) or 0
-                    pbr = data.get('pb_ratio', 0) or 0
-                    debt_ratio = data.get('debt_to_equity', 0) or 0
-                    roa = data.get('roa', 0) or 0
+                # Update progress at batch level for smoother UX
+                progress = (batch_idx + 1) / total_batches
+                progress_bar.progress(progress)
+                status_text.text(f"バッチ {batch_idx + 1}/{total_batches} 処理中... ({len(matching_stocks)} 銘柄見つかりました)")
+            
+                # Show preview counter only (no table during search)
+                if batch_idx % 5 == 0 and matching_stocks:
+                    with results_preview:
+                        st.info(f"🎯 現在 {len(matching_stocks)} 銘柄が条件に合致")
+            
+                # Collect cached data for the batch, then screen it in one vectorized pass
+                batch_records = []
+                for ticker in batch_tickers:
+                    try:
+                        # Skip if we've already processed enough stocks for preview
+                        if len(matching_stocks) > 100 and stock_universe_size > 2000:
+                            # For large searches, stop early if we have enough results
+                            break
                     
-                    # Apply filtering based on search method
-                    should_include = False
+                        # Get financial data with caching for improved performance
+                        data = get_cached_financial_data(ticker)
+                        if not data:
+                            continue
                     
-                    # For advanced search, use custom parameters if available
-                    if search_method == "詳細検索（上級者向け）" and 'revenue_growth_range' in locals():
-                        # Use detailed custom criteria
-                        if (revenue_growth_range[0] <= revenue_growth <= revenue_growth_range[1] and
-                            roe_range[0] <= roe <= roe_range[1] and
-                            (per <= 0 or per_range[0] <= per <= per_range[1]) and
-                            psr_range[0] <= psr <= psr_range[1] and
-                            profit_margin_range[0] <= profit_margin <= profit_margin_range[1] and
-                            market_cap_range[0] <= market_cap_billions <= market_cap_range[1] and
-                            debt_ratio_range[0] <= debt_ratio <= debt_ratio_range[1] and
-                            dividend_yield_range[0] <= dividend_yield <= dividend_yield_range[1]):
-                            should_include = True
-                    elif actual_style == "成長株投資":
-                        # Growth: Focus on stocks with 20%+ revenue growth
-                        if (revenue_growth >= 20 or 
-                            (revenue_growth >= 15 and roe >= 20) or
-                            (market_cap_billions >= 1 and revenue_growth >= 15)):
-                            should_include = True
-                            
-                    elif actual_style == "バリュー株投資":
-                        # Value: Include stocks trading cheap based on historical metrics
-                        # Focus on profitable companies with reasonable valuations
-                        historical_pe = data.get('historical_pe_avg', per * 1.2) or per * 1.2  # Use 20% above current as fallback
-                        historical_pb = data.get('historical_pb_avg', pbr * 1.2) or pbr * 1.2
-                        
-                        # Value criteria: profitable + trading below historical averages OR low absolute valuations
-                        if (profit_margin > 0 and per > 0 and 
-                            ((per < historical_pe * 0.8 and pbr < historical_pb * 0.8) or  # Trading 20% below historical
-                             (per <= 15 and pbr <= 2.5 and revenue_growth >= 0))):  # Or absolute value criteria
-                            should_include = True
-                            
-                    elif actual_style == "配当株投資":
-                        # Dividend: Quality dividend stocks with sustainable payments
-                        # Yield 3%+ (attractive income), profitable, reasonable payout ratio
-                        if (dividend_yield >= 3.0 and 
-                            profit_margin > 0 and 
-                            market_cap_billions >= 0.5):  # Exclude penny stocks
-                            should_include = True
-                        
-                    elif actual_style == "安定株投資":
-                        # Stability: Large-cap, profitable, financially stable companies  
-                        # Focus on blue-chip characteristics: size, profitability, low debt
-                        if (market_cap_billions >= 5.0 and  # Large cap companies
-                            profit_margin > 5 and  # Consistent profitability
-                            debt_ratio <= 1.0 and  # Reasonable debt levels
-                            roe >= 10):  # Efficient capital use
-                            should_include = True
+                        # Quick validation to skip obviously bad data
+                        if data.get('current_price', 0) <= 0:
+                            continue
                     
-                    if not should_include:
-                        continue
+                        processed_count += 1
+                        batch_records.append(dict(data, ticker=ticker))
                     
-                    # Get company description from existing data or fetch if needed
-                    try:
-                        # Try to get description from existing data first
-                        description = data.get('business_summary', '')
-                        if not description:
-                            # If not available, fetch from yfinance
-                            stock_info = yf.Ticker(ticker)
-                            business_summary = stock_info.info.get('longBusinessSummary', '')
-                            description = business_summary[:200] + "..." if len(business_summary) > 200 else business_summary
-                        
-                        # If still no description, provide a fallback
-                        if not description:
-                            description = f"{data.get('sector', 'Unknown')}セクターの企業"
                     except Exception as e:
-                        description = f"{data.get('sector', 'Unknown')}セクターの企業"
-                    
-                    # If all criteria pass, add to results
-                    matching_stocks.append({
-                        'ticker': ticker,
-                        'name': data.get('name', ticker),
-                        'sector': data.get('sector', 'Unknown'),
-                        'description': description,
-                        'current_price': data.get('current_price', 0),
-                        'market_cap': data.get('market_cap', 0),
-                        'revenue_growth': revenue_growth,
-                        'roe': roe,
-                        'roa': roa,
-                        'pe_ratio': per,
-                        'ps_ratio': psr,
-                        'pb_ratio': pbr,
-                        'profit_margin': profit_margin,
-                        'debt_ratio': debt_ratio,
-                        'dividend_yield': dividend_yield,
-                        'is_profitable': profit_margin > 0 and per > 0,
-                        'data': data
-                    })
-                    
-                except Exception as e:
+                        continue
+            
+                if not batch_records:
                     continue
+            
+                batch_metrics = universe_metrics_from_records(batch_records)
+                universe_frames.append(batch_metrics)
+                records_by_ticker = {record['ticker'].upper(): record for record in batch_records}
+            
+                for ticker, metrics_row in compiled_screen.apply(batch_metrics).iterrows():
+                    matching_stocks.append(build_matching_stock(ticker, records_by_ticker[ticker], metrics_row))
         
         # Clear progress indicators
         progress_bar.empty()
@@ -917,6 +1001,8 @@ if st.button(search_button_text, use_container_width=True, type="primary"):
         st.session_state['search_results'] = matching_stocks
         st.session_state['processed_count'] = processed_count
         st.session_state['search_info'] = f"業界: {selected_industry}" if search_method == "業界別" else f"投資スタイル: {investment_style if 'investment_style' in locals() else 'カスタム設定'}"
+        if universe_frames:
+            st.session_state['universe_metrics'] = pd.concat(universe_frames)
         
         # Update stock universe to make all discovered stocks searchable throughout platform
         if matching_stocks:
@@ -1106,8 +1192,22 @@ if ('search_results' in st.session_state and st.session_state['search_results']
     display_stocks = filtered_stocks if 'filtered_stocks' in locals() else matching_stocks
         
     if display_stocks:
-        # Sort by market cap descending
-        display_stocks.sort(key=lambda x: x['market_cap'], reverse=True)
+        sort_order = st.radio(
+            "並び順",
+            ["時価総額順", "ファンダメンタルスコア順"],
+            horizontal=True,
+            key="result_sort_order"
+        )
+        if sort_order == "ファンダメンタルスコア順":
+            display_stocks.sort(key=lambda x: (x.get('fundamental_score', 0), x['market_cap']), reverse=True)
+        else:
+            # Sort by market cap descending
+            display_stocks.sort(key=lambda x: x['market_cap'], reverse=True)
+        
+        # Score percentiles within each sector, across the whole screened universe
+        sector_percentiles = {}
+        if 'universe_metrics' in st.session_state and not st.session_state['universe_metrics'].empty:
+            sector_percentiles = calculate_sector_percentiles(st.session_state['universe_metrics']).to_dict()
         
         # Display all results in cards (no artificial limit)
         for i, stock in enumerate(display_stocks):
@@ -1172,6 +1272,15 @@ if ('search_results' in st.session_state and st.session_state['search_results']
                 with metric_col3:
                     st.write(f"**負債比率:** {stock['debt_ratio']:.2f}")
                     st.write(f"**時価総額:** ${market_cap_billions:.1f}B")
+                    if 'fundamental_score' in stock:
+                        st.write(f"**ファンダメンタルスコア:** {stock['fundamental_score']:.1f}")
+                    if stock['ticker'] in sector_percentiles:
+                        st.write(f"**セクター内順位:** 上位{100 - sector_percentiles[stock['ticker']]:.0f}%")
+                    sector_pe_rank = valuation_sketches.percentile_rank('pe', stock['pe_ratio'], stock['sector']) if stock['is_profitable'] else None
+                    if sector_pe_rank is not None:
+                        st.write(f"**セクター内PER水準:** 低い方から{sector_pe_rank:.0f}%")
+                    if pd.notna(stock.get('implied_growth')):
+                        st.write(f"**株価が織り込む成長率:** {stock['implied_growth']:.1f}%（実績 {stock['revenue_growth']:.1f}%）")
             
             st.markdown('</div>', unsafe_allow_html=True)
     
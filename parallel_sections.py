@@ -0,0 +1,98 @@
+"""
+Concurrent execution of independent page sections with per-section timeouts
+
+AI sections of a page are independent round trips of several seconds each.
+They are started together on a shared thread pool and handed back in the
+order they finish, so the page can render each one as soon as it arrives
+and total latency is that of the slowest section rather than the sum.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_SECTION_TIMEOUT = 60  # seconds
+
+# Shared by all pages and sessions. A section still running after its timeout
+# keeps its worker until the call returns (its response still lands in the LLM
+# cache), so timeouts are measured from when a section starts running: a
+# section waiting for a free worker is not charged for the wait.
+section_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="page-section")
+
+
+class SectionTimeout(Exception):
+    """A section did not finish within its timeout"""
+
+
+class _SectionRun:
+    """A section's callable that records when a worker started running it"""
+
+    def __init__(self, func):
+        self.func = func
+        self.started = None
+
+    def __call__(self):
+        self.started = time.monotonic()
+        return self.func()
+
+
+class SectionBatch:
+    def __init__(self, futures, runs, timeouts):
+        self._futures = futures
+        self._runs = runs
+        self._timeouts = timeouts
+
+    def _deadline(self, name, now):
+        """Deadline of a running section, or the earliest possible one of a queued section"""
+        started = self._runs[name].started
+        return (started if started is not None else now) + self._timeouts[name]
+
+    def as_completed(self):
+        """
+        Yield (name, result, error) for every section as soon as it finishes
+
+        error is None on success, a SectionTimeout when the section ran past
+        its timeout, or the exception the section raised.
+        """
+        pending = dict(self._futures)
+        while pending:
+            now = time.monotonic()
+            expired = [name for name, future in pending.items()
+                       if self._runs[name].started is not None
+                       and self._deadline(name, now) <= now and not future.done()]
+            for name in expired:
+                pending.pop(name).cancel()
+                yield name, None, SectionTimeout(name)
+            if not pending:
+                break
+
+            next_deadline = min(self._deadline(name, now) for name in pending)
+            done, _ = wait(list(pending.values()), timeout=max(next_deadline - time.monotonic(), 0),
+                           return_when=FIRST_COMPLETED)
+            for name in [n for n, future in pending.items() if future in done]:
+                future = pending.pop(name)
+                error = future.exception()
+                yield name, (future.result() if error is None else None), error
+
+
+def start_sections(sections, timeouts=None, default_timeout=DEFAULT_SECTION_TIMEOUT):
+    """
+    Start independent sections concurrently
+
+    Parameters:
+    -----------
+    sections : dict
+        {name: zero-argument callable producing the section's result}
+    timeouts : dict, optional
+        {name: seconds} measured from when the section starts running; other
+        sections use default_timeout
+    default_timeout : float
+        Timeout in seconds for sections without their own
+
+    Returns:
+    --------
+    SectionBatch
+        Iterate batch.as_completed() to render sections in the order they finish
+    """
+    timeouts = timeouts or {}
+    runs = {name: _SectionRun(func) for name, func in sections.items()}
+    futures = {name: section_executor.submit(run) for name, run in runs.items()}
+    return SectionBatch(futures, runs, {name: timeouts.get(name, default_timeout) for name in sections})
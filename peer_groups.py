@@ -0,0 +1,283 @@
+"""
+Precomputed peer groups by industry and sector with vectorized peer statistics
+
+Every ticker in the shared stock cache is indexed by industry and sector
+together with its key metrics, so a company's peer comparison covers the
+whole cached universe and is served from local data. The index is rebuilt
+by a background thread; requests read the last built index.
+"""
+import os
+import pickle
+import threading
+import time
+import warnings
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from stock_cache_manager import stock_cache, get_cached_financial_data
+from market_averages import resolve_sector_key
+
+# Peer metrics (column name -> cached financial data key)
+PEER_METRICS = {
+    'pe_ratio': 'pe_ratio',
+    'pb_ratio': 'pb_ratio',
+    'ps_ratio': 'ps_ratio',
+    'roe': 'roe',
+    'profit_margin': 'profit_margin',
+    'revenue_growth': 'historical_growth',
+    'debt_to_equity': 'debt_to_equity',
+    'market_cap': 'market_cap',
+}
+
+# Metrics where only positive values are meaningful (e.g. a negative PE)
+POSITIVE_ONLY_METRICS = ('pe_ratio', 'pb_ratio', 'ps_ratio', 'roe', 'debt_to_equity', 'market_cap')
+
+# Representative tickers for broad group names used by the chatbot; the
+# background refresh fetches them for groups that have too few cached members
+PEER_GROUP_SEEDS = {
+    'Technology': ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META', 'TSLA', 'NVDA', 'NFLX'],
+    'Healthcare': ['JNJ', 'UNH', 'PFE', 'ABBV', 'TMO', 'DHR', 'ABT', 'BMY'],
+    'Financial': ['JPM', 'BAC', 'WFC', 'GS', 'MS', 'C', 'AXP', 'BLK'],
+    'Consumer Goods': ['PG', 'KO', 'PEP', 'WMT', 'HD', 'MCD', 'NKE', 'SBUX'],
+    'Energy': ['XOM', 'CVX', 'COP', 'EOG', 'SLB', 'MPC', 'VLO', 'PSX'],
+    'Industrial': ['BA', 'CAT', 'GE', 'MMM', 'HON', 'UPS', 'LMT', 'RTX']
+}
+
+# Seed groups with fewer cached members than this are topped up from their seed tickers
+MIN_PEER_COUNT = 3
+
+PEER_PERCENTILES = (10, 25, 75, 90)
+TRIM_FRACTION = 0.1
+
+
+def peer_statistics(values, trim=TRIM_FRACTION, percentiles=PEER_PERCENTILES):
+    """
+    Mean, median, trimmed mean and percentiles of every metric column at once
+
+    Parameters:
+    -----------
+    values : pandas.DataFrame
+        One row per peer, one column per metric (NaN for missing values)
+    trim : float
+        Fraction cut from each end for the trimmed mean
+    percentiles : tuple
+        Percentiles to report
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Indexed by metric with columns count, mean, median, trimmed_mean and p{n}
+    """
+    array = values.to_numpy(dtype=float)
+    counts = np.sum(~np.isnan(array), axis=0)
+    stats = pd.DataFrame({'count': counts}, index=values.columns)
+    if len(array) == 0 or not counts.any():
+        for column in ['mean', 'median', 'trimmed_mean'] + [f'p{p}' for p in percentiles]:
+            stats[column] = np.nan
+        return stats
+
+    with warnings.catch_warnings():
+        # Metrics with no values in this group are simply NaN
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        stats['mean'] = np.nanmean(array, axis=0)
+        stats['median'] = np.nanmedian(array, axis=0)
+
+        # NaNs sort last, so the valid values of each column are its first `count` rows
+        ordered = np.sort(array, axis=0)
+        cut = np.floor(counts * trim).astype(int)
+        positions = np.arange(len(ordered))[:, None]
+        kept = (positions >= cut) & (positions < counts - cut)
+        stats['trimmed_mean'] = np.nanmean(np.where(kept, ordered, np.nan), axis=0)
+
+        quantiles = np.nanpercentile(array, percentiles, axis=0)
+    for p, row in zip(percentiles, quantiles):
+        stats[f'p{p}'] = row
+    return stats
+
+
+def _metric_value(value, positive_only):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    if positive_only and value <= 0:
+        return np.nan
+    return value
+
+
+def build_peer_table(records):
+    """One row per cached ticker with its groups and peer metrics"""
+    records = [r for r in records if r and r.get('ticker')]
+    table = pd.DataFrame({
+        'ticker': [str(r['ticker']).upper() for r in records],
+        'name': [r.get('name') or r['ticker'] for r in records],
+        'sector': [r.get('sector') or 'Unknown' for r in records],
+        'industry': [r.get('industry') or 'Unknown' for r in records],
+    })
+    table['sector_key'] = [resolve_sector_key(sector) for sector in table['sector']]
+    for column, key in PEER_METRICS.items():
+        positive_only = column in POSITIVE_ONLY_METRICS
+        table[column] = np.array([_metric_value(r.get(key), positive_only) for r in records], dtype=float)
+    return table.drop_duplicates('ticker').set_index('ticker')
+
+
+class PeerGroupIndex:
+    def __init__(self, index_path="peer_groups.pkl", refresh_minutes=60):
+        self.index_path = index_path
+        self.refresh_interval = timedelta(minutes=refresh_minutes)
+        self._entry = None
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+
+    def _load(self):
+        """Load the index ({'table', 'industries', 'sectors', 'updated_at'})"""
+        if self._entry is not None:
+            return self._entry
+        try:
+            with open(self.index_path, 'rb') as f:
+                self._entry = pickle.load(f)
+        except Exception:
+            return None
+        return self._entry
+
+    def _save(self, entry):
+        self._entry = entry
+        try:
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f)
+            os.replace(tmp_path, self.index_path)
+        except Exception:
+            pass  # Fail silently if persisting fails; the in-memory index still serves
+
+    def rebuild(self, records=None):
+        """Index every cached ticker by lower-cased industry and by sector key"""
+        if records is None:
+            records = stock_cache.get_all_cached_data()
+        table = build_peer_table(records)
+        entry = {
+            'table': table,
+            'industries': {name: table.index[rows].to_numpy() for name, rows in
+                           table.groupby(table['industry'].str.lower()).indices.items()},
+            'sectors': {name: table.index[rows].to_numpy() for name, rows in
+                        table.groupby('sector_key').indices.items()},
+            'updated_at': datetime.now(),
+        }
+        with self._lock:
+            self._save(entry)
+        return entry
+
+    def refresh(self):
+        """
+        Top up under-populated seed groups and rebuild the index
+
+        Seed tickers of a group with fewer than MIN_PEER_COUNT cached members
+        are fetched into the shared cache first, so the rebuilt index has them.
+        """
+        entry = self._load() or self.rebuild()
+        for group_name, seeds in PEER_GROUP_SEEDS.items():
+            if len(self._members(entry, group_name)) >= MIN_PEER_COUNT:
+                continue
+            for ticker in seeds:
+                try:
+                    get_cached_financial_data(ticker)
+                except Exception:
+                    continue
+        return self.rebuild()
+
+    def start_background_refresh(self):
+        """Start the scheduled refresh thread once per process"""
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+
+            def refresh_loop():
+                while True:
+                    try:
+                        self.refresh()
+                    except Exception:
+                        pass
+                    time.sleep(self.refresh_interval.total_seconds())
+
+            self._refresh_thread = threading.Thread(target=refresh_loop, name="peer-groups", daemon=True)
+            self._refresh_thread.start()
+
+    def _current(self):
+        """The last built index (empty until the first background build lands)"""
+        self.start_background_refresh()
+        entry = self._load()
+        if entry is None:
+            table = build_peer_table([])
+            entry = {'table': table, 'industries': {}, 'sectors': {}, 'updated_at': None}
+        return entry
+
+    def _members(self, entry, group_name):
+        """Peer tickers for an industry name, a sector name or one of the seed group names"""
+        industry_members = entry['industries'].get(str(group_name).lower())
+        if industry_members is not None and len(industry_members) >= MIN_PEER_COUNT:
+            return list(industry_members)
+
+        members = set()
+        sector_key = resolve_sector_key(group_name)
+        if sector_key is not None:
+            members.update(entry['sectors'].get(sector_key, []))
+        members.update(t for t in PEER_GROUP_SEEDS.get(group_name, []) if t in entry['table'].index)
+        if industry_members is not None:
+            members.update(industry_members)
+        return sorted(members)
+
+    def get_peers(self, group_name):
+        """
+        Peer rows for an industry or sector
+
+        Served from the last built index; seed groups with too few cached
+        members are topped up by the background refresh, not here.
+
+        Returns:
+        --------
+        pandas.DataFrame
+            One row per peer ticker (name, sector, industry and the peer metrics)
+        """
+        entry = self._current()
+        return entry['table'].loc[self._members(entry, group_name)]
+
+    def get_peer_statistics(self, group_name):
+        """Vectorized statistics of every peer metric for an industry or sector"""
+        peers = self.get_peers(group_name)
+        return peer_statistics(peers[list(PEER_METRICS)]), len(peers)
+
+    def compare_to_peers(self, ticker):
+        """
+        Percentile of a ticker's metrics within its industry peers (or sector peers)
+
+        Returns:
+        --------
+        dict or None
+            {'group': name, 'peer_count': n, 'percentiles': {metric: 0-100 or None}}
+        """
+        entry = self._current()
+        ticker = ticker.upper()
+        if ticker not in entry['table'].index:
+            return None
+        row = entry['table'].loc[ticker]
+        group = row['industry'] if row['industry'] != 'Unknown' else row['sector']
+        peers = self.get_peers(group)
+        values = peers[list(PEER_METRICS)].to_numpy(dtype=float)
+        own = row[list(PEER_METRICS)].to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ranks = np.sum(valid & (values <= own), axis=0) / np.sum(valid, axis=0) * 100
+        return {
+            'group': group,
+            'peer_count': len(peers),
+            'percentiles': {metric: (None if np.isnan(own[i]) or np.isnan(ranks[i]) else float(ranks[i]))
+                            for i, metric in enumerate(PEER_METRICS)},
+        }
+
+
+# Global index instance
+peer_group_index = PeerGroupIndex()
@@ -0,0 +1,327 @@
+"""
+Incremental local store of daily price history per symbol
+
+Each symbol keeps its daily bars on disk. A request for any period is served
+by slicing the stored bars; only bars newer than the last stored date are
+downloaded, so a 10-year chart costs a small delta fetch instead of a full
+download.
+"""
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import pandas as pd
+import yfinance as yf
+
+# yfinance period strings -> how far back they reach
+PERIOD_OFFSETS = {
+    '1d': pd.DateOffset(days=1),
+    '5d': pd.DateOffset(days=5),
+    '1mo': pd.DateOffset(months=1),
+    '3mo': pd.DateOffset(months=3),
+    '6mo': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1),
+    '2y': pd.DateOffset(years=2),
+    '5y': pd.DateOffset(years=5),
+    '10y': pd.DateOffset(years=10),
+}
+
+# Periods ordered from shortest to longest, used to widen a stored history
+PERIOD_ORDER = ['1d', '5d', '1mo', '3mo', '6mo', 'ytd', '1y', '2y', '5y', '10y', 'max']
+
+
+def period_start(period, now=None):
+    """Earliest timestamp covered by a yfinance period string (None for 'max')"""
+    now = now if now is not None else pd.Timestamp.now()
+    if period == 'max':
+        return None
+    if period == 'ytd':
+        return pd.Timestamp(year=now.year, month=1, day=1, tz=now.tz)
+    if period in PERIOD_OFFSETS:
+        return now - PERIOD_OFFSETS[period]
+    if period.endswith('y') and period[:-1].isdigit():
+        return now - pd.DateOffset(years=int(period[:-1]))
+    if period.endswith('mo') and period[:-2].isdigit():
+        return now - pd.DateOffset(months=int(period[:-2]))
+    if period.endswith('d') and period[:-1].isdigit():
+        return now - pd.DateOffset(days=int(period[:-1]))
+    raise ValueError(f"Unsupported period: {period}")
+
+
+def _longer_period(a, b):
+    """Return whichever of two period strings reaches further back"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a in PERIOD_ORDER and b in PERIOD_ORDER:
+        return a if PERIOD_ORDER.index(a) >= PERIOD_ORDER.index(b) else b
+    now = pd.Timestamp.now()
+    start_a, start_b = period_start(a, now), period_start(b, now)
+    if start_a is None or start_b is None:
+        return 'max'
+    return a if start_a <= start_b else b
+
+
+class PriceHistoryStore:
+    def __init__(self, store_dir="price_history", refresh_minutes=15, max_memory_symbols=256):
+        self.store_dir = store_dir
+        self.refresh_interval = timedelta(minutes=refresh_minutes)
+        self.max_memory_symbols = max_memory_symbols
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def _get_store_path(self, symbol):
+        """Get store file path for symbol"""
+        key = hashlib.md5(symbol.upper().encode()).hexdigest()
+        return os.path.join(self.store_dir, f"{key}.pkl")
+
+    def _load(self, symbol):
+        """Load the stored entry for symbol ({'data', 'period', 'updated_at'})"""
+        symbol = symbol.upper()
+        with self._lock:
+            entry = self._memory.get(symbol)
+            if entry is not None:
+                # Least recently used symbols are evicted first
+                self._memory.move_to_end(symbol)
+                return entry
+        try:
+            with open(self._get_store_path(symbol), 'rb') as f:
+                entry = pickle.load(f)
+        except Exception:
+            return None
+        self._remember(symbol, entry)
+        return entry
+
+    def _remember(self, symbol, entry):
+        with self._lock:
+            self._memory[symbol] = entry
+            self._memory.move_to_end(symbol)
+            while len(self._memory) > self.max_memory_symbols:
+                self._memory.popitem(last=False)
+
+    def _save(self, symbol, entry):
+        """Write the entry atomically so concurrent readers never see a partial file"""
+        symbol = symbol.upper()
+        self._remember(symbol, entry)
+        try:
+            path = self._get_store_path(symbol)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            pass  # Fail silently if persisting fails; the in-memory copy still serves
+
+    def _download(self, symbol, **kwargs):
+        data = yf.Ticker(symbol).history(**kwargs)
+        if data is None:
+            return pd.DataFrame()
+        return data
+
+    def _full_fetch(self, symbol, period):
+        data = self._download(symbol, period=period)
+        if data.empty:
+            return None
+        entry = {'symbol': symbol.upper(), 'data': data.sort_index(), 'period': period, 'updated_at': datetime.now()}
+        self._save(symbol, entry)
+        return entry
+
+    def _delta_fetch(self, symbol, entry):
+        """Append bars newer than the last stored bar; refetch fully on a corporate action"""
+        stored = entry['data']
+        last_date = stored.index[-1]
+        # Re-read a few stored bars as well, to detect re-adjusted history
+        check_from = stored.index[max(len(stored) - 5, 0)]
+        delta = self._download(symbol, start=check_from.strftime('%Y-%m-%d'))
+        if delta.empty:
+            entry = {**entry, 'updated_at': datetime.now()}
+            self._save(symbol, entry)
+            return entry
+
+        # A split or dividend re-adjusts all past prices, so stored bars are stale
+        overlap = delta.index.intersection(stored.index[:-1])
+        new_bars = delta[delta.index > last_date]
+        adjusted = False
+        for column in ('Stock Splits', 'Dividends'):
+            if column in new_bars.columns and (new_bars[column].fillna(0) != 0).any():
+                adjusted = True
+        if len(overlap) > 0:
+            stored_close = stored.loc[overlap, 'Close']
+            fetched_close = delta.loc[overlap, 'Close']
+            if ((stored_close - fetched_close).abs() > stored_close.abs() * 1e-4).any():
+                adjusted = True
+        if adjusted:
+            return self._full_fetch(symbol, entry['period']) or entry
+
+        # The last stored bar may have been intraday, so the fetched copy replaces it
+        combined = pd.concat([stored[stored.index < delta.index[0]], delta])
+        combined = combined[~combined.index.duplicated(keep='last')].sort_index()
+        entry = {**entry, 'data': combined, 'updated_at': datetime.now()}
+        self._save(symbol, entry)
+        return entry
+
+    def get_history(self, symbol, period="1y"):
+        """
+        Get daily bars for symbol covering period, fetching only what is missing
+
+        Parameters:
+        -----------
+        symbol : str
+            Ticker symbol (e.g. "AAPL", "^GSPC", "USDJPY=X")
+        period : str
+            yfinance period string ("1mo", "1y", "10y", "ytd", "max", ...)
+
+        Returns:
+        --------
+        pandas.DataFrame
+            Daily bars in the same format as yfinance Ticker.history
+            (empty if no data is available)
+        """
+        try:
+            entry = self._load(symbol)
+            wanted_period = _longer_period(entry['period'], period) if entry else period
+
+            if self._needs_full_fetch(entry, period):
+                # Not stored yet, or the stored history does not reach back far enough
+                entry = self._full_fetch(symbol, wanted_period) or entry
+            elif datetime.now() - entry['updated_at'] >= self.refresh_interval:
+                entry = self._delta_fetch(symbol, entry)
+
+            if entry is None:
+                return pd.DataFrame()
+            return self.slice_period(entry['data'], period)
+        except Exception:
+            # Fall back to a direct download so callers behave as before
+            try:
+                return self._download(symbol, period=period)
+            except Exception:
+                return pd.DataFrame()
+
+    @staticmethod
+    def _needs_full_fetch(entry, period):
+        if entry is None or entry['data'].empty:
+            return True
+        return _longer_period(entry['period'], period) != entry['period']
+
+    def _bulk_fetch(self, symbols, period):
+        """Download full histories for several symbols in one batched request"""
+        try:
+            data = yf.download(
+                symbols,
+                period=period,
+                group_by='ticker',
+                auto_adjust=True,
+                actions=True,
+                ignore_tz=False,
+                threads=True,
+                progress=False
+            )
+        except Exception:
+            return
+        if data is None or data.empty:
+            return
+
+        for symbol in symbols:
+            try:
+                bars = data[symbol].dropna(how='all')
+            except KeyError:
+                continue
+            if not bars.empty:
+                self._save(symbol, {
+                    'symbol': symbol.upper(),
+                    'data': bars.sort_index(),
+                    'period': period,
+                    'updated_at': datetime.now()
+                })
+
+    def get_histories(self, symbols, period="1y"):
+        """
+        Get daily bars for several symbols ({symbol: DataFrame}, empty ones omitted)
+
+        Symbols that are not stored yet are downloaded together in one batch;
+        stored ones only fetch their delta.
+        """
+        missing = []
+        for symbol in symbols:
+            entry = self._load(symbol)
+            if self._needs_full_fetch(entry, period):
+                missing.append(symbol)
+        if len(missing) > 1:
+            self._bulk_fetch(missing, period)
+
+        histories = {}
+        for symbol in symbols:
+            data = self.get_history(symbol, period)
+            if not data.empty:
+                histories[symbol] = data
+        return histories
+
+    @staticmethod
+    def slice_period(data, period):
+        """Slice stored bars down to the requested period"""
+        if data.empty:
+            return data
+        if period.endswith('d') and period[:-1].isdigit():
+            # Day periods count trading days, as yfinance does
+            return data.tail(int(period[:-1])).copy()
+        tz = data.index.tz
+        start = period_start(period, pd.Timestamp.now(tz=tz))
+        if start is None:
+            return data.copy()
+        return data[data.index >= start].copy()
+
+    def iter_stored_histories(self):
+        """
+        Yield (symbol, daily bars) for every stored history without fetching anything
+
+        Files are read one at a time and not kept in memory, so scanning the
+        whole store does not evict the symbols currently being served.
+        Entries saved before symbols were recorded are skipped.
+        """
+        try:
+            filenames = sorted(os.listdir(self.store_dir))
+        except Exception:
+            return
+
+        for filename in filenames:
+            if not filename.endswith('.pkl'):
+                continue
+            try:
+                with open(os.path.join(self.store_dir, filename), 'rb') as f:
+                    entry = pickle.load(f)
+            except Exception:
+                continue
+            if entry.get('symbol') and not entry['data'].empty:
+                yield entry['symbol'], entry['data']
+
+    def get_stored_history(self, symbol):
+        """Stored daily bars for symbol without fetching anything (None if not stored)"""
+        entry = self._load(symbol)
+        if entry is None or entry['data'].empty:
+            return None
+        return entry['data']
+
+    def clear_store(self):
+        """Clear all stored price histories"""
+        with self._lock:
+            self._memory.clear()
+        try:
+            for filename in os.listdir(self.store_dir):
+                if filename.endswith('.pkl'):
+                    os.remove(os.path.join(self.store_dir, filename))
+        except Exception:
+            pass
+
+
+# Global store instance
+price_history_store = PriceHistoryStore()
+
+
+def get_price_history(symbol, period="1y"):
+    """Get daily price history through the shared local store"""
+    return price_history_store.get_history(symbol, period)
@@ -0,0 +1,242 @@
+"""
+Mergeable streaming quantile sketches for market-wide valuation distributions
+
+A KLL sketch summarizes any number of values in a few hundred floats and
+answers quantile and rank queries with a small, bounded error. Sketches of
+the same metric can be merged, so per-sector sketches add up to the market.
+ValuationSketches keeps one sketch per metric for the whole market and per
+sector, updated as ticker records are cached.
+"""
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch
+
+    Level h holds values that each stand for 2**h original values. When a
+    level outgrows its capacity it is sorted and every other value (from a
+    random offset) is promoted to the next level, halving its size.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+
+            items = np.sort(items)
+            # An odd value out stays behind so every promoted pair is complete
+            keep = items[-1:] if len(items) % 2 else items[:0]
+            pairs = items[:len(items) - len(keep)]
+            promoted = pairs[self._rng.integers(2)::2]
+
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+            # Capacities depend on the number of levels, so check again from the bottom
+            level = 0
+
+    def update(self, value):
+        """Add one value"""
+        self.update_many([value])
+
+    def update_many(self, values):
+        """Add many values at once (non-finite values are ignored)"""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self.n += len(values)
+        self._compress()
+
+    def merge(self, other):
+        """Fold another sketch into this one"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _weighted_values(self):
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        return values[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """
+        Approximate q-quantile (q between 0 and 1; an array of q gives an array)
+
+        Returns NaN when the sketch is empty.
+        """
+        if self.n == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        values, cumulative = self._weighted_values()
+        positions = np.searchsorted(cumulative, np.asarray(q, dtype=float) * cumulative[-1], side='left')
+        return values[np.clip(positions, 0, len(values) - 1)]
+
+    def rank(self, value):
+        """Approximate fraction of values less than or equal to value (0 to 1)"""
+        if self.n == 0:
+            return np.nan
+        values, cumulative = self._weighted_values()
+        position = np.searchsorted(values, value, side='right')
+        return cumulative[position - 1] / cumulative[-1] if position > 0 else 0.0
+
+    def __len__(self):
+        return self.n
+
+
+# Metrics kept in the market-wide sketches (name -> cached financial data key)
+SKETCH_METRICS = {
+    'pe': 'pe_ratio',
+    'ps': 'ps_ratio',
+    'pb': 'pb_ratio',
+}
+
+# Sketch group covering every sector
+MARKET_GROUP = 'all'
+
+# Fewer values than this and percentile queries return None
+MIN_SKETCH_COUNT = 5
+
+
+def _positive_value(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return value if value > 0 else np.nan
+
+
+class ValuationSketches:
+    def __init__(self, sketch_path="valuation_sketches.pkl", k=200, save_interval_seconds=60):
+        self.sketch_path = sketch_path
+        self.k = k
+        self.save_interval = save_interval_seconds
+        self._sketches = None
+        self._last_saved = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._sketches is not None:
+            return self._sketches
+        try:
+            with open(self.sketch_path, 'rb') as f:
+                self._sketches = pickle.load(f)
+        except Exception:
+            self._sketches = {}
+        return self._sketches
+
+    def _save(self):
+        try:
+            tmp_path = f"{self.sketch_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(self._sketches, f)
+            os.replace(tmp_path, self.sketch_path)
+            self._last_saved = time.time()
+        except Exception:
+            pass  # Fail silently if persisting fails; the in-memory sketches still serve
+
+    def _sketch(self, sketches, metric, group):
+        key = (metric, group)
+        if key not in sketches:
+            sketches[key] = KLLSketch(k=self.k)
+        return sketches[key]
+
+    def _add_to(self, sketches, records):
+        """Add records to sketches, one vectorized update per metric and group"""
+        sectors = np.array([r.get('sector') or 'Unknown' for r in records], dtype=object)
+        for metric, key in SKETCH_METRICS.items():
+            values = np.array([_positive_value(r.get(key)) for r in records], dtype=float)
+            valid = np.isfinite(values)
+            if not valid.any():
+                continue
+            self._sketch(sketches, metric, MARKET_GROUP).update_many(values[valid])
+            for sector in np.unique(sectors[valid]):
+                self._sketch(sketches, metric, sector).update_many(values[valid & (sectors == sector)])
+
+    def add_records(self, records):
+        """
+        Stream refreshed ticker records into the sketches
+
+        A ticker refreshed twice is counted twice until the next rebuild,
+        which bounds how far the sketches drift from the cached universe.
+        """
+        records = [r for r in records if r]
+        if not records:
+            return
+        with self._lock:
+            sketches = self._load()
+            self._add_to(sketches, records)
+            if time.time() - self._last_saved >= self.save_interval:
+                self._save()
+
+    def add_record(self, record):
+        """Stream one refreshed ticker record into the sketches"""
+        self.add_records([record])
+
+    def rebuild(self, records=None):
+        """Replace the sketches with ones built from the records (default: every cached record)"""
+        if records is None:
+            from stock_cache_manager import stock_cache
+            records = stock_cache.get_all_cached_data()
+        sketches = {}
+        self._add_to(sketches, [r for r in records if r])
+        with self._lock:
+            self._sketches = sketches
+            self._save()
+
+    def quantile(self, metric, q, sector=None):
+        """Approximate q-quantile of metric across the market, or within a sector"""
+        sketch = self._load().get((metric, sector or MARKET_GROUP))
+        if sketch is None or len(sketch) < MIN_SKETCH_COUNT:
+            return None
+        return float(sketch.quantile(q))
+
+    def median(self, metric, sector=None):
+        """Approximate median of metric across the market, or within a sector"""
+        return self.quantile(metric, 0.5, sector)
+
+    def percentile_rank(self, metric, value, sector=None):
+        """
+        Percentile (0-100) of value among all tickers, or within a sector
+
+        Returns None for non-positive values or when too few values are known.
+        """
+        value = _positive_value(value)
+        sketch = self._load().get((metric, sector or MARKET_GROUP))
+        if np.isnan(value) or sketch is None or len(sketch) < MIN_SKETCH_COUNT:
+            return None
+        return float(sketch.rank(value)) * 100
+
+    def count(self, metric, sector=None):
+        """Number of values summarized for metric in the group"""
+        sketch = self._load().get((metric, sector or MARKET_GROUP))
+        return len(sketch) if sketch is not None else 0
+
+
+# Global sketch instance
+valuation_sketches = ValuationSketches()
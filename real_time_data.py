@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 import pandas as pd
 import yfinance as yf
 from openai import OpenAI
+from peer_groups import peer_group_index, PEER_GROUP_SEEDS
 
 # OpenAI client initialization
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
@@ -103,41 +104,26 @@ def get_industry_averages(industry_name):
     dict
         Industry average metrics
     """
-    # Common industry tickers mapping
-    industry_tickers = {
-        'Technology': ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META', 'TSLA', 'NVDA', 'NFLX'],
-        'Healthcare': ['JNJ', 'UNH', 'PFE', 'ABBV', 'TMO', 'DHR', 'ABT', 'BMY'],
-        'Financial': ['JPM', 'BAC', 'WFC', 'GS', 'MS', 'C', 'AXP', 'BLK'],
-        'Consumer Goods': ['PG', 'KO', 'PEP', 'WMT', 'HD', 'MCD', 'NKE', 'SBUX'],
-        'Energy': ['XOM', 'CVX', 'COP', 'EOG', 'SLB', 'MPC', 'VLO', 'PSX'],
-        'Industrial': ['BA', 'CAT', 'GE', 'MMM', 'HON', 'UPS', 'LMT', 'RTX']
-    }
-    
-    tickers = industry_tickers.get(industry_name, industry_tickers['Technology'])
-    
     try:
-        metrics = []
-        for ticker in tickers[:5]:  # Use first 5 to avoid rate limits
-            data = get_live_stock_data(ticker)
-            if data.get('success'):
-                metrics.append(data)
+        # Full peer coverage from the precomputed peer-group index
+        stats, sample_size = peer_group_index.get_peer_statistics(industry_name)
+        if sample_size == 0 and industry_name not in PEER_GROUP_SEEDS:
+            stats, sample_size = peer_group_index.get_peer_statistics('Technology')
         
-        if not metrics:
+        if sample_size == 0:
             return {'error': 'No data available for industry'}
         
-        # Calculate averages
-        avg_pe = sum([m['pe_ratio'] for m in metrics if m['pe_ratio'] > 0]) / len([m for m in metrics if m['pe_ratio'] > 0])
-        avg_pb = sum([m['pb_ratio'] for m in metrics if m['pb_ratio'] > 0]) / len([m for m in metrics if m['pb_ratio'] > 0])
-        avg_roe = sum([m['roe'] for m in metrics if m['roe'] > 0]) / len([m for m in metrics if m['roe'] > 0])
-        avg_debt_equity = sum([m['debt_to_equity'] for m in metrics if m['debt_to_equity'] > 0]) / len([m for m in metrics if m['debt_to_equity'] > 0])
-        
         return {
             'industry': industry_name,
-            'average_pe': avg_pe,
-            'average_pb': avg_pb,
-            'average_roe': avg_roe,
-            'average_debt_to_equity': avg_debt_equity,
-            'sample_size': len(metrics)
+            'average_pe': stats.at['pe_ratio', 'mean'],
+            'average_pb': stats.at['pb_ratio', 'mean'],
+            'average_roe': stats.at['roe', 'mean'],
+            # Cached D/E is a ratio; yfinance reports it in percent
+            'average_debt_to_equity': stats.at['debt_to_equity', 'mean'] * 100,
+            'median_pe': stats.at['pe_ratio', 'median'],
+            'trimmed_mean_pe': stats.at['pe_ratio', 'trimmed_mean'],
+            'sample_size': sample_size,
+            'peer_statistics': stats.to_dict('index')
         }
         
     except Exception as e:
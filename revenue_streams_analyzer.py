@@ -4,6 +4,7 @@ import streamlit as st
 from datetime import datetime
 import plotly.express as px
 import plotly.graph_objects as go
+from figure_cache import figure_cache
 
 def get_company_revenue_streams(ticker):
     """
@@ -307,11 +308,18 @@ def get_generic_revenue_breakdown(stock, ticker):
 
 def create_revenue_streams_visualization(revenue_data):
     """
-    Create visualizations for revenue streams
+    Create visualizations for revenue streams (reused across reruns while the data is unchanged)
     """
     if not revenue_data or 'streams' not in revenue_data:
         return None, None
     
+    return figure_cache.get_or_build(
+        'revenue_streams',
+        lambda: _build_revenue_streams_visualization(revenue_data),
+        data=revenue_data
+    )
+
+def _build_revenue_streams_visualization(revenue_data):
     streams = revenue_data['streams']
     
     # Prepare data for visualization
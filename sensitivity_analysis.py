@@ -2,8 +2,129 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import json
+import io
+import hashlib
+from collections import OrderedDict
 from database import get_session, SensitivityAnalysis
-from financial_models import calculate_intrinsic_value
+from financial_models import calculate_intrinsic_value_grid
+from figure_cache import figure_cache
+
+# 同一入力の感度分析結果を再計算しないためのメモ（入力ハッシュ → 結果）
+_SENSITIVITY_MEMO_SIZE = 256
+_sensitivity_memo = OrderedDict()
+
+def sensitivity_input_hash(base_revenue, net_margin, growth_rates, discount_rates, terminal_multiple,
+                           forecast_years, shares_outstanding, include_forecast_period=True):
+    """
+    感度分析の全入力パラメータから一意なハッシュを計算する
+    
+    Returns:
+    --------
+    str
+        SHA-256 の16進文字列
+    """
+    def normalize(value):
+        return np.round(np.asarray(value, dtype=float), 10).tolist()
+    
+    payload = json.dumps({
+        'base_revenue': normalize(base_revenue),
+        'net_margin': normalize(net_margin),
+        'growth_rates': normalize(growth_rates),
+        'discount_rates': normalize(discount_rates),
+        'terminal_multiple': normalize(terminal_multiple),
+        'forecast_years': int(forecast_years),
+        'shares_outstanding': normalize(shares_outstanding),
+        'include_forecast_period': bool(include_forecast_period),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def encode_sensitivity_matrix(matrix_data):
+    """
+    感度分析の結果を圧縮したバイナリ形式（npz）に変換する
+    
+    Parameters:
+    -----------
+    matrix_data : dict
+        'growth_rates', 'discount_rates', 'matrix' を含む辞書
+        
+    Returns:
+    --------
+    bytes
+        圧縮済みのバイナリデータ
+    """
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        growth_rates=np.asarray(matrix_data['growth_rates'], dtype=np.float64),
+        discount_rates=np.asarray(matrix_data['discount_rates'], dtype=np.float64),
+        matrix=np.asarray(matrix_data['matrix'], dtype=np.float64)
+    )
+    return buffer.getvalue()
+
+def decode_sensitivity_matrix(blob):
+    """
+    encode_sensitivity_matrix で変換したバイナリデータを辞書に戻す
+    
+    Parameters:
+    -----------
+    blob : bytes
+        圧縮済みのバイナリデータ
+        
+    Returns:
+    --------
+    dict
+        'growth_rates', 'discount_rates', 'matrix' を含む辞書
+    """
+    with np.load(io.BytesIO(blob), allow_pickle=False) as arrays:
+        return {
+            'growth_rates': arrays['growth_rates'].tolist(),
+            'discount_rates': arrays['discount_rates'].tolist(),
+            'matrix': arrays['matrix'].tolist()
+        }
+
+def calculate_sensitivity_grid(base_revenue, net_margin, growth_rates, discount_rates, terminal_multiple,
+                               forecast_years, shares_outstanding, include_forecast_period=True):
+    """
+    成長率×割引率の全組み合わせの1株あたりDCF価値を一括で計算する
+    
+    Parameters:
+    -----------
+    base_revenue : float
+        基準年（現在）の売上高
+    net_margin : float
+        純利益率（%）
+    growth_rates : array-like
+        成長率（%）の一覧（行）
+    discount_rates : array-like
+        割引率（%）の一覧（列）
+    terminal_multiple : float
+        終末価値の計算に使用する倍率
+    forecast_years : int
+        予測期間（年）
+    shares_outstanding : float
+        発行済株式数（base_revenue と同じ単位系）
+    include_forecast_period : bool
+        False の場合は割り引いた終末価値のみで評価する
+        
+    Returns:
+    --------
+    numpy.ndarray
+        形状 (len(growth_rates), len(discount_rates)) の1株あたり価値
+    """
+    growth_rates = np.asarray(growth_rates, dtype=float)
+    discount_rates = np.asarray(discount_rates, dtype=float)
+    
+    results = calculate_intrinsic_value_grid(
+        base_revenue,
+        growth_rates[:, np.newaxis],
+        net_margin,
+        discount_rates[np.newaxis, :],
+        terminal_multiple,
+        forecast_years,
+        shares_outstanding,
+        include_forecast_period=include_forecast_period
+    )
+    return results['dcf_per_share']
 
 def generate_sensitivity_matrix(base_forecasted_data, base_discount_rate, terminal_multiple, 
                               shares_outstanding, growth_range, discount_range):
@@ -34,49 +155,51 @@ def generate_sensitivity_matrix(base_forecasted_data, base_discount_rate, termin
     growth_rates = np.arange(growth_range[0], growth_range[1] + growth_range[2], growth_range[2])
     discount_rates = np.arange(discount_range[0], discount_range[1] + discount_range[2], discount_range[2])
     
-    # 結果マトリックスの初期化
-    matrix = []
-    
-    # 基本シナリオのデータを取得
+    # 基本シナリオのデータを取得（'年' は 0 = 現在 から始まる連番）
     base_revenue = base_forecasted_data['売上高（百万USD）'].iloc[0]
     base_net_margin = base_forecasted_data['純利益率 (%)'].iloc[0]
-    years = base_forecasted_data['年']
-    
-    # 各成長率と割引率の組み合わせについてDCF価値を計算
-    for growth_rate in growth_rates:
-        row = []
-        for discount_rate in discount_rates:
-            # 指定された成長率で売上高を予測
-            forecasted_data = pd.DataFrame()
-            forecasted_data['年'] = years
-            
-            # 売上高の予測
-            forecasted_data['売上高（百万USD）'] = [base_revenue * ((1 + growth_rate/100) ** year) for year in years]
-            
-            # 純利益率は一定と仮定
-            forecasted_data['純利益率 (%)'] = base_net_margin
-            
-            # 純利益の予測
-            forecasted_data['純利益（百万USD）'] = forecasted_data['売上高（百万USD）'] * forecasted_data['純利益率 (%)'] / 100
-            
-            # DCF法による本質的価値の計算
-            dcf_results = calculate_intrinsic_value(
-                forecasted_data, 
-                discount_rate, 
-                terminal_multiple, 
-                shares_outstanding
-            )
-            
-            # 結果をマトリックスに追加
-            row.append(dcf_results['dcf_per_share'])
-        
-        matrix.append(row)
+    forecast_years = int(base_forecasted_data['年'].iloc[-1])
     
-    return {
+    # 同じ入力の結果があれば再計算しない
+    input_hash = sensitivity_input_hash(
+        base_revenue, base_net_margin, growth_rates, discount_rates,
+        terminal_multiple, forecast_years, shares_outstanding
+    )
+    if input_hash in _sensitivity_memo:
+        _sensitivity_memo.move_to_end(input_hash)
+        return _copy_matrix_data(_sensitivity_memo[input_hash])
+    
+    # 全ての成長率と割引率の組み合わせについてDCF価値を一括計算
+    matrix = calculate_sensitivity_grid(
+        base_revenue,
+        base_net_margin,
+        growth_rates,
+        discount_rates,
+        terminal_multiple,
+        forecast_years,
+        shares_outstanding
+    )
+    
+    result = {
         'growth_rates': growth_rates.tolist(),
         'discount_rates': discount_rates.tolist(),
-        'matrix': matrix
+        'matrix': matrix.tolist(),
+        'input_hash': input_hash
     }
+    
+    _sensitivity_memo[input_hash] = result
+    if len(_sensitivity_memo) > _SENSITIVITY_MEMO_SIZE:
+        _sensitivity_memo.popitem(last=False)
+    
+    return _copy_matrix_data(result)
+
+def _copy_matrix_data(matrix_data):
+    """メモ内の結果が呼び出し側で変更されないようにコピーを返す"""
+    copied = dict(matrix_data)
+    copied['growth_rates'] = list(matrix_data['growth_rates'])
+    copied['discount_rates'] = list(matrix_data['discount_rates'])
+    copied['matrix'] = [list(row) for row in matrix_data['matrix']]
+    return copied
 
 def save_sensitivity_analysis(analysis_id, growth_range, discount_range, matrix_data):
     """
@@ -98,13 +221,23 @@ def save_sensitivity_analysis(analysis_id, growth_range, discount_range, matrix_
     int or None
         成功した場合は感度分析IDを返す。失敗した場合はNone。
     """
+    session = None
     try:
         session = get_session()
+        input_hash = matrix_data.get('input_hash')
         
-        # データをJSON形式に変換
-        matrix_json = json.dumps(matrix_data)
+        # 同じ分析・同じ入力の結果が保存済みであれば再利用する
+        if input_hash:
+            existing = session.query(SensitivityAnalysis).filter(
+                SensitivityAnalysis.analysis_id == analysis_id,
+                SensitivityAnalysis.input_hash == input_hash
+            ).first()
+            if existing:
+                sensitivity_id = existing.id
+                session.close()
+                return sensitivity_id
         
-        # 感度分析データを作成
+        # 感度分析データを作成（マトリックスは圧縮バイナリで保存）
         sensitivity = SensitivityAnalysis(
             analysis_id=analysis_id,
             growth_range_min=growth_range[0],
@@ -113,7 +246,8 @@ def save_sensitivity_analysis(analysis_id, growth_range, discount_range, matrix_
             discount_range_min=discount_range[0],
             discount_range_max=discount_range[1],
             discount_step=discount_range[2],
-            matrix_data=matrix_json
+            matrix_blob=encode_sensitivity_matrix(matrix_data),
+            input_hash=input_hash
         )
         
         session.add(sensitivity)
@@ -156,16 +290,42 @@ def get_sensitivity_analysis(analysis_id):
             session.close()
             return None
         
-        # JSONデータをPythonオブジェクトに変換
-        matrix_data = json.loads(sensitivity.matrix_data)
+        result = _sensitivity_record_to_dict(sensitivity)
         
-        result = {
-            'id': sensitivity.id,
-            'analysis_id': sensitivity.analysis_id,
-            'growth_range': [sensitivity.growth_range_min, sensitivity.growth_range_max, sensitivity.growth_step],
-            'discount_range': [sensitivity.discount_range_min, sensitivity.discount_range_max, sensitivity.discount_step],
-            'matrix_data': matrix_data
-        }
+        session.close()
+        return result
+    except Exception as e:
+        if 'session' in locals():
+            session.close()
+        print(f"感度分析データの取得中にエラーが発生しました: {e}")
+        return None
+
+def get_sensitivity_analysis_by_hash(input_hash):
+    """
+    入力パラメータのハッシュから保存済みの感度分析データを取得する（共有リンク用）
+    
+    Parameters:
+    -----------
+    input_hash : str
+        sensitivity_input_hash で計算したハッシュ
+        
+    Returns:
+    --------
+    dict or None
+        感度分析データを含む辞書。データがない場合はNone。
+    """
+    try:
+        session = get_session()
+        
+        sensitivity = session.query(SensitivityAnalysis).filter(
+            SensitivityAnalysis.input_hash == input_hash
+        ).order_by(SensitivityAnalysis.created_at.desc()).first()
+        
+        if not sensitivity:
+            session.close()
+            return None
+        
+        result = _sensitivity_record_to_dict(sensitivity)
         
         session.close()
         return result
@@ -175,6 +335,24 @@ def get_sensitivity_analysis(analysis_id):
         print(f"感度分析データの取得中にエラーが発生しました: {e}")
         return None
 
+def _sensitivity_record_to_dict(sensitivity):
+    """SensitivityAnalysis レコードを辞書に変換する（旧形式のJSONにも対応）"""
+    if sensitivity.matrix_blob is not None:
+        matrix_data = decode_sensitivity_matrix(sensitivity.matrix_blob)
+    else:
+        matrix_data = json.loads(sensitivity.matrix_data)
+    
+    if sensitivity.input_hash:
+        matrix_data['input_hash'] = sensitivity.input_hash
+    
+    return {
+        'id': sensitivity.id,
+        'analysis_id': sensitivity.analysis_id,
+        'growth_range': [sensitivity.growth_range_min, sensitivity.growth_range_max, sensitivity.growth_step],
+        'discount_range': [sensitivity.discount_range_min, sensitivity.discount_range_max, sensitivity.discount_step],
+        'matrix_data': matrix_data
+    }
+
 def create_sensitivity_heatmap(sensitivity_data, current_stock_price=None):
     """
     感度分析の結果からヒートマップを作成する
@@ -191,6 +369,18 @@ def create_sensitivity_heatmap(sensitivity_data, current_stock_price=None):
     plotly.graph_objects.Figure
         ヒートマップのFigureオブジェクト
     """
+    # 入力ハッシュがあればそれをデータのバージョンとし、マトリックス本体のハッシュ計算を省く
+    matrix_data = sensitivity_data['matrix_data']
+    version_data = matrix_data.get('input_hash') or matrix_data
+    return figure_cache.get_or_build(
+        'sensitivity_heatmap',
+        lambda: _build_sensitivity_heatmap(sensitivity_data, current_stock_price),
+        data=version_data,
+        params={'current_stock_price': current_stock_price}
+    )
+
+def _build_sensitivity_heatmap(sensitivity_data, current_stock_price=None):
+    """感度分析ヒートマップのFigureを作成する（キャッシュなし）"""
     growth_rates = sensitivity_data['matrix_data']['growth_rates']
     discount_rates = sensitivity_data['matrix_data']['discount_rates']
     matrix = sensitivity_data['matrix_data']['matrix']
@@ -249,4 +439,286 @@ def create_sensitivity_heatmap(sensitivity_data, current_stock_price=None):
         width=800,
     )
     
-    return fig
\ No newline at end of file
+    return fig
+
+
+# 感度分析で変動させることのできるDCF入力と表示名
+SENSITIVITY_INPUTS = {
+    'revenue_growth': '売上成長率 (%)',
+    'net_margin': '純利益率 (%)',
+    'discount_rate': '割引率 (%)',
+    'terminal_multiple': 'ターミナル倍率',
+    'forecast_years': '予測期間 (年)',
+}
+
+def _evaluate_per_share_value(inputs, include_forecast_period):
+    """入力値の辞書（スカラーまたは配列）から1株あたりDCF価値を計算する"""
+    return calculate_intrinsic_value_grid(
+        inputs['base_revenue'],
+        inputs['revenue_growth'],
+        inputs['net_margin'],
+        inputs['discount_rate'],
+        inputs['terminal_multiple'],
+        inputs['forecast_years'],
+        inputs['shares_outstanding'],
+        include_forecast_period=include_forecast_period
+    )['dcf_per_share']
+
+class SensitivityCube:
+    """
+    任意のDCF入力の組み合わせを変動させるN次元の感度分析
+    
+    キューブ全体は作成時には計算せず、表示用の2次元スライスは必要になった時に
+    その断面だけを計算する。全体の集計は chunk_size 件ずつ評価するため、
+    軸の数や刻みを増やしてもメモリ使用量は一定に保たれる。
+    """
+    
+    def __init__(self, base_inputs, axes, include_forecast_period=True, chunk_size=500_000):
+        """
+        Parameters:
+        -----------
+        base_inputs : dict
+            calculate_intrinsic_value_grid の引数名をキーとする基本シナリオの入力値
+        axes : dict
+            変動させる入力名（SENSITIVITY_INPUTS のキー）→ 値の一覧
+        include_forecast_period : bool
+            calculate_intrinsic_value_grid を参照
+        chunk_size : int
+            集計時に1回で評価するシナリオ数
+        """
+        unknown = [name for name in axes if name not in SENSITIVITY_INPUTS]
+        if unknown:
+            raise ValueError(f"感度分析に使用できない入力です: {', '.join(unknown)}")
+        if not axes:
+            raise ValueError("変動させる入力を1つ以上指定してください")
+        
+        self.base_inputs = dict(base_inputs)
+        self.axes = {name: np.asarray(values, dtype=float).ravel() for name, values in axes.items()}
+        self.include_forecast_period = include_forecast_period
+        self.chunk_size = max(1, int(chunk_size))
+    
+    @property
+    def axis_names(self):
+        return list(self.axes)
+    
+    @property
+    def shape(self):
+        return tuple(len(values) for values in self.axes.values())
+    
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+    
+    def _evaluate(self, varied):
+        return _evaluate_per_share_value({**self.base_inputs, **varied}, self.include_forecast_period)
+    
+    def slice(self, row_axis, column_axis=None, fixed=None):
+        """
+        表示用の断面を計算する
+        
+        Parameters:
+        -----------
+        row_axis : str
+            行に並べる入力
+        column_axis : str, optional
+            列に並べる入力（省略時は1次元）
+        fixed : dict, optional
+            それ以外の軸を固定する値（入力名 → 値）。省略した軸は基本シナリオの値
+            
+        Returns:
+        --------
+        numpy.ndarray
+            形状 (len(行), len(列)) または (len(行),) の1株あたり価値
+        """
+        for name in (row_axis, column_axis):
+            if name is not None and name not in self.axes:
+                raise ValueError(f"キューブの軸ではありません: {name}")
+        
+        varied = dict(fixed or {})
+        if column_axis is None:
+            varied[row_axis] = self.axes[row_axis]
+        else:
+            varied[row_axis] = self.axes[row_axis][:, np.newaxis]
+            varied[column_axis] = self.axes[column_axis][np.newaxis, :]
+        return self._evaluate(varied)
+    
+    def iter_chunks(self):
+        """
+        キューブ全体を chunk_size 件ずつ評価する
+        
+        Yields:
+        -------
+        tuple
+            (開始位置（平坦化したインデックス）, 1株あたり価値の配列)
+        """
+        shape = self.shape
+        for start in range(0, self.size, self.chunk_size):
+            flat_index = np.arange(start, min(start + self.chunk_size, self.size))
+            positions = np.unravel_index(flat_index, shape)
+            varied = {
+                name: values[position]
+                for (name, values), position in zip(self.axes.items(), positions)
+            }
+            yield start, self._evaluate(varied)
+    
+    def to_array(self, max_size=5_000_000):
+        """キューブ全体をN次元配列として返す（max_size を超える場合はエラー）"""
+        if self.size > max_size:
+            raise ValueError(f"シナリオ数 {self.size:,} が上限 {max_size:,} を超えています")
+        cube = np.empty(self.size)
+        for start, values in self.iter_chunks():
+            cube[start:start + len(values)] = values
+        return cube.reshape(self.shape)
+    
+    def summarize(self, current_price=None):
+        """
+        キューブ全体の統計量をチャンクごとに集計する
+        
+        Returns:
+        --------
+        dict
+            シナリオ数、最小値・最大値・平均値と、その時の入力値、
+            （current_price 指定時は）株価を上回るシナリオの割合
+        """
+        count = 0
+        total = 0.0
+        above = 0
+        minimum = (np.inf, None)
+        maximum = (-np.inf, None)
+        
+        for start, values in self.iter_chunks():
+            finite = np.isfinite(values)
+            count += int(finite.sum())
+            total += float(values[finite].sum())
+            if current_price:
+                above += int((values[finite] > current_price).sum())
+            if finite.any():
+                masked = np.where(finite, values, np.nan)
+                low_index = int(np.nanargmin(masked))
+                high_index = int(np.nanargmax(masked))
+                if masked[low_index] < minimum[0]:
+                    minimum = (float(masked[low_index]), start + low_index)
+                if masked[high_index] > maximum[0]:
+                    maximum = (float(masked[high_index]), start + high_index)
+        
+        def scenario(flat_index):
+            if flat_index is None:
+                return {}
+            positions = np.unravel_index(flat_index, self.shape)
+            return {name: float(values[position]) for (name, values), position in zip(self.axes.items(), positions)}
+        
+        summary = {
+            'scenarios': count,
+            'mean': total / count if count else np.nan,
+            'min': minimum[0] if count else np.nan,
+            'max': maximum[0] if count else np.nan,
+            'min_scenario': scenario(minimum[1]),
+            'max_scenario': scenario(maximum[1]),
+        }
+        if current_price:
+            summary['probability_above_price'] = above / count if count else np.nan
+        return summary
+
+def calculate_tornado(base_inputs, ranges, include_forecast_period=True):
+    """
+    各入力を1つずつ下限・上限に動かした時の1株あたり価値の変化（トルネード分析）
+    
+    Parameters:
+    -----------
+    base_inputs : dict
+        calculate_intrinsic_value_grid の引数名をキーとする基本シナリオの入力値
+    ranges : dict
+        入力名（SENSITIVITY_INPUTS のキー）→ (下限値, 上限値)
+    include_forecast_period : bool
+        calculate_intrinsic_value_grid を参照
+        
+    Returns:
+    --------
+    pandas.DataFrame
+        入力ごとの下限・上限での価値と変動幅（影響の大きい順）
+    """
+    names = [name for name in ranges if name in SENSITIVITY_INPUTS]
+    if not names:
+        return pd.DataFrame(columns=['parameter', 'label', 'low_input', 'high_input',
+                                     'low_value', 'high_value', 'swing'])
+    
+    # 行 = 入力、列 = (下限, 上限) として全シナリオを一括計算
+    varied = {}
+    for i, name in enumerate(names):
+        column = np.full((len(names), 2), float(base_inputs[name]))
+        column[i] = ranges[name]
+        varied[name] = column
+    
+    values = _evaluate_per_share_value({**base_inputs, **varied}, include_forecast_period)
+    
+    tornado = pd.DataFrame({
+        'parameter': names,
+        'label': [SENSITIVITY_INPUTS[name] for name in names],
+        'low_input': [ranges[name][0] for name in names],
+        'high_input': [ranges[name][1] for name in names],
+        'low_value': values[:, 0],
+        'high_value': values[:, 1],
+    })
+    tornado['swing'] = (tornado['high_value'] - tornado['low_value']).abs()
+    return tornado.sort_values('swing', ascending=False).reset_index(drop=True)
+
+def create_tornado_chart(tornado, base_value, current_stock_price=None):
+    """
+    トルネード分析の結果から横棒グラフを作成する
+    
+    Parameters:
+    -----------
+    tornado : pandas.DataFrame
+        calculate_tornado の結果
+    base_value : float
+        基本シナリオの1株あたり価値
+    current_stock_price : float, optional
+        現在の株価。指定された場合は縦線で表示される。
+        
+    Returns:
+    --------
+    plotly.graph_objects.Figure
+        トルネードチャートのFigureオブジェクト
+    """
+    # 影響の大きい入力が上に来るよう逆順に並べる
+    ordered = tornado.iloc[::-1]
+    labels = [
+        f"{row.label}<br>{row.low_input:g} → {row.high_input:g}" for row in ordered.itertuples()
+    ]
+    
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=labels,
+        x=ordered['low_value'] - base_value,
+        base=base_value,
+        customdata=ordered['low_value'],
+        orientation='h',
+        name='下限値',
+        marker_color='#ff5630',
+        # 棒の長さは基本シナリオからの変化なので、価値は customdata から表示する
+        hovertemplate='%{y}<br>価値: $%{customdata:.2f}（変化: %{x:+.2f}）<extra>下限値</extra>',
+    ))
+    fig.add_trace(go.Bar(
+        y=labels,
+        x=ordered['high_value'] - base_value,
+        base=base_value,
+        customdata=ordered['high_value'],
+        orientation='h',
+        name='上限値',
+        marker_color='#36b37e',
+        hovertemplate='%{y}<br>価値: $%{customdata:.2f}（変化: %{x:+.2f}）<extra>上限値</extra>',
+    ))
+    
+    fig.add_vline(x=base_value, line_color="#333333", annotation_text=f"基本 ${base_value:.2f}")
+    if current_stock_price:
+        fig.add_vline(x=current_stock_price, line_dash="dash", line_color="#667eea",
+                      annotation_text=f"現在株価 ${current_stock_price:.2f}", annotation_position="bottom")
+    
+    fig.update_layout(
+        title="トルネード分析（入力ごとの1株あたり価値への影響）",
+        xaxis_title="1株あたり価値 ($)",
+        barmode='overlay',
+        height=max(300, 90 * len(tornado) + 120),
+        margin=dict(l=50, r=50, t=60, b=50),
+    )
+    return fig
@@ -1,10 +1,10 @@
 """
 Enhanced stock data caching system for improved performance
 """
-import streamlit as st
 import pandas as pd
 import pickle
 import hashlib
+import logging
 from datetime import datetime, timedelta
 import os
 
@@ -55,7 +55,27 @@ class StockDataCache:
                 pickle.dump(cached_item, f)
         except Exception:
             pass  # Fail silently if caching fails
-    
+
+    def get_all_cached_data(self):
+        """Get every fresh cached stock record without fetching anything"""
+        records = []
+        try:
+            filenames = sorted(os.listdir(self.cache_dir))
+        except Exception:
+            return records
+
+        for filename in filenames:
+            if not filename.endswith('.pkl'):
+                continue
+            try:
+                with open(os.path.join(self.cache_dir, filename), 'rb') as f:
+                    cached_item = pickle.load(f)
+                if datetime.now() - cached_item['timestamp'] < self.cache_duration:
+                    records.append(cached_item['data'])
+            except Exception:
+                continue
+        return records
+
     def clear_cache(self):
         """Clear all cached data"""
         try:
@@ -68,8 +88,26 @@ class StockDataCache:
 # Global cache instance
 stock_cache = StockDataCache()
 
-def get_cached_financial_data(ticker):
-    """Get financial data with caching support"""
+def update_valuation_sketches(records):
+    """
+    Stream refreshed ticker records into the market-wide distributions
+
+    Call this from the server process: sketches updated inside a pool worker
+    stay in that worker.
+    """
+    try:
+        from quantile_sketch import valuation_sketches
+        valuation_sketches.add_records(records)
+    except Exception as e:
+        logging.warning(f"Valuation sketch update failed: {e}")
+
+def get_cached_financial_data(ticker, update_sketches=True):
+    """
+    Get financial data with caching support
+
+    Pool workers pass update_sketches=False and hand freshly fetched records
+    back to the parent, which feeds them to update_valuation_sketches.
+    """
     from auto_financial_data import get_auto_financial_data
     
     # Try cache first
@@ -82,6 +120,10 @@ def get_cached_financial_data(ticker):
     if data:
         # Cache the data
         stock_cache.cache_data(ticker, data)
+        
+        # Stream the refreshed ratios into the market-wide distributions
+        if update_sketches:
+            update_valuation_sketches([data])
     
     return data
 
@@ -543,15 +543,15 @@ def calculate_intrinsic_value(ticker, revenue_growth_rate, net_margin, discount_
     shares_outstanding = stock_data["shares_outstanding"]
     
     # 予測データの作成
-    years = list(range(1, forecast_years + 1))
-    forecasted_revenue = [revenue * ((1 + revenue_growth_rate/100) ** year) for year in years]
-    forecasted_net_income = [rev * (net_margin/100) for rev in forecasted_revenue]
+    years = np.arange(1, forecast_years + 1)
+    forecasted_revenue = revenue * (1 + revenue_growth_rate/100) ** years
+    forecasted_net_income = forecasted_revenue * (net_margin/100)
     
     # 割引率と終末価値の計算
-    discount_factors = [(1 + discount_rate/100) ** -year for year in years]
-    discounted_cash_flows = [cf * df for cf, df in zip(forecasted_net_income, discount_factors)]
+    discount_factors = (1 + discount_rate/100) ** -years
+    discounted_cash_flows = forecasted_net_income * discount_factors
     terminal_value = forecasted_net_income[-1] * terminal_multiple * discount_factors[-1]
-    total_firm_value = sum(discounted_cash_flows) + terminal_value
+    total_firm_value = discounted_cash_flows.sum() + terminal_value
     
     # 1株あたりの価値
     intrinsic_value_per_share = total_firm_value / shares_outstanding
@@ -562,21 +562,177 @@ def calculate_intrinsic_value(ticker, revenue_growth_rate, net_margin, discount_
     result = {
         "ticker": ticker,
         "forecasted_data": {
-            "years": years,
-            "revenue": forecasted_revenue,
-            "net_income": forecasted_net_income
+            "years": years.tolist(),
+            "revenue": forecasted_revenue.tolist(),
+            "net_income": forecasted_net_income.tolist()
         },
-        "discount_factors": discount_factors,
-        "discounted_cash_flows": discounted_cash_flows,
-        "terminal_value": terminal_value,
-        "total_firm_value": total_firm_value,
-        "intrinsic_value_per_share": intrinsic_value_per_share,
+        "discount_factors": discount_factors.tolist(),
+        "discounted_cash_flows": discounted_cash_flows.tolist(),
+        "terminal_value": float(terminal_value),
+        "total_firm_value": float(total_firm_value),
+        "intrinsic_value_per_share": float(intrinsic_value_per_share),
         "current_price": current_price,
-        "upside_potential": upside_potential,
+        "upside_potential": float(upside_potential),
     }
     
     return result
 
+# 一括評価で使用する評価方法（compare_valuations のデフォルト）
+VALUATION_METHODS = ["pe_ratio", "pb_ratio", "ps_ratio", "dcf"]
+
+def build_valuation_table(tickers):
+    """
+    複数銘柄の評価に必要な入力データを1つのデータフレームにまとめる
+    
+    Parameters:
+    -----------
+    tickers : list
+        ティッカーシンボルのリスト（データのない銘柄は除外される）
+        
+    Returns:
+    --------
+    pandas.DataFrame
+        ティッカーをインデックスとし、株価・財務データと業界平均
+        （industry_pe_ratio, industry_pb_ratio, industry_ps_ratio, industry_growth_rate）を含む
+    """
+    stocks_data, industry_data = load_sample_data()
+    
+    rows = []
+    for ticker in tickers:
+        stock_data = stocks_data.get(ticker.upper()) if ticker else None
+        if not stock_data:
+            continue
+        
+        industry_avg = industry_data.get(stock_data["industry"], industry_data["その他"])
+        row = {key: stock_data[key] for key in (
+            "name", "industry", "current_price", "revenue", "net_income", "eps",
+            "book_value_per_share", "shares_outstanding", "pe_ratio", "pb_ratio", "ps_ratio"
+        )}
+        row["ticker"] = ticker
+        row["industry_pe_ratio"] = industry_avg["pe_ratio"]
+        row["industry_pb_ratio"] = industry_avg["pb_ratio"]
+        row["industry_ps_ratio"] = industry_avg["ps_ratio"]
+        row["industry_growth_rate"] = industry_avg["growth_rate"]
+        rows.append(row)
+    
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame(rows).set_index("ticker")
+
+def calculate_batch_valuations(table, discount_rate=10.0, terminal_multiple=15.0, forecast_years=5,
+                               growth_rates=None, valuation_methods=None):
+    """
+    複数銘柄のPER・PBR・PSR・DCFによる適正株価を配列演算で一括計算する
+    
+    Parameters:
+    -----------
+    table : pandas.DataFrame
+        build_valuation_table と同じ列を持つデータフレーム
+    discount_rate : float or array-like
+        割引率（%）
+    terminal_multiple : float or array-like
+        終末価値倍率
+    forecast_years : int
+        予測期間（年）
+    growth_rates : array-like, optional
+        銘柄ごとの売上成長率（%）。省略時は業界平均成長率を使用
+    valuation_methods : list, optional
+        評価方法のリスト（デフォルトは全ての評価方法）
+        
+    Returns:
+    --------
+    pandas.DataFrame
+        評価方法ごとに {method}_fair_value, {method}_upside などの列を持つデータフレーム
+    """
+    if valuation_methods is None:
+        valuation_methods = VALUATION_METHODS
+    
+    valuations = pd.DataFrame(index=table.index)
+    if table.empty:
+        return valuations
+    
+    current_price = table["current_price"].to_numpy(dtype=float)
+    revenue = table["revenue"].to_numpy(dtype=float)
+    shares_outstanding = table["shares_outstanding"].to_numpy(dtype=float)
+    
+    # 相対評価の基準となる1株あたり指標
+    per_share_bases = {
+        "pe_ratio": table["eps"].to_numpy(dtype=float),
+        "pb_ratio": table["book_value_per_share"].to_numpy(dtype=float),
+        "ps_ratio": revenue / shares_outstanding,
+    }
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for method, per_share_base in per_share_bases.items():
+            if method not in valuation_methods:
+                continue
+            current_ratio = table[method].to_numpy(dtype=float)
+            industry_ratio = table[f"industry_{method}"].to_numpy(dtype=float)
+            fair_value = per_share_base * industry_ratio
+            
+            valuations[f"{method}_current_ratio"] = current_ratio
+            valuations[f"{method}_industry_avg"] = industry_ratio
+            valuations[f"{method}_fair_value"] = fair_value
+            valuations[f"{method}_upside"] = (fair_value / current_price - 1) * 100
+            valuations[f"{method}_relative_value"] = np.where(current_ratio > industry_ratio, "割高", "割安")
+        
+        if "dcf" in valuation_methods:
+            from financial_models import calculate_intrinsic_value_grid
+            
+            if growth_rates is None:
+                growth_rates = table["industry_growth_rate"].to_numpy(dtype=float)
+            net_margin = table["net_income"].to_numpy(dtype=float) / revenue * 100
+            
+            dcf_results = calculate_intrinsic_value_grid(
+                revenue,
+                np.asarray(growth_rates, dtype=float),
+                net_margin,
+                discount_rate,
+                terminal_multiple,
+                forecast_years,
+                shares_outstanding
+            )
+            fair_value = dcf_results["dcf_per_share"]
+            upside = (fair_value / current_price - 1) * 100
+            
+            valuations["dcf_growth_rate"] = np.broadcast_to(growth_rates, len(table))
+            valuations["dcf_net_margin"] = net_margin
+            valuations["dcf_discount_rate"] = np.broadcast_to(discount_rate, len(table))
+            valuations["dcf_terminal_multiple"] = np.broadcast_to(terminal_multiple, len(table))
+            valuations["dcf_fair_value"] = fair_value
+            valuations["dcf_upside"] = upside
+            valuations["dcf_relative_value"] = np.where(upside > 0, "割安", "割高")
+    
+    return valuations
+
+def rank_by_upside(valuations, method="dcf", top_n=None):
+    """
+    一括評価結果を指定した評価方法の上昇余地で順位付けする
+    
+    Parameters:
+    -----------
+    valuations : pandas.DataFrame
+        calculate_batch_valuations の結果
+    method : str
+        順位付けに使う評価方法（"pe_ratio", "pb_ratio", "ps_ratio", "dcf"）
+    top_n : int, optional
+        上位何銘柄を返すか（省略時は全銘柄）
+        
+    Returns:
+    --------
+    pandas.DataFrame
+        上昇余地の大きい順に並べ、upside_rank 列を追加したデータフレーム
+    """
+    column = f"{method}_upside"
+    if column not in valuations.columns:
+        raise ValueError(f"評価方法 {method} の結果がありません")
+    
+    ranked = valuations.sort_values(column, ascending=False, na_position="last").copy()
+    ranked["upside_rank"] = ranked[column].rank(ascending=False, method="min")
+    if top_n is not None:
+        ranked = ranked.head(top_n)
+    return ranked
+
 def compare_valuations(tickers, valuation_methods=None):
     """
     複数の株式の評価方法を比較する
@@ -594,99 +750,44 @@ def compare_valuations(tickers, valuation_methods=None):
         比較結果を含む辞書
     """
     if valuation_methods is None:
-        valuation_methods = ["pe_ratio", "pb_ratio", "ps_ratio", "dcf"]
+        valuation_methods = VALUATION_METHODS
+    
+    # 全銘柄を一括で評価し、銘柄ごとの辞書に展開する
+    table = build_valuation_table(tickers)
+    valuations = calculate_batch_valuations(table, valuation_methods=valuation_methods)
     
     comparison_results = {}
     
-    for ticker in tickers:
-        stock_data = get_stock_data(ticker)
-        if not stock_data:
-            continue
-        
-        industry = stock_data["industry"]
-        industry_avg = get_industry_average(industry)
-        
+    for (ticker, stock_data), (_, row) in zip(table.iterrows(), valuations.iterrows()):
         stock_result = {
             "name": stock_data["name"],
-            "industry": industry,
+            "industry": stock_data["industry"],
             "current_price": stock_data["current_price"],
             "valuation_methods": {}
         }
         
-        # PER (株価収益率) による相対評価
-        if "pe_ratio" in valuation_methods:
-            pe_ratio = stock_data["pe_ratio"]
-            industry_pe = industry_avg["pe_ratio"]
-            pe_ratio_value = stock_data["eps"] * industry_pe
-            pe_upside = ((pe_ratio_value / stock_data["current_price"]) - 1) * 100
-            
-            stock_result["valuation_methods"]["pe_ratio"] = {
-                "current_ratio": pe_ratio,
-                "industry_avg": industry_pe,
-                "relative_value": "割高" if pe_ratio > industry_pe else "割安",
-                "fair_value": pe_ratio_value,
-                "upside_potential": pe_upside
-            }
-        
-        # PBR (株価純資産倍率) による相対評価
-        if "pb_ratio" in valuation_methods:
-            pb_ratio = stock_data["pb_ratio"]
-            industry_pb = industry_avg["pb_ratio"]
-            pb_ratio_value = stock_data["book_value_per_share"] * industry_pb
-            pb_upside = ((pb_ratio_value / stock_data["current_price"]) - 1) * 100
-            
-            stock_result["valuation_methods"]["pb_ratio"] = {
-                "current_ratio": pb_ratio,
-                "industry_avg": industry_pb,
-                "relative_value": "割高" if pb_ratio > industry_pb else "割安",
-                "fair_value": pb_ratio_value,
-                "upside_potential": pb_upside
-            }
-        
-        # PSR (株価売上高倍率) による相対評価
-        if "ps_ratio" in valuation_methods:
-            ps_ratio = stock_data["ps_ratio"]
-            industry_ps = industry_avg["ps_ratio"]
-            revenue_per_share = stock_data["revenue"] / stock_data["shares_outstanding"]
-            ps_ratio_value = revenue_per_share * industry_ps
-            ps_upside = ((ps_ratio_value / stock_data["current_price"]) - 1) * 100
-            
-            stock_result["valuation_methods"]["ps_ratio"] = {
-                "current_ratio": ps_ratio,
-                "industry_avg": industry_ps,
-                "relative_value": "割高" if ps_ratio > industry_ps else "割安",
-                "fair_value": ps_ratio_value,
-                "upside_potential": ps_upside
-            }
+        # PER・PBR・PSR による相対評価
+        for method in ("pe_ratio", "pb_ratio", "ps_ratio"):
+            if method in valuation_methods:
+                stock_result["valuation_methods"][method] = {
+                    "current_ratio": row[f"{method}_current_ratio"],
+                    "industry_avg": row[f"{method}_industry_avg"],
+                    "relative_value": row[f"{method}_relative_value"],
+                    "fair_value": row[f"{method}_fair_value"],
+                    "upside_potential": row[f"{method}_upside"]
+                }
         
         # DCF (割引キャッシュフロー法) による絶対評価
         if "dcf" in valuation_methods:
-            # デフォルトのパラメータでDCF計算
-            growth_rate = industry_avg["growth_rate"]  # 業界平均成長率を使用
-            net_margin = (stock_data["net_income"] / stock_data["revenue"]) * 100  # 純利益率
-            discount_rate = 10.0  # デフォルト割引率
-            terminal_multiple = 15.0  # デフォルト終末価値倍率
-            forecast_years = 5  # デフォルト予測期間
-            
-            dcf_result = calculate_intrinsic_value(
-                ticker, 
-                growth_rate, 
-                net_margin, 
-                discount_rate, 
-                terminal_multiple, 
-                forecast_years
-            )
-            
-            if dcf_result:
-                stock_result["valuation_methods"]["dcf"] = {
-                    "growth_rate": growth_rate,
-                    "net_margin": net_margin,
-                    "discount_rate": discount_rate,
-                    "terminal_multiple": terminal_multiple,
-                    "fair_value": dcf_result["intrinsic_value_per_share"],
-                    "upside_potential": dcf_result["upside_potential"],
-                    "relative_value": "割安" if dcf_result["upside_potential"] > 0 else "割高"
-                }
+            stock_result["valuation_methods"]["dcf"] = {
+                "growth_rate": row["dcf_growth_rate"],
+                "net_margin": row["dcf_net_margin"],
+                "discount_rate": row["dcf_discount_rate"],
+                "terminal_multiple": row["dcf_terminal_multiple"],
+                "fair_value": row["dcf_fair_value"],
+                "upside_potential": row["dcf_upside"],
+                "relative_value": row["dcf_relative_value"]
+            }
         
         comparison_results[ticker] = stock_result
     
@@ -0,0 +1,851 @@
+"""
+Stock screening query language and universe metrics table for stock discovery
+
+Screens are written as small expressions such as
+``roe >= 15 and per between 5 and 20 and sector in ('Technology', 'Healthcare')``,
+compiled once into vectorized predicates and evaluated over a metrics table
+with one row per ticker.
+"""
+import json
+import multiprocessing
+import operator
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from stock_cache_manager import stock_cache, get_cached_financial_data, update_valuation_sketches
+
+
+class ScreenQueryError(ValueError):
+    """Raised when a screen expression cannot be parsed or evaluated"""
+
+
+# Fields available to screen expressions (column name -> description)
+SCREEN_FIELDS = {
+    'ticker': 'ティッカー',
+    'name': '企業名',
+    'sector': 'セクター',
+    'industry': '業界',
+    'current_price': '株価（USD）',
+    'market_cap': '時価総額（十億USD）',
+    'revenue': '売上高（百万USD）',
+    'net_income': '純利益（百万USD）',
+    'eps': '1株あたり利益（USD）',
+    'revenue_growth': '売上成長率（%）',
+    'roe': 'ROE（%）',
+    'roa': 'ROA（%）',
+    'per': 'PER',
+    'psr': 'PSR',
+    'pbr': 'PBR',
+    'profit_margin': '純利益率（%）',
+    'gross_margin': '粗利益率（%）',
+    'operating_margin': '営業利益率（%）',
+    'current_ratio': '流動比率',
+    'debt_ratio': '負債比率（負債÷自己資本）',
+    'dividend_yield': '配当利回り（%）',
+    'shares_outstanding': '発行済株式数（百万株）',
+    'historical_pe_avg': '過去平均PER',
+    'historical_pb_avg': '過去平均PBR',
+    'overall_score': '総合ファンダメンタルスコア（0-100）',
+    'financial_score': '財務健全性スコア（40-100）',
+    'growth_score': '成長性スコア（40-100）',
+    'implied_growth': '株価が織り込む売上成長率（%、リバースDCF）',
+    'gap_up': '直近のギャップアップ（1/0）',
+    'gap_down': '直近のギャップダウン（1/0）',
+    'breakout': '直近の20日高値ブレイクアウト（1/0）',
+    'breakdown': '直近の20日安値ブレイクダウン（1/0）',
+    'new_52w_high': '直近の52週高値更新（1/0）',
+    'new_52w_low': '直近の52週安値更新（1/0）',
+    'abnormal_volume': '直近の異常出来高（1/0）',
+}
+
+# Alternative spellings accepted in expressions
+FIELD_ALIASES = {
+    'pe': 'per',
+    'pe_ratio': 'per',
+    'ps': 'psr',
+    'ps_ratio': 'psr',
+    'pb': 'pbr',
+    'pb_ratio': 'pbr',
+    'growth': 'revenue_growth',
+    'historical_growth': 'revenue_growth',
+    'margin': 'profit_margin',
+    'debt_to_equity': 'debt_ratio',
+    'price': 'current_price',
+    'implied_revenue_growth': 'implied_growth',
+}
+
+# Text columns of the universe metrics table
+TEXT_FIELDS = ('ticker', 'name', 'sector', 'industry')
+
+# Numeric screen fields and the cached financial data key they come from.
+# Missing values count as 0, the same way the discovery page has always treated them.
+METRIC_SOURCES = {
+    'current_price': 'current_price',
+    'revenue': 'revenue',
+    'net_income': 'net_income',
+    'eps': 'eps',
+    'revenue_growth': 'historical_growth',
+    'roe': 'roe',
+    'roa': 'roa',
+    'per': 'pe_ratio',
+    'psr': 'ps_ratio',
+    'pbr': 'pb_ratio',
+    'profit_margin': 'profit_margin',
+    'gross_margin': 'gross_margin',
+    'operating_margin': 'operating_margin',
+    'current_ratio': 'current_ratio',
+    'debt_ratio': 'debt_to_equity',
+    'dividend_yield': 'dividend_yield',
+    'shares_outstanding': 'shares_outstanding',
+}
+
+# Numeric fields that stay NaN when missing, so comparisons against them fail
+OPTIONAL_METRIC_SOURCES = {
+    'historical_pe_avg': 'historical_pe_avg',
+    'historical_pb_avg': 'historical_pb_avg',
+}
+
+# DCF assumptions used to back out the growth rate implied by the current price
+# (the same defaults as stock_data.compare_valuations)
+IMPLIED_GROWTH_ASSUMPTIONS = {
+    'discount_rate': 10.0,
+    'terminal_multiple': 15.0,
+    'forecast_years': 5,
+}
+
+# Calendar days counted as "recent" for the price event fields
+RECENT_EVENT_DAYS = 5
+
+# Built-in screens for the investment styles on the discovery page
+PRESET_SCREENS = {
+    "成長株投資": (
+        "revenue_growth >= 20"
+        " or (revenue_growth >= 15 and roe >= 20)"
+        " or (market_cap >= 1 and revenue_growth >= 15)"
+    ),
+    "バリュー株投資": (
+        "profit_margin > 0 and per > 0"
+        " and ((per < historical_pe_avg * 0.8 and pbr < historical_pb_avg * 0.8)"
+        " or (per <= 15 and pbr <= 2.5 and revenue_growth >= 0))"
+    ),
+    "配当株投資": "dividend_yield >= 3.0 and profit_margin > 0 and market_cap >= 0.5",
+    "安定株投資": "market_cap >= 5.0 and profit_margin > 5 and debt_ratio <= 1.0 and roe >= 10",
+}
+
+
+def _record_value(record, key):
+    value = record.get(key)
+    if value is None or isinstance(value, bool):
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def universe_metrics_from_records(records):
+    """
+    Build the universe metrics table from cached financial data records
+
+    Parameters:
+    -----------
+    records : list of dict
+        Records as returned by get_auto_financial_data / the stock cache
+
+    Returns:
+    --------
+    pandas.DataFrame
+        One row per ticker (indexed by ticker) with a column per screen field
+    """
+    records = [r for r in records if r and r.get('ticker')]
+    tickers = [str(r['ticker']).upper() for r in records]
+
+    columns = {
+        'ticker': tickers,
+        'name': [r.get('name') or t for r, t in zip(records, tickers)],
+        'sector': [r.get('sector') or 'Unknown' for r in records],
+        'industry': [r.get('industry') or 'Unknown' for r in records],
+    }
+    for field, key in {**METRIC_SOURCES, **OPTIONAL_METRIC_SOURCES}.items():
+        columns[field] = np.array([_record_value(r, key) for r in records], dtype=float)
+
+    market_cap = np.array([_record_value(r, 'market_cap') for r in records], dtype=float)
+    columns['market_cap'] = market_cap / 1000  # 百万USD -> 十億USD
+
+    metrics = pd.DataFrame(columns, index=pd.Index(tickers, name='symbol'))
+    metrics = metrics[~metrics.index.duplicated(keep='first')]
+
+    # Scores only depend on each row, so shards can compute them independently.
+    # They see missing inputs as NaN (lowest band) before those become 0 for screening.
+    from fundamental_scoring import create_fundamental_scorecards
+    scorecards = create_fundamental_scorecards(metrics)
+    for column in ('overall_score', 'financial_score', 'growth_score'):
+        metrics[column] = scorecards[column]
+
+    zero_filled = list(METRIC_SOURCES) + ['market_cap']
+    metrics[zero_filled] = metrics[zero_filled].fillna(0.0)
+
+    metrics['implied_growth'] = implied_growth_column(metrics)
+
+    # Price events come from the market event index, which is never rescanned here
+    from market_events import market_event_index
+    event_flags = market_event_index.recent_event_flags(list(metrics.index), days=RECENT_EVENT_DAYS)
+    for column in event_flags.columns:
+        metrics[column] = event_flags[column].to_numpy()
+    return metrics
+
+
+def implied_growth_column(metrics, **assumptions):
+    """
+    Revenue growth implied by each ticker's current price (reverse DCF)
+
+    Solved for every row at once; rows without a positive price, margin or
+    share count, or whose implied growth falls outside the solver bounds, are NaN.
+    """
+    from financial_models import solve_implied_parameter
+
+    params = {**IMPLIED_GROWTH_ASSUMPTIONS, **assumptions}
+    if metrics.empty:
+        return pd.Series(np.nan, index=metrics.index, dtype=float)
+
+    price = metrics['current_price'].to_numpy(dtype=float)
+    revenue = metrics['revenue'].to_numpy(dtype=float)
+    margin = metrics['profit_margin'].to_numpy(dtype=float)
+    shares = metrics['shares_outstanding'].to_numpy(dtype=float)
+    valid = (price > 0) & (revenue > 0) & (margin > 0) & (shares > 0)
+
+    implied = np.full(len(metrics), np.nan)
+    if valid.any():
+        implied[valid] = solve_implied_parameter(
+            price[valid],
+            revenue[valid],
+            margin[valid],
+            params['discount_rate'],
+            params['terminal_multiple'],
+            params['forecast_years'],
+            shares[valid],
+        )
+    return pd.Series(implied, index=metrics.index)
+
+
+def build_universe_metrics(tickers, fetch_missing=False):
+    """
+    Build the universe metrics table for a list of tickers
+
+    With fetch_missing=False only the local stock cache is read, so building
+    the table never touches the network.
+    """
+    records = []
+    for ticker in tickers:
+        try:
+            if fetch_missing:
+                data = get_cached_financial_data(ticker)
+            else:
+                data = stock_cache.get_cached_data(ticker)
+        except Exception:
+            continue
+        if data:
+            records.append(data)
+    return universe_metrics_from_records(records)
+
+
+# ---------------------------------------------------------------------------
+# Query language
+# ---------------------------------------------------------------------------
+
+_TOKEN_RE = re.compile(r"""
+    (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<string>'[^']*'|"[^"]*")
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op><=|>=|==|!=|<>|[<>=+\-*/(),])
+""", re.VERBOSE)
+
+_KEYWORDS = {'and', 'or', 'not', 'between', 'in'}
+
+_COMPARISONS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<>': operator.ne,
+}
+
+_ARITHMETIC = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+}
+
+# AST node kinds that produce values rather than booleans
+_VALUE_NODES = {'num', 'str', 'field', 'arith', 'neg'}
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        if text[pos].isspace():
+            pos += 1
+            continue
+        match = _TOKEN_RE.match(text, pos)
+        if not match:
+            raise ScreenQueryError(f"解釈できない文字があります（位置 {pos + 1}）: {text[pos:pos + 10]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'name' and value.lower() in _KEYWORDS:
+            kind, value = 'keyword', value.lower()
+        tokens.append((kind, value, pos))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser producing a tuple-based AST"""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.index = 0
+
+    def _peek(self, offset=0):
+        i = self.index + offset
+        return self.tokens[i] if i < len(self.tokens) else (None, None, len(self.text))
+
+    def _next(self):
+        token = self._peek()
+        self.index += 1
+        return token
+
+    def _accept(self, kind, value):
+        token = self._peek()
+        if token[0] == kind and token[1] == value:
+            self.index += 1
+            return True
+        return False
+
+    def _expect(self, kind, value):
+        if not self._accept(kind, value):
+            self._error(f"'{value}' が必要です")
+
+    def _error(self, message):
+        _, value, pos = self._peek()
+        found = value if value is not None else "式の終わり"
+        raise ScreenQueryError(f"{message}（位置 {pos + 1}, '{found}'）")
+
+    def _boolean(self, node):
+        if node[0] in _VALUE_NODES:
+            self._error("条件（比較式）が必要です")
+        return node
+
+    def _value(self, node):
+        if node[0] not in _VALUE_NODES:
+            self._error("値が必要です")
+        return node
+
+    def parse(self):
+        if not self.tokens:
+            raise ScreenQueryError("スクリーン条件が空です")
+        node = self._boolean(self._parse_or())
+        if self.index < len(self.tokens):
+            self._error("式の終わりが必要です")
+        return node
+
+    def _parse_or(self):
+        node = self._parse_and()
+        while self._accept('keyword', 'or'):
+            node = ('or', self._boolean(node), self._boolean(self._parse_and()))
+        return node
+
+    def _parse_and(self):
+        node = self._parse_not()
+        while self._accept('keyword', 'and'):
+            node = ('and', self._boolean(node), self._boolean(self._parse_not()))
+        return node
+
+    def _parse_not(self):
+        if self._accept('keyword', 'not'):
+            return ('not', self._boolean(self._parse_not()))
+        return self._parse_predicate()
+
+    def _parse_predicate(self):
+        left = self._parse_sum()
+        kind, value, _ = self._peek()
+
+        if kind == 'op' and value in _COMPARISONS:
+            self._next()
+            return ('cmp', value, self._value(left), self._value(self._parse_sum()))
+
+        negated = False
+        if kind == 'keyword' and value == 'not' and self._peek(1)[1] in ('between', 'in'):
+            self._next()
+            negated = True
+
+        if self._accept('keyword', 'between'):
+            low = self._value(self._parse_sum())
+            self._expect('keyword', 'and')
+            high = self._value(self._parse_sum())
+            return ('between', self._value(left), low, high, negated)
+
+        if self._accept('keyword', 'in'):
+            self._expect('op', '(')
+            values = [self._parse_literal()]
+            while self._accept('op', ','):
+                values.append(self._parse_literal())
+            self._expect('op', ')')
+            return ('in', self._value(left), tuple(values), negated)
+
+        if negated:
+            self._error("'between' または 'in' が必要です")
+        return left
+
+    def _parse_literal(self):
+        sign = -1 if self._accept('op', '-') else 1
+        kind, value, _ = self._peek()
+        if kind == 'number':
+            self._next()
+            return sign * float(value)
+        if kind == 'string' and sign == 1:
+            self._next()
+            return value[1:-1]
+        self._error("数値または文字列が必要です")
+
+    def _parse_sum(self):
+        node = self._parse_term()
+        while self._peek()[0] == 'op' and self._peek()[1] in ('+', '-'):
+            op = self._next()[1]
+            node = ('arith', op, self._value(node), self._value(self._parse_term()))
+        return node
+
+    def _parse_term(self):
+        node = self._parse_unary()
+        while self._peek()[0] == 'op' and self._peek()[1] in ('*', '/'):
+            op = self._next()[1]
+            node = ('arith', op, self._value(node), self._value(self._parse_unary()))
+        return node
+
+    def _parse_unary(self):
+        if self._accept('op', '-'):
+            return ('neg', self._value(self._parse_unary()))
+        if self._accept('op', '+'):
+            return self._value(self._parse_unary())
+        return self._parse_primary()
+
+    def _parse_primary(self):
+        kind, value, _ = self._peek()
+        if kind == 'number':
+            self._next()
+            return ('num', float(value))
+        if kind == 'string':
+            self._next()
+            return ('str', value[1:-1])
+        if kind == 'name':
+            field = FIELD_ALIASES.get(value.lower(), value.lower())
+            if field not in SCREEN_FIELDS:
+                self._error(f"不明な項目 '{value}' です")
+            self._next()
+            return ('field', field)
+        if self._accept('op', '('):
+            node = self._parse_or()
+            self._expect('op', ')')
+            return node
+        self._error("値または条件が必要です")
+
+
+def _compile_node(node, fields):
+    """Turn an AST node into a function of the column dict"""
+    kind = node[0]
+
+    if kind in ('num', 'str'):
+        constant = node[1]
+        return lambda cols: constant
+
+    if kind == 'field':
+        field = node[1]
+        fields.add(field)
+        return lambda cols: cols[field]
+
+    if kind == 'neg':
+        operand = _compile_node(node[1], fields)
+        return lambda cols: -operand(cols)
+
+    if kind in ('arith', 'cmp'):
+        fn = _ARITHMETIC[node[1]] if kind == 'arith' else _COMPARISONS[node[1]]
+        left = _compile_node(node[2], fields)
+        right = _compile_node(node[3], fields)
+        return lambda cols: fn(left(cols), right(cols))
+
+    if kind == 'between':
+        operand = _compile_node(node[1], fields)
+        low = _compile_node(node[2], fields)
+        high = _compile_node(node[3], fields)
+        negated = node[4]
+
+        def between(cols):
+            values = operand(cols)
+            result = np.logical_and(values >= low(cols), values <= high(cols))
+            return np.logical_not(result) if negated else result
+        return between
+
+    if kind == 'in':
+        operand = _compile_node(node[1], fields)
+        members = list(node[2])
+        negated = node[3]
+
+        def contains(cols):
+            result = np.isin(operand(cols), members)
+            return np.logical_not(result) if negated else result
+        return contains
+
+    if kind in ('and', 'or'):
+        left = _compile_node(node[1], fields)
+        right = _compile_node(node[2], fields)
+        if kind == 'and':
+            return lambda cols: np.logical_and(left(cols), right(cols))
+        return lambda cols: np.logical_or(left(cols), right(cols))
+
+    if kind == 'not':
+        operand = _compile_node(node[1], fields)
+        return lambda cols: np.logical_not(operand(cols))
+
+    raise ScreenQueryError(f"未対応の式です: {kind}")
+
+
+class CompiledScreen:
+    """A screen expression compiled into a vectorized predicate"""
+
+    def __init__(self, query, predicate, fields):
+        self.query = query
+        self.fields = frozenset(fields)
+        self._predicate = predicate
+
+    def mask(self, metrics):
+        """Boolean numpy mask of the rows of the metrics table matching the screen"""
+        missing = [f for f in self.fields if f not in metrics.columns]
+        if missing:
+            raise ScreenQueryError(f"データにない項目があります: {', '.join(sorted(missing))}")
+
+        columns = {}
+        for field in self.fields:
+            values = metrics[field].to_numpy()
+            if field not in TEXT_FIELDS:
+                values = values.astype(float, copy=False)
+            columns[field] = values
+
+        try:
+            with np.errstate(all='ignore'):
+                result = self._predicate(columns)
+        except TypeError as e:
+            raise ScreenQueryError(f"型の合わない比較があります: {e}") from e
+        return np.broadcast_to(np.asarray(result, dtype=bool), (len(metrics),))
+
+    def apply(self, metrics):
+        """Return the rows of the metrics table matching the screen"""
+        return metrics[self.mask(metrics)]
+
+
+def _normalize_query(query):
+    return " ".join(str(query).split())
+
+
+@lru_cache(maxsize=256)
+def _compile_normalized(query):
+    ast = _Parser(query).parse()
+    fields = set()
+    predicate = _compile_node(ast, fields)
+    return CompiledScreen(query, predicate, fields)
+
+
+def compile_screen(query):
+    """
+    Compile a screen expression
+
+    Parameters:
+    -----------
+    query : str
+        Expression such as "roe >= 15 and per between 5 and 20"
+
+    Returns:
+    --------
+    CompiledScreen
+        Compiled predicate; identical expressions are only compiled once
+
+    Raises:
+    -------
+    ScreenQueryError
+        If the expression is invalid or references an unknown field
+    """
+    return _compile_normalized(_normalize_query(query))
+
+
+def run_screen(query, metrics):
+    """Compile (or reuse) a screen and return the matching rows of the metrics table"""
+    return compile_screen(query).apply(metrics)
+
+
+# ---------------------------------------------------------------------------
+# Sharded screening over a process pool
+# ---------------------------------------------------------------------------
+
+_screen_pool = None
+_screen_pool_workers = 0
+
+
+def _get_screen_pool(workers):
+    """Get the per-process screening pool, creating it on first use"""
+    global _screen_pool, _screen_pool_workers
+    if _screen_pool is None or _screen_pool_workers != workers:
+        if _screen_pool is not None:
+            _screen_pool.shutdown(wait=False, cancel_futures=True)
+        # spawn keeps workers independent of the Streamlit server's threads
+        _screen_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        _screen_pool_workers = workers
+    return _screen_pool
+
+
+def _reset_screen_pool():
+    global _screen_pool, _screen_pool_workers
+    if _screen_pool is not None:
+        _screen_pool.shutdown(wait=False, cancel_futures=True)
+    _screen_pool = None
+    _screen_pool_workers = 0
+
+
+def screen_shard(shard_index, tickers, query, fetch_missing=True):
+    """
+    Load data, derive metrics and apply a screen for one shard of the universe
+
+    Runs inside a pool worker, so everything it needs travels as plain arguments
+    and only the shard's metrics, the records of matching tickers and the
+    records fetched from the network come back. The parent streams the fetched
+    records into the valuation sketches, which a worker cannot update.
+
+    Returns:
+    --------
+    tuple
+        (shard_index, metrics DataFrame, boolean match mask, {ticker: record} for matches,
+        list of freshly fetched records)
+    """
+    records = []
+    fetched = []
+    for ticker in tickers:
+        try:
+            data = stock_cache.get_cached_data(ticker)
+            if not data and fetch_missing:
+                data = get_cached_financial_data(ticker, update_sketches=False)
+                if data:
+                    fetched.append(data)
+        except Exception:
+            continue
+        # Skip records without a usable price, like the discovery page always has
+        if not data or (data.get('current_price') or 0) <= 0:
+            continue
+        records.append(dict(data, ticker=ticker))
+
+    metrics = universe_metrics_from_records(records)
+    mask = compile_screen(query).mask(metrics)
+
+    matched = set(metrics.index[mask])
+    matched_records = {}
+    for record in records:
+        symbol = str(record['ticker']).upper()
+        if symbol in matched:
+            matched_records.setdefault(symbol, record)
+    return shard_index, metrics, np.array(mask), matched_records, fetched
+
+
+def screen_universe_sharded(tickers, query, workers=None, shards_per_worker=4,
+                            fetch_missing=True, progress_callback=None, max_matches=None):
+    """
+    Screen a ticker universe by sharding it across a process pool
+
+    The universe is split into contiguous shards, each worker derives per-ticker
+    metrics and applies the compiled screen to its shard, and the shards are
+    merged back in input order, so the result does not depend on which worker
+    finishes first.
+
+    Parameters:
+    -----------
+    tickers : list of str
+        Universe to screen
+    query : str
+        Screen expression (validated before any work is dispatched)
+    workers : int, optional
+        Number of worker processes (defaults to the number of CPU cores)
+    shards_per_worker : int
+        Shards per worker; more shards balance slow network fetches better
+    fetch_missing : bool
+        Fetch tickers missing from the stock cache instead of skipping them
+    progress_callback : callable, optional
+        Called as progress_callback(completed_shards, total_shards, matches_so_far)
+    max_matches : int, optional
+        Stop early once more than this many tickers match. Shards are merged in
+        input order and the result is the shortest prefix of shards whose
+        matches exceed max_matches, so it is the same on every run whichever
+        worker finishes first. Only a small window of shards past the current
+        one is in flight, so little work is wasted after the stop. The
+        discovery page uses this for large universes, as its batch loop always has.
+
+    Returns:
+    --------
+    tuple
+        (universe metrics DataFrame, boolean match mask, {ticker: record} for matches)
+    """
+    compile_screen(query)  # Raise ScreenQueryError here rather than in every worker
+
+    tickers = list(tickers)
+    workers = max(1, workers or os.cpu_count() or 1)
+    shard_count = max(1, min(len(tickers), workers * shards_per_worker))
+    shard_size = -(-len(tickers) // shard_count) if tickers else 1
+    shards = [tickers[i:i + shard_size] for i in range(0, len(tickers), shard_size)]
+
+    results = {}
+    matches = 0
+
+    def collect(result):
+        nonlocal matches
+        results[result[0]] = result
+        matches += int(result[2].sum())
+        if result[4]:
+            update_valuation_sketches(result[4])
+        if progress_callback:
+            progress_callback(len(results), len(shards), matches)
+
+    def enough():
+        return max_matches is not None and matches > max_matches
+
+    if workers == 1 or len(shards) == 1:
+        for index, shard in enumerate(shards):
+            collect(screen_shard(index, shard, query, fetch_missing))
+            if enough():
+                break
+    else:
+        # Shards are collected strictly in index order, keeping at most two
+        # shards per worker in flight ahead of the one being collected
+        window = 2 * workers
+        futures = {}
+        try:
+            pool = _get_screen_pool(workers)
+            for index in range(len(shards)):
+                for ahead in range(index, min(index + window, len(shards))):
+                    if ahead not in futures:
+                        futures[ahead] = pool.submit(screen_shard, ahead, shards[ahead], query, fetch_missing)
+                collect(futures.pop(index).result())
+                if enough():
+                    break
+        except (BrokenProcessPool, OSError):
+            # Fall back to in-process screening from the first shard not collected
+            _reset_screen_pool()
+            for index, shard in enumerate(shards):
+                if enough():
+                    break
+                if index not in results:
+                    collect(screen_shard(index, shard, query, fetch_missing))
+        for future in futures.values():
+            future.cancel()
+
+    ordered = [results[index] for index in range(len(shards)) if index in results]
+    if not ordered:
+        return universe_metrics_from_records([]), np.zeros(0, dtype=bool), {}
+
+    metrics = pd.concat([result[1] for result in ordered])
+    mask = np.concatenate([result[2] for result in ordered])
+    keep = ~metrics.index.duplicated(keep='first')
+
+    matched_records = {}
+    for result in ordered:
+        for symbol, record in result[3].items():
+            matched_records.setdefault(symbol, record)
+    return metrics[keep], mask[keep], matched_records
+
+
+def _format_number(value):
+    return repr(float(value))
+
+
+def range_screen_query(ranges, allow_non_positive=()):
+    """
+    Build a screen expression from inclusive (min, max) ranges per field
+
+    Fields listed in allow_non_positive also pass when their value is <= 0,
+    which is how the discovery page treats PER for unprofitable companies.
+    """
+    clauses = []
+    for field, (low, high) in ranges.items():
+        clause = f"{field} between {_format_number(low)} and {_format_number(high)}"
+        if field in allow_non_positive:
+            clause = f"({field} <= 0 or {clause})"
+        clauses.append(clause)
+    return " and ".join(clauses)
+
+
+# ---------------------------------------------------------------------------
+# Saved screens
+# ---------------------------------------------------------------------------
+
+class SavedScreenStore:
+    """Named screen expressions persisted to a JSON file"""
+
+    def __init__(self, path="saved_screens.json"):
+        self.path = path
+        self.screens = self.load_screens()
+
+    def load_screens(self):
+        """Load saved screens from file"""
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            return {}
+        except Exception:
+            return {}
+
+    def _write(self):
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.screens, f, ensure_ascii=False, indent=2)
+        except Exception:
+            pass
+
+    def save_screen(self, name, query):
+        """Validate and save a named screen, replacing any screen with the same name"""
+        name = name.strip()
+        if not name:
+            raise ScreenQueryError("スクリーン名を入力してください")
+        compiled = compile_screen(query)
+        self.screens[name] = {
+            'query': compiled.query,
+            'updated_at': datetime.now().isoformat(),
+        }
+        self._write()
+
+    def delete_screen(self, name):
+        """Delete a saved screen"""
+        if self.screens.pop(name, None) is not None:
+            self._write()
+
+    def get_query(self, name):
+        """Get the expression of a saved screen"""
+        screen = self.screens.get(name)
+        return screen['query'] if screen else None
+
+    def get_screen_names(self):
+        """Get saved screen names in alphabetical order"""
+        return sorted(self.screens.keys())
+
+
+# Global instance
+saved_screens = SavedScreenStore()
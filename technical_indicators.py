@@ -0,0 +1,179 @@
+"""
+Incremental rolling indicator engine for daily price bars
+
+Indicators (moving averages, volatility, drawdown, volume z-scores and event
+flags) are computed vectorized over a symbol's bars and kept per symbol. When
+new bars arrive only they are computed, from a fixed lookback of earlier bars,
+so long histories are never recomputed on every render.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS_PER_YEAR = 252
+
+# Rolling windows (in bars) used by the indicator columns
+INDICATOR_WINDOWS = {
+    'ma_short': 20,
+    'ma_long': 50,
+    'volatility': 20,
+    'drawdown': TRADING_DAYS_PER_YEAR,
+    'volume': 20,
+}
+
+# Event flag thresholds
+SURGE_THRESHOLD = 0.05         # daily return above +5%
+DROP_THRESHOLD = -0.05         # daily return below -5%
+VOLUME_SPIKE_ZSCORE = 2.0      # volume more than 2 standard deviations above its 20-day mean
+
+# Enough earlier bars for every rolling window to be exact on new bars
+LOOKBACK_BARS = max(INDICATOR_WINDOWS.values())
+
+
+def compute_indicators(bars):
+    """
+    Compute all indicator columns for daily bars in one vectorized pass
+
+    Parameters:
+    -----------
+    bars : pandas.DataFrame
+        Daily bars with 'Close' and 'Volume' columns
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Indexed like bars, with columns:
+        return, ma_20, ma_50, volatility (annualized %, 20-day),
+        drawdown (% below the 52-week high), volume_ma_20, volume_zscore,
+        surge, drop, volume_spike
+    """
+    close = bars['Close'].astype(float)
+    volume = bars['Volume'].astype(float)
+    returns = close.pct_change()
+
+    ma_short = close.rolling(INDICATOR_WINDOWS['ma_short']).mean()
+    ma_long = close.rolling(INDICATOR_WINDOWS['ma_long']).mean()
+    volatility = returns.rolling(INDICATOR_WINDOWS['volatility']).std() * np.sqrt(TRADING_DAYS_PER_YEAR) * 100
+
+    rolling_high = close.rolling(INDICATOR_WINDOWS['drawdown'], min_periods=1).max()
+    drawdown = (close / rolling_high - 1) * 100
+
+    volume_window = volume.rolling(INDICATOR_WINDOWS['volume'])
+    volume_mean = volume_window.mean()
+    volume_std = volume_window.std()
+    volume_zscore = (volume - volume_mean) / volume_std.replace(0, np.nan)
+
+    return pd.DataFrame({
+        'return': returns,
+        'ma_20': ma_short,
+        'ma_50': ma_long,
+        'volatility': volatility,
+        'drawdown': drawdown,
+        'volume_ma_20': volume_mean,
+        'volume_zscore': volume_zscore,
+        'surge': returns > SURGE_THRESHOLD,
+        'drop': returns < DROP_THRESHOLD,
+        'volume_spike': volume_zscore > VOLUME_SPIKE_ZSCORE,
+    }, index=bars.index)
+
+
+class IndicatorEngine:
+    def __init__(self, max_symbols=256):
+        self.max_symbols = max_symbols
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _remember(self, symbol, entry):
+        with self._lock:
+            self._entries.pop(symbol, None)
+            self._entries[symbol] = entry
+            if len(self._entries) > self.max_symbols:
+                self._entries.pop(next(iter(self._entries)))
+
+    def _extend(self, entry, bars):
+        """
+        Extend a cached entry with bars newer than its last bar
+
+        Returns None when the cached bars no longer match (re-adjusted history,
+        or bars reaching further back), in which case a full pass is needed.
+        """
+        source, indicators = entry['source'], entry['indicators']
+        if bars.index[0] < source.index[0]:
+            return None
+
+        # Bars both sides know about must agree, except the last cached bar,
+        # which may have been an intraday bar that has since been replaced
+        overlap = bars.index.intersection(source.index[:-1])
+        if len(overlap) > 0:
+            stored_close = source.loc[overlap, 'Close'].to_numpy()
+            new_close = bars.loc[overlap, 'Close'].to_numpy(dtype=float)
+            if not np.allclose(stored_close, new_close, rtol=1e-9, atol=0, equal_nan=True):
+                return None
+
+        last_date = source.index[-1]
+        replace_last = last_date in bars.index and (
+            not np.isclose(bars.at[last_date, 'Close'], source.at[last_date, 'Close'], rtol=1e-9, atol=0)
+            or not np.isclose(bars.at[last_date, 'Volume'], source.at[last_date, 'Volume'], rtol=1e-9, atol=0)
+        )
+        new_bars = bars[bars.index > last_date] if not replace_last else bars[bars.index >= last_date]
+        if new_bars.empty:
+            return entry
+
+        kept_source = source[source.index < new_bars.index[0]]
+        window = pd.concat([kept_source.tail(LOOKBACK_BARS), new_bars[['Close', 'Volume']].astype(float)])
+        new_indicators = compute_indicators(window).loc[new_bars.index]
+
+        return {
+            'source': pd.concat([kept_source, new_bars[['Close', 'Volume']].astype(float)]),
+            'indicators': pd.concat([indicators[indicators.index < new_bars.index[0]], new_indicators]),
+        }
+
+    def get_indicators(self, symbol, bars):
+        """
+        Get indicator columns for bars, computing only bars not seen before
+
+        Parameters:
+        -----------
+        symbol : str
+            Ticker symbol the bars belong to (cache key)
+        bars : pandas.DataFrame
+            Daily bars with 'Close' and 'Volume' columns
+
+        Returns:
+        --------
+        pandas.DataFrame
+            Indicator columns (see compute_indicators) indexed like bars
+        """
+        if bars is None or bars.empty:
+            return pd.DataFrame()
+        symbol = symbol.upper()
+
+        entry = self._entries.get(symbol)
+        updated = self._extend(entry, bars) if entry is not None else None
+        if updated is None:
+            updated = {
+                'source': bars[['Close', 'Volume']].astype(float),
+                'indicators': compute_indicators(bars),
+            }
+        if updated is not entry:
+            self._remember(symbol, updated)
+
+        return updated['indicators'].reindex(bars.index)
+
+    def clear(self, symbol=None):
+        """Drop cached indicators for one symbol, or for all symbols"""
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(symbol.upper(), None)
+
+
+# Global engine instance
+indicator_engine = IndicatorEngine()
+
+
+def get_indicators(symbol, bars):
+    """Get indicator columns for a symbol's bars through the shared engine"""
+    return indicator_engine.get_indicators(symbol, bars)